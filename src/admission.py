@@ -0,0 +1,189 @@
+"""
+Admission Control Module
+Runs each endpoint class on its own bounded executor so slow ML requests
+cannot starve the cheap quote endpoints.
+
+Every class has a concurrency cap (executor threads), a queue limit and a
+default deadline. A request that finds its class full is shed at once with
+503 + Retry-After. A request that is still queued when its deadline passes
+is dropped without running. A running request whose deadline passes returns
+504, and the work stops at its next check_deadline() call. Clients may ask
+for a shorter deadline with the `X-Request-Timeout` header (seconds).
+
+Limits can be overridden per class, e.g.
+    NEUROSTOCK_LIMITS_ML="2,4,120"      # concurrency, queue, deadline seconds
+"""
+
+import os
+import math
+import time
+import threading
+import contextvars
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import request, jsonify, g
+
+import metrics
+
+
+TIMEOUT_HEADER = 'X-Request-Timeout'
+
+# class -> (concurrency, queue limit, default deadline seconds)
+DEFAULT_LIMITS = {
+    'quote': (8, 32, 5.0),
+    'analysis': (4, 8, 30.0),
+    'ml': (2, 4, 120.0),
+}
+
+# Weight of the newest sample in the per-class service time average
+SERVICE_TIME_ALPHA = 0.2
+
+SHED = metrics.register(metrics.Counter(
+    'neurostock_admission_shed_total', 'Requests rejected with 503 because their class was full',
+    ('workload',)))
+EXPIRED = metrics.register(metrics.Counter(
+    'neurostock_admission_expired_total', 'Requests dropped because their deadline passed while queued',
+    ('workload',)))
+
+_deadline = contextvars.ContextVar('neurostock_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran past its deadline."""
+
+
+def _limits(name: str) -> tuple:
+    override = os.environ.get(f"NEUROSTOCK_LIMITS_{name.upper()}")
+    if not override:
+        return DEFAULT_LIMITS[name]
+    concurrency, queue, deadline = override.split(',')
+    return int(concurrency), int(queue), float(deadline)
+
+
+def remaining() -> float:
+    """Seconds left before the current request's deadline (inf if none)."""
+    deadline = _deadline.get()
+    return math.inf if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current request is out of time."""
+    if remaining() <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+class WorkloadClass:
+    """Bounded executor plus admission counters for one endpoint class."""
+
+    def __init__(self, name: str, concurrency: int, queue_limit: int, deadline: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix=f"neurostock-{name}")
+        self._lock = threading.Lock()
+        self.in_flight = 0      # queued + running
+        self.running = 0
+        self.service_time = 1.0
+
+    def try_admit(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.concurrency + self.queue_limit:
+                SHED.inc(workload=self.name)
+                return False
+            self.in_flight += 1
+            return True
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up, from the average service time."""
+        with self._lock:
+            waves = self.in_flight / self.concurrency
+        return max(1, math.ceil(waves * self.service_time))
+
+    def _run(self, fn, deadline: float, sampler):
+        if time.monotonic() >= deadline:
+            EXPIRED.inc(workload=self.name)
+            raise DeadlineExceeded("Deadline exceeded while queued")
+        if sampler is not None:
+            # Profile the executor thread that actually does the work
+            sampler.thread_id = threading.get_ident()
+        with self._lock:
+            self.running += 1
+        start = time.monotonic()
+        try:
+            return fn()
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.running -= 1
+                self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    def submit(self, fn, deadline: float, sampler=None):
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._run, fn, deadline, sampler)
+        # Also fires for futures cancelled while still queued
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+
+classes = {name: WorkloadClass(name, *_limits(name)) for name in DEFAULT_LIMITS}
+
+
+def _request_deadline(workload: WorkloadClass) -> float:
+    timeout = workload.deadline
+    requested = request.headers.get(TIMEOUT_HEADER)
+    if requested:
+        try:
+            timeout = min(timeout, max(0.0, float(requested)))
+        except ValueError:
+            pass
+    return time.monotonic() + timeout
+
+
+def limit(class_name: str):
+    """
+    Route decorator: run the view on the executor of an endpoint class.
+
+    Args:
+        class_name (str): 'quote', 'analysis' or 'ml'
+    """
+    workload = classes[class_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not workload.try_admit():
+                response = jsonify({"error": f"Server busy ({class_name} requests), retry later"})
+                response.headers['Retry-After'] = str(workload.retry_after())
+                return response, 503
+
+            deadline = _request_deadline(workload)
+            token = _deadline.set(deadline)
+            try:
+                # The copied contextvars carry Flask's request context into the executor thread
+                future = workload.submit(lambda: view(*args, **kwargs), deadline, g.get('profiler'))
+            finally:
+                _deadline.reset(token)
+            try:
+                return future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except (FutureTimeout, DeadlineExceeded):
+                future.cancel()
+                return jsonify({"error": "Deadline exceeded"}), 504
+        return wrapper
+    return decorator
+
+
+def _gauge(attr: str):
+    return lambda: {name: getattr(workload, attr) for name, workload in classes.items()}
+
+
+metrics.register_gauge('neurostock_admission_in_flight', 'Queued plus running requests per endpoint class',
+                       _gauge('in_flight'))
+metrics.register_gauge('neurostock_admission_running', 'Running requests per endpoint class',
+                       _gauge('running'))
@@ -0,0 +1,445 @@
+"""
+Anomalies Module
+Streaming volume / price anomaly detection over minute bars for a large
+universe. It backs the WhaleTracker radar.
+
+Every ticker keeps an exponentially weighted mean, variance and mean
+absolute deviation of two features: log volume and the one-bar log return.
+All tickers share one set of column arrays, so a minute-bar tick updates
+thousands of them with a handful of vectorized operations. Each update is
+O(1) per ticker and needs no window buffer. Scores are robust z-scores:
+the deviation from the mean divided by the MAD-based scale. Deviations
+are clipped (Huber-style) before they update the baseline, so a spike is
+flagged without inflating the statistics that judge the next bar. An
+alert fires when volume spikes, or a return moves either way, past its
+threshold (rising edge).
+
+The feed downloads the universe's minute bars in bulk and runs in one
+process: the quote refresher under gunicorn, or a thread with the dev
+server. Alerts go to SQLite (data/anomalies.db), keeping the latest
+MAX_ALERTS. Any worker can read them and deliver them to subscriptions,
+which are server-side cursors with a ticker / score filter.
+"""
+
+import os
+import math
+import time
+import secrets
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import fundamentals
+import metrics
+from metrics import upstream, record_upstream_error
+
+
+DB_PATH = os.environ.get('NEUROSTOCK_ANOMALIES_DB', 'data/anomalies.db')
+
+FEATURES = ('volume', 'return')
+
+# Baseline memory in bars (minute bars: about one trading hour)
+HALFLIFE_BARS = 60
+# Bars of history before a ticker can alert
+MIN_BARS = 30
+# Robust z-score thresholds for log volume and one-bar returns
+VOLUME_Z = 5.0
+RETURN_Z = 5.0
+# Deviations beyond this many scales are clipped before updating the baseline
+HUBER_K = 3.0
+# Mean absolute deviation -> standard deviation for normal data (sqrt(pi / 2))
+MAD_TO_SIGMA = math.sqrt(math.pi / 2)
+
+# A bar this long after the previous one starts a new session: its return
+# (the overnight gap) and volume (the opening auction) are neither scored nor learned
+SESSION_GAP = 30 * 60
+
+# Bulk minute-bar downloads: symbols per call, first-pass warm-up history,
+# then the look-back on every later pass
+BAR_INTERVAL = '1m'
+BAR_SECONDS = 60
+BULK_CHUNK = 200
+WARMUP_PERIOD = '5d'
+FEED_PERIOD = '1d'
+FEED_INTERVAL = 60
+
+MAX_ALERTS = 10000
+# Subscriptions not polled for this long are dropped
+SUBSCRIPTION_TTL = 60 * 60
+
+STATE_DTYPE = np.dtype([
+    ('count', '<i8', (2,)),     # observations per feature
+    ('last_ts', '<i8'),
+    ('last_close', '<f8'),
+    ('mean', '<f8', (2,)),
+    ('var', '<f8', (2,)),
+    ('mad', '<f8', (2,)),
+    ('above', '?', (2,)),       # feature was over its threshold on the last bar
+])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    price REAL NOT NULL,
+    volume REAL NOT NULL,
+    notional REAL NOT NULL,
+    return_pct REAL NOT NULL,
+    volume_z REAL NOT NULL,
+    return_z REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_ticker ON alerts(ticker, seq);
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id TEXT PRIMARY KEY,
+    tickers TEXT,
+    min_z REAL NOT NULL,
+    cursor INTEGER NOT NULL,
+    polled_at REAL NOT NULL
+);
+"""
+
+ALERTS = metrics.register(metrics.Counter(
+    'neurostock_anomaly_alerts_total', 'Volume / price anomaly alerts emitted', ('kind',)))
+
+
+class AnomalyDetector:
+    """Per-ticker streaming baselines, one growable column array per STATE_DTYPE field."""
+
+    def __init__(self, halflife: float = HALFLIFE_BARS, min_bars: int = MIN_BARS,
+                 volume_z: float = VOLUME_Z, return_z: float = RETURN_Z, capacity: int = 1024):
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)
+        self.min_bars = min_bars
+        self.thresholds = np.array([volume_z, return_z])
+        # Separate contiguous columns (not one record array) keep the per-tick gathers cheap
+        self.state = {name: np.zeros((capacity,) + STATE_DTYPE[name].shape, dtype=STATE_DTYPE[name].base)
+                      for name in STATE_DTYPE.names}
+        self.tickers = []               # slot -> ticker
+        self.index = {}                 # ticker -> slot
+
+    def slots(self, tickers) -> np.ndarray:
+        """Slot per ticker, allocating new ones (resolve once per column set, reuse every bar)."""
+        slots = np.empty(len(tickers), dtype=np.int64)
+        for i, ticker in enumerate(tickers):
+            slot = self.index.get(ticker)
+            if slot is None:
+                slot = self.index[ticker] = len(self.tickers)
+                self.tickers.append(ticker)
+                capacity = len(self.state['last_ts'])
+                if slot == capacity:
+                    for name, column in self.state.items():
+                        grown = np.zeros((capacity * 2,) + column.shape[1:], dtype=column.dtype)
+                        grown[:capacity] = column
+                        self.state[name] = grown
+            slots[i] = slot
+        return slots
+
+    def update(self, ts: int, slots: np.ndarray, close: np.ndarray, volume: np.ndarray) -> list:
+        """
+        Score one bar per ticker against its baseline, then fold it in.
+
+        Args:
+            ts (int): Bar open time (epoch seconds), shared by all tickers
+            slots (np.ndarray): Ticker slots from slots() (unique)
+            close (np.ndarray): Bar close per ticker
+            volume (np.ndarray): Bar volume per ticker
+
+        Returns:
+            list: Alert dicts for tickers whose score crossed a threshold on this bar
+        """
+        st = self.state
+        slots = np.asarray(slots, dtype=np.int64)
+        close = np.asarray(close, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        # Bars already seen (overlapping downloads) are skipped
+        last_ts = st['last_ts'][slots]
+        new = ts > last_ts
+        if not new.all():
+            slots, close, volume, last_ts = slots[new], close[new], volume[new], last_ts[new]
+
+        n = st['count'][slots]
+        last_close = st['last_close'][slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.column_stack([np.log1p(np.maximum(volume, 0.0)), np.log(close / last_close)])
+        valid = np.isfinite(x)
+        # The first bar of a session (after a gap) carries the overnight return
+        # and the opening-auction volume: neither is scored nor folded in
+        valid &= (ts - last_ts <= SESSION_GAP)[:, None]
+
+        mean, var, mad, above = st['mean'][slots], st['var'][slots], st['mad'][slots], st['above'][slots]
+        delta = np.where(valid, x - mean, 0.0)
+        scale = mad * MAD_TO_SIGMA
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(scale > 0, delta / scale, 0.0)
+        warm = n >= self.min_bars
+        # Volume alerts on spikes only; returns in either direction
+        score = np.column_stack([z[:, 0], np.abs(z[:, 1])])
+        over = valid & warm & (score >= self.thresholds)
+        rising = over & ~above
+
+        # Early bars use running averages so the baseline settles quickly; the
+        # spread is an average of deviations from the mean before each bar
+        bound = HUBER_K * scale
+        d = np.where(warm & (scale > 0), np.clip(delta, -bound, bound), delta)
+        alpha = np.where(valid, np.maximum(self.alpha, 1.0 / (n + 1.0)), 0.0)
+        alpha_dev = np.where(valid & (n > 0), np.maximum(self.alpha, 1.0 / np.maximum(n, 1)), 0.0)
+        st['mean'][slots] = mean + alpha * d
+        st['var'][slots] = var + alpha_dev * (d * d - var)
+        st['mad'][slots] = mad + alpha_dev * (np.abs(d) - mad)
+        st['above'][slots] = over | (above & ~valid)
+        st['count'][slots] = n + valid
+        st['last_close'][slots] = np.where(np.isfinite(close) & (close > 0), close, last_close)
+        st['last_ts'][slots] = ts
+
+        alerts = []
+        for i in np.flatnonzero(rising.any(axis=1)):
+            volume_hit, return_hit = rising[i]
+            ret = x[i, 1] if valid[i, 1] else 0.0
+            alerts.append({
+                "ticker": self.tickers[slots[i]],
+                "timestamp": float(ts),
+                "kind": 'VOLUME_PRICE' if volume_hit and return_hit else
+                        'VOLUME_SPIKE' if volume_hit else 'PRICE_MOVE',
+                "direction": 'bullish' if ret > 0 else 'bearish' if ret < 0 else 'neutral',
+                "price": float(close[i]),
+                "volume": float(volume[i]),
+                "notional": float(close[i] * volume[i]),
+                "return_pct": float(np.expm1(ret) * 100),
+                "volume_z": float(z[i, 0]),
+                "return_z": float(z[i, 1]),
+            })
+        return alerts
+
+    def stats(self, ticker: str):
+        """Current baseline for a ticker (mean / std / robust scale per feature), or None."""
+        slot = self.index.get(ticker)
+        if slot is None:
+            return None
+        st = self.state
+        return {
+            "bars": int(st['count'][slot, 0]),
+            "last_bar": int(st['last_ts'][slot]),
+            **{feature: {"mean": float(st['mean'][slot, i]), "std": float(np.sqrt(st['var'][slot, i])),
+                         "robust_scale": float(st['mad'][slot, i] * MAD_TO_SIGMA)}
+               for i, feature in enumerate(FEATURES)},
+        }
+
+
+def bulk_minute_bars(symbols: list, period: str = FEED_PERIOD) -> tuple:
+    """
+    Minute bars for many symbols in chunks of BULK_CHUNK, aligned on time.
+
+    Returns:
+        tuple: (ts int64 array, symbols, close and volume arrays of shape
+               (bars, symbols)); NaN where a symbol has no bar
+    """
+    frames = []
+    for start in range(0, len(symbols), BULK_CHUNK):
+        chunk = symbols[start:start + BULK_CHUNK]
+        try:
+            with upstream('yf.download'):
+                df = yf.download(chunk, period=period, interval=BAR_INTERVAL, group_by='column',
+                                 threads=True, progress=False)
+        except Exception:
+            record_upstream_error('yf.download')
+            continue
+        if df.empty:
+            record_upstream_error('yf.download')
+            continue
+        close, volume = df['Close'], df['Volume']
+        if isinstance(close, pd.Series):
+            close, volume = close.to_frame(chunk[0]), volume.to_frame(chunk[0])
+        frames.append((close.reindex(columns=chunk), volume.reindex(columns=chunk)))
+    if not frames:
+        return np.empty(0, dtype=np.int64), [], np.empty((0, 0)), np.empty((0, 0))
+    close = pd.concat([c for c, _ in frames], axis=1).sort_index()
+    volume = pd.concat([v for _, v in frames], axis=1).reindex(close.index)
+    ts = (close.index - pd.Timestamp(0, tz=close.index.tz)) // pd.Timedelta(seconds=1)
+    return (np.asarray(ts, dtype=np.int64), list(close.columns),
+            close.to_numpy(dtype=np.float64), volume.to_numpy(dtype=np.float64))
+
+
+class AnomalyMonitor:
+    """Alert log and subscriptions (any process) plus the bar feed (one process)."""
+
+    def __init__(self, path: str = DB_PATH, detector: AnomalyDetector = None):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        # Feed state, only populated in the process that calls tick()
+        self.detector = detector or AnomalyDetector()
+        self._warmed = False
+        self._runner = None
+
+    # ----- feed side -----
+
+    def on_bars(self, ts: np.ndarray, symbols: list, close: np.ndarray, volume: np.ndarray,
+                record: bool = True) -> list:
+        """
+        Feed aligned bars (oldest first) through the detector, one timestamp
+        at a time, and record the alerts.
+
+        Args:
+            ts (np.ndarray): Bar open times, shape (bars,)
+            symbols (list): Column tickers
+            close, volume (np.ndarray): Shape (bars, symbols), NaN where missing
+            record (bool): Store the alerts (False only builds baselines)
+
+        Returns:
+            list: Emitted alerts
+        """
+        alerts = []
+        with self._lock:
+            slots = self.detector.slots(symbols)
+            for i, bar_ts in enumerate(ts):
+                present = np.isfinite(close[i]) & np.isfinite(volume[i])
+                if present.any():
+                    alerts += self.detector.update(int(bar_ts), slots[present],
+                                                   close[i, present], volume[i, present])
+            if not record:
+                return []
+            self._record(alerts)
+        return alerts
+
+    def _record(self, alerts: list):
+        if not alerts:
+            return
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO alerts (ticker, ts, kind, direction, price, volume, notional, return_pct, '
+                'volume_z, return_z) VALUES (:ticker, :timestamp, :kind, :direction, :price, :volume, '
+                ':notional, :return_pct, :volume_z, :return_z)', alerts)
+            # Bounded history: keep the newest MAX_ALERTS
+            self._conn.execute('DELETE FROM alerts WHERE seq <= (SELECT MAX(seq) FROM alerts) - ?',
+                               (MAX_ALERTS,))
+        for alert in alerts:
+            ALERTS.inc(kind=alert['kind'])
+
+    def tick(self, symbols: list = None) -> int:
+        """
+        One feed pass: download the universe's minute bars and feed the
+        closed ones the detector has not seen. The first pass after a start
+        only builds the baselines from WARMUP_PERIOD of history: detector
+        state is not persisted, so alerts in that history would otherwise be
+        recorded again on every restart.
+
+        Returns:
+            int: Alerts emitted
+        """
+        symbols = symbols or fundamentals.load_universe()
+        start = time.perf_counter()
+        ts, columns, close, volume = bulk_minute_bars(symbols, FEED_PERIOD if self._warmed else WARMUP_PERIOD)
+        closed = ts + BAR_SECONDS <= time.time()
+        alerts = self.on_bars(ts[closed], columns, close[closed], volume[closed], record=self._warmed)
+        self._warmed = True
+        print(f"✅ Scanned {int(closed.sum())} minute bars for {len(columns)} symbols, "
+              f"{len(alerts)} alerts in {time.perf_counter() - start:.1f}s")
+        return len(alerts)
+
+    def start_background(self, interval: float = FEED_INTERVAL):
+        """Run tick() on a daemon thread."""
+        if self._runner is not None and self._runner.is_alive():
+            return
+        self._runner = threading.Thread(target=self._run, args=(interval,), name='anomaly-feed', daemon=True)
+        self._runner.start()
+
+    def _run(self, interval: float):
+        while True:
+            started = time.time()
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"❌ Anomaly feed tick failed: {str(e)}")
+            time.sleep(max(1.0, interval - (time.time() - started)))
+
+    def tracked_count(self) -> int:
+        return len(self.detector.tickers)
+
+    # ----- alerts and subscriptions (API side) -----
+
+    def alerts(self, tickers: list = None, since: int = 0, min_z: float = 0.0, limit: int = 100,
+               newest_first: bool = False) -> list:
+        """
+        Alerts after sequence number `since`, oldest first (poll with the last
+        seq seen), optionally for some tickers and above a score.
+        """
+        query = ('SELECT seq, ticker, ts, kind, direction, price, volume, notional, return_pct, '
+                 'volume_z, return_z FROM alerts WHERE seq > ? AND MAX(ABS(volume_z), ABS(return_z)) >= ?')
+        params = [since, min_z]
+        if tickers:
+            query += f" AND ticker IN ({','.join('?' * len(tickers))})"
+            params += list(tickers)
+        query += f" ORDER BY seq {'DESC' if newest_first else 'ASC'} LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, params + [limit]).fetchall()
+        return [{"seq": r[0], "ticker": r[1], "timestamp": r[2], "kind": r[3], "direction": r[4],
+                 "price": r[5], "volume": r[6], "notional": r[7], "return_pct": r[8],
+                 "volume_z": r[9], "return_z": r[10]} for r in rows]
+
+    def subscribe(self, tickers: list = None, min_z: float = 0.0) -> dict:
+        """
+        Open a subscription; poll() then returns each matching alert once.
+        New subscriptions start from the current end of the log.
+
+        Args:
+            tickers (list): Tickers to follow (default: all)
+            min_z (float): Only alerts whose larger |z| is at least this
+
+        Returns:
+            dict: {"id", "tickers", "min_z", "cursor"}
+        """
+        tickers = sorted({str(t).upper() for t in tickers}) if tickers else None
+        sub_id = secrets.token_hex(8)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM subscriptions WHERE polled_at < ?', (now - SUBSCRIPTION_TTL,))
+            cursor = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM alerts').fetchone()[0]
+            self._conn.execute('INSERT INTO subscriptions (id, tickers, min_z, cursor, polled_at) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (sub_id, ','.join(tickers) if tickers else None, float(min_z), cursor, now))
+        return {"id": sub_id, "tickers": tickers, "min_z": float(min_z), "cursor": cursor}
+
+    def poll(self, sub_id: str, limit: int = 100) -> list:
+        """New alerts for a subscription since its last poll (advances its cursor)."""
+        with self._lock:
+            row = self._conn.execute('SELECT tickers, min_z, cursor FROM subscriptions WHERE id = ?',
+                                     (sub_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown subscription: {sub_id}")
+            tickers, min_z, cursor = row
+            alerts = self.alerts(tickers.split(',') if tickers else None, since=cursor, min_z=min_z, limit=limit)
+            with self._conn:
+                self._conn.execute('UPDATE subscriptions SET cursor = ?, polled_at = ? WHERE id = ?',
+                                   (alerts[-1]['seq'] if alerts else cursor, time.time(), sub_id))
+        return alerts
+
+    def unsubscribe(self, sub_id: str):
+        with self._lock, self._conn:
+            cur = self._conn.execute('DELETE FROM subscriptions WHERE id = ?', (sub_id,))
+        if cur.rowcount == 0:
+            raise KeyError(f"Unknown subscription: {sub_id}")
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_monitor() -> AnomalyMonitor:
+    """Shared monitor (opened on first use, so each process gets its own connection)."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = AnomalyMonitor()
+        return _monitor
+
+
+metrics.register_gauge('neurostock_anomaly_tickers', 'Tickers with a streaming anomaly baseline in this process',
+                       lambda: _monitor.tracked_count() if _monitor is not None else 0)
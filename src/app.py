@@ -1,65 +1,156 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import sys
 import os
-import json
-import joblib
+import math
+import time
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import yfinance as yf
 
 # Add src to path to import local modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from data_loader import fetch_stock_data
-from preprocessing import add_technical_indicators, inverse_transform_predictions
-from model import load_trained_model
-from train import train_model
-from sentiment import get_market_sentiment
+from preprocessing import inverse_transform_predictions, FEATURE_COLUMNS
+from model import mc_dropout_rollout, MC_SAMPLES, MAX_MC_SAMPLES
+from train import train_model, train_intraday_model
+from market_hours import next_bar_times, is_intraday, bars_per_session, INTERVAL_MINUTES
+from sentiment import get_market_sentiment, get_bulk_sentiment
+import bar_store
+import intraday
+import resample
+import model_bundle
+import news_store
+import quotes
+import admission
+import indicator_snapshots
+import fundamentals
+import heatmap
+import correlation
+import portfolio
+import paper_trading
+import bots
+import anomalies
+import retraining
+import options
+import metrics
+import profiling
+from metrics import stage, upstream, record_batch
+
+
+# Trading days of intraday bars behind an intraday forecast, at least
+# (coarse intervals need more days to fill the model's window, see _intraday_days)
+INTRADAY_DAYS = 5
+
+# Past bars re-predicted for the Historical Accuracy Tracker
+BACKTEST_BARS = 30
+
+# Quote lists behind /market-overview and /top-movers (preloaded by serving.py)
+MARKET_OVERVIEW_SYMBOLS = ['SPY', 'QQQ', 'DIA', 'BTC-USD', 'AAPL', 'NVDA', 'TSLA', 'MSFT']
+TOP_MOVER_SYMBOLS = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', 'META', 'GOOGL', 'NFLX', 'AMD', 'SPY',
+                     'QQQ', 'DIA', 'BTC-USD', 'ETH-USD', 'COIN', 'PLTR', 'SNOW', 'CRWD', 'PANW', 'SMCI']
 
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-def get_prediction_data(ticker, days_ahead):
+
+@app.before_request
+def _start_request_timer():
+    g.metrics_token = metrics.set_endpoint(request.endpoint)
+    g.request_start = time.perf_counter()
+    if profiling.ENABLED and profiling.should_profile(request.headers):
+        g.profiler = profiling.start()
+
+
+@app.after_request
+def _record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                        endpoint=request.endpoint or 'unknown',
+                                        status=response.status_code)
+    sampler = g.pop('profiler', None)
+    if sampler is not None:
+        body = request.get_json(silent=True) or {}
+        ticker = request.args.get('ticker') or (body.get('ticker') if isinstance(body, dict) else None)
+        label = f"{request.endpoint}_{ticker}" if ticker else str(request.endpoint)
+        response.headers['X-Profile-File'] = os.path.basename(profiling.finish(sampler, label))
+    return response
+
+
+@app.teardown_request
+def _reset_endpoint(exc=None):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        metrics.reset_endpoint(token)
+
+
+def _intraday_days(ticker: str, interval: str, sequence_length: int) -> int:
+    """Trading days of bars that cover the model's window, the backtest and the indicator warm-up."""
+    bars = sequence_length + BACKTEST_BARS + intraday.WARMUP_BARS
+    # +1: today's session may have only just opened
+    return max(INTRADAY_DAYS, math.ceil(bars / bars_per_session(ticker, interval)) + 1)
+
+
+def get_prediction_data(ticker, days_ahead, mc_samples=0, interval='1d'):
     """
     Logic adapted from predict.py to return data instead of printing/plotting.
+
+    When mc_samples > 0, each predicted day also gets p5/p50/p95 bounds from
+    Monte Carlo dropout over that many stochastic passes. With an intraday
+    interval ('1m' ... '90m') the ticker's intraday model forecasts the next
+    days_ahead bars, stamped with their session times.
     """
     try:
-        # Load metadata
-        metadata_path = f"models/{ticker}_metadata.json"
+        intraday_mode = is_intraday(interval)
+        key = intraday.model_key(ticker, interval) if intraday_mode else ticker
+        date_format = '%Y-%m-%d %H:%M' if intraday_mode else '%Y-%m-%d'
+        retraining.record_request(key)
         
         # Auto-train if model doesn't exist
-        if not os.path.exists(metadata_path):
-            print(f"⚠️ Model for {ticker} not found. Starting auto-training...")
+        if not model_bundle.exists(key):
+            print(f"⚠️ Model for {key} not found. Starting auto-training...")
             try:
-                train_model(ticker=ticker, epochs=20) # Lower epochs for speed
+                with stage('auto_train'):
+                    if intraday_mode:
+                        train_intraday_model(ticker=ticker, interval=interval, epochs=20)
+                    else:
+                        train_model(ticker=ticker, epochs=20) # Lower epochs for speed
             except Exception as e:
                 return None, f"Failed to auto-train model: {str(e)}"
         
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-
+        # Load model, scaler and metadata from one bundle version (kept in memory)
+        admission.check_deadline()
+        with stage('model_load'):
+            bundle = model_bundle.get_model(key)
+        model, scaler = bundle.model, bundle.scaler
+        metadata = dict(bundle.metadata, bundle_version=bundle.version)
         
         sequence_length = metadata['sequence_length']
         num_features = metadata['num_features']
         
-        # Load model and scaler
-        model = load_trained_model(f"models/{ticker}_best_model.h5")
-        scaler = joblib.load(f"models/{ticker}_scaler.pkl")
-        
         # Fetch recent data
-        df = fetch_stock_data(ticker, period="1y")
-        df = add_technical_indicators(df)
+        if intraday_mode:
+            with stage('fetch'):
+                intraday.store.refresh(ticker, interval)
+            with stage('indicators'):
+                df = intraday.store.get_indicators(ticker, interval,
+                                                   days=_intraday_days(ticker, interval, sequence_length))
+        else:
+            with stage('fetch'):
+                bar_store.get_bars(ticker, period="1y")
+            with stage('indicators'):
+                df = bar_store.get_indicators(ticker, period="1y")
         
         # Prepare features
-        feature_columns = ['Close', 'Volume', 'SMA_20', 'SMA_50', 'EMA_12', 
-                          'EMA_26', 'RSI', 'MACD', 'MACD_Signal']
-        data = df[feature_columns].values
-        
-        # Scale data
-        scaled_data = scaler.transform(data)
+        feature_columns = metadata.get('feature_columns', FEATURE_COLUMNS)
+        with stage('scaling'):
+            data = df[feature_columns].values
+            
+            # Scale data
+            scaled_data = scaler.transform(data)
         
         # Get the last sequence for prediction
         last_sequence = scaled_data[-sequence_length:]
@@ -68,122 +159,166 @@ def get_prediction_data(ticker, days_ahead):
         predictions = []
         current_sequence = last_sequence.copy()
         
-        for i in range(days_ahead):
-            X_pred = current_sequence.reshape(1, sequence_length, num_features)
-            pred_scaled = model.predict(X_pred, verbose=0)
-            predictions.append(pred_scaled[0, 0])
+        admission.check_deadline()
+        with stage('rollout'):
+            for i in range(days_ahead):
+                X_pred = current_sequence.reshape(1, sequence_length, num_features)
+                record_batch('rollout', 1)
+                pred_scaled = model.predict(X_pred, verbose=0)
+                predictions.append(pred_scaled[0, 0])
+                
+                if i < days_ahead - 1:
+                    new_row = current_sequence[-1].copy()
+                    new_row[0] = pred_scaled[0, 0]
+                    current_sequence = np.vstack([current_sequence[1:], new_row])
             
-            if i < days_ahead - 1:
-                new_row = current_sequence[-1].copy()
-                new_row[0] = pred_scaled[0, 0]
-                current_sequence = np.vstack([current_sequence[1:], new_row])
+            # Inverse transform
+            predictions = np.array(predictions)
+            predictions_original = inverse_transform_predictions(predictions, scaler, num_features)
         
-        # Inverse transform
-        predictions = np.array(predictions)
-        predictions_original = inverse_transform_predictions(predictions, scaler, num_features)
+        # Prediction intervals (Monte Carlo dropout)
+        bands = None
+        uncertainty = None
+        if mc_samples > 0:
+            admission.check_deadline()
+            with stage('mc_dropout'):
+                mc_start = time.perf_counter()
+                record_batch('mc_dropout', mc_samples)
+                paths = mc_dropout_rollout(model, last_sequence, days_ahead, mc_samples)
+                paths = inverse_transform_predictions(paths.ravel(), scaler, num_features).reshape(paths.shape)
+                bands = np.percentile(paths, [5, 50, 95], axis=0)
+                uncertainty = {
+                    "method": "mc_dropout",
+                    "samples": mc_samples,
+                    "latency_ms": round((time.perf_counter() - mc_start) * 1000, 1)
+                }
         
-        # Prepare response data
-        current_price = df['Close'].iloc[-1]
-        if isinstance(current_price, pd.Series):
-            current_price = current_price.iloc[0]
-        current_price = float(current_price)
+        with stage('build_json'):
+            # Prepare response data
+            current_price = df['Close'].iloc[-1]
+            if isinstance(current_price, pd.Series):
+                current_price = current_price.iloc[0]
+            current_price = float(current_price)
         
-        last_date = df['Date'].iloc[-1]
-        if isinstance(last_date, pd.Series):
-            last_date = last_date.iloc[0]
-        last_date = pd.to_datetime(last_date)
+            last_date = df['Date'].iloc[-1]
+            if isinstance(last_date, pd.Series):
+                last_date = last_date.iloc[0]
+            last_date = pd.to_datetime(last_date)
         
-        future_data = []
-        for i, price in enumerate(predictions_original):
-            date = last_date + timedelta(days=i+1)
-            future_data.append({
-                "date": date.strftime('%Y-%m-%d'),
-                "price": float(price),
-                "change_percent": ((price - current_price) / current_price) * 100
-            })
+            future_data = []
+            future_dates = next_bar_times(last_date, days_ahead, interval, ticker)
+            for i, price in enumerate(predictions_original):
+                point = {
+                    "date": future_dates[i].strftime(date_format),
+                    "price": float(price),
+                    "change_percent": ((price - current_price) / current_price) * 100
+                }
+                if bands is not None:
+                    point["p5"] = float(bands[0, i])
+                    point["p50"] = float(bands[1, i])
+                    point["p95"] = float(bands[2, i])
+                future_data.append(point)
             
-        historical_data = []
-        hist_df = df.tail(60)
+            historical_data = []
+            hist_df = df.tail(60)
         
-        # calculate bollinger bands for the historical data to be drawn
-        sma20 = df['Close'].rolling(20).mean()
-        std20 = df['Close'].rolling(20).std()
-        upper_bb = sma20 + (std20 * 2)
-        lower_bb = sma20 - (std20 * 2)
-
-        for idx, row in hist_df.iterrows():
-            date_val = row['Date'] if 'Date' in row else idx
-            if isinstance(date_val, pd.Series):
-                date_val = date_val.iloc[0]
+            # calculate bollinger bands for the historical data to be drawn
+            sma20 = df['Close'].rolling(20).mean()
+            std20 = df['Close'].rolling(20).std()
+            upper_bb = sma20 + (std20 * 2)
+            lower_bb = sma20 - (std20 * 2)
+
+            for idx, row in hist_df.iterrows():
+                date_val = row['Date'] if 'Date' in row else idx
+                if isinstance(date_val, pd.Series):
+                    date_val = date_val.iloc[0]
             
-            close_val = row['Close']
-            if isinstance(close_val, pd.Series):
-                close_val = close_val.iloc[0]
+                close_val = row['Close']
+                if isinstance(close_val, pd.Series):
+                    close_val = close_val.iloc[0]
                 
-            historical_data.append({
-                "date": pd.to_datetime(date_val).strftime('%Y-%m-%d'),
-                "open": float(row['Open']) if not isinstance(row['Open'], pd.Series) else float(row['Open'].iloc[0]),
-                "high": float(row['High']) if not isinstance(row['High'], pd.Series) else float(row['High'].iloc[0]),
-                "low": float(row['Low']) if not isinstance(row['Low'], pd.Series) else float(row['Low'].iloc[0]),
-                "close": float(close_val),
-                "volume": int(row['Volume']) if not isinstance(row['Volume'], pd.Series) else int(row['Volume'].iloc[0]),
-                "rsi": float(row.get('RSI', 0)) if not isinstance(row.get('RSI', 0), pd.Series) else float(row.get('RSI', pd.Series([0])).iloc[0]),
-                "macd": float(row.get('MACD', 0)) if not isinstance(row.get('MACD', 0), pd.Series) else float(row.get('MACD', pd.Series([0])).iloc[0]),
-                "sma20": float(sma20.loc[idx]) if not pd.isna(sma20.loc[idx]) else None,
-                "upper_bb": float(upper_bb.loc[idx]) if not pd.isna(upper_bb.loc[idx]) else None,
-                "lower_bb": float(lower_bb.loc[idx]) if not pd.isna(lower_bb.loc[idx]) else None
-            })
+                historical_data.append({
+                    "date": pd.to_datetime(date_val).strftime(date_format),
+                    "open": float(row['Open']) if not isinstance(row['Open'], pd.Series) else float(row['Open'].iloc[0]),
+                    "high": float(row['High']) if not isinstance(row['High'], pd.Series) else float(row['High'].iloc[0]),
+                    "low": float(row['Low']) if not isinstance(row['Low'], pd.Series) else float(row['Low'].iloc[0]),
+                    "close": float(close_val),
+                    "volume": int(row['Volume']) if not isinstance(row['Volume'], pd.Series) else int(row['Volume'].iloc[0]),
+                    "rsi": float(row.get('RSI', 0)) if not isinstance(row.get('RSI', 0), pd.Series) else float(row.get('RSI', pd.Series([0])).iloc[0]),
+                    "macd": float(row.get('MACD', 0)) if not isinstance(row.get('MACD', 0), pd.Series) else float(row.get('MACD', pd.Series([0])).iloc[0]),
+                    "sma20": float(sma20.loc[idx]) if not pd.isna(sma20.loc[idx]) else None,
+                    "upper_bb": float(upper_bb.loc[idx]) if not pd.isna(upper_bb.loc[idx]) else None,
+                    "lower_bb": float(lower_bb.loc[idx]) if not pd.isna(lower_bb.loc[idx]) else None
+                })
 
         # Backtesting for Historical Accuracy Tracker (Last 30 days)
-        backtest_len = min(30, len(scaled_data) - sequence_length)
-        backtest_data = []
+        admission.check_deadline()
+        with stage('backtest'):
+            backtest_len = min(BACKTEST_BARS, len(scaled_data) - sequence_length)
+            backtest_data = []
         
-        if backtest_len > 0:
-            X_back = []
-            for i in range(backtest_len, 0, -1):
-                X_back.append(scaled_data[-(sequence_length + i) : -i])
-            X_back = np.array(X_back)
+            if backtest_len > 0:
+                X_back = []
+                for i in range(backtest_len, 0, -1):
+                    X_back.append(scaled_data[-(sequence_length + i) : -i])
+                X_back = np.array(X_back)
             
-            back_preds_scaled = model.predict(X_back, verbose=0)
-            back_preds_orig = inverse_transform_predictions(back_preds_scaled.flatten(), scaler, num_features)
+                record_batch('backtest', len(X_back))
+                back_preds_scaled = model.predict(X_back, verbose=0)
+                back_preds_orig = inverse_transform_predictions(back_preds_scaled.flatten(), scaler, num_features)
             
-            actual_closes = df['Close'].values[-backtest_len:]
-            dates_back = df['Date'].values[-backtest_len:]
+                actual_closes = df['Close'].values[-backtest_len:]
+                dates_back = df['Date'].iloc[-backtest_len:].tolist()
             
-            for i in range(backtest_len):
-                d_val = dates_back[i]
-                if isinstance(d_val, pd.Series):
-                    d_val = d_val.iloc[0]
+                for i in range(backtest_len):
+                    d_val = dates_back[i]
+                    if isinstance(d_val, pd.Series):
+                        d_val = d_val.iloc[0]
                 
-                actual_val = actual_closes[i]
-                if isinstance(actual_val, pd.Series):
-                    actual_val = actual_val.iloc[0]
+                    actual_val = actual_closes[i]
+                    if isinstance(actual_val, pd.Series):
+                        actual_val = actual_val.iloc[0]
                     
-                backtest_data.append({
-                    "date": pd.to_datetime(d_val).strftime('%Y-%m-%d'),
-                    "predicted": float(back_preds_orig[i]),
-                    "actual": float(actual_val)
-                })
+                    backtest_data.append({
+                        "date": pd.to_datetime(d_val).strftime(date_format),
+                        "predicted": float(back_preds_orig[i]),
+                        "actual": float(actual_val)
+                    })
 
-        return {
+        result = {
             "ticker": ticker,
+            "interval": interval,
             "current_price": current_price,
             "predictions": future_data,
             "historical": historical_data,
             "backtest": backtest_data,
             "metadata": metadata
-        }, None
+        }
+        if uncertainty is not None:
+            result["uncertainty"] = uncertainty
+        return result, None
 
+    except admission.DeadlineExceeded:
+        raise
     except Exception as e:
         return None, str(e)
 
 @app.route('/predict', methods=['POST'])
+@admission.limit('ml')
 def predict():
     data = request.get_json()
     ticker = data.get('ticker', 'AAPL')
     days = int(data.get('days', 7))
+    # Optional bar interval: {"interval": "5m"} forecasts the next `days` 5-minute bars
+    interval = data.get('interval', '1d')
+    if interval not in INTERVAL_MINUTES:
+        return jsonify({"error": f"Unsupported interval '{interval}'"}), 400
+    # Optional prediction intervals: {"intervals": true, "samples": 100}
+    mc_samples = 0
+    if data.get('intervals'):
+        mc_samples = max(2, min(MAX_MC_SAMPLES, int(data.get('samples', MC_SAMPLES))))
     
-    result, error = get_prediction_data(ticker, days)
+    result, error = get_prediction_data(ticker, days, mc_samples, interval)
     
     if error:
         return jsonify({"error": error}), 400
@@ -191,6 +326,7 @@ def predict():
     return jsonify(result)
 
 @app.route('/sentiment', methods=['POST'])
+@admission.limit('analysis')
 def sentiment():
     data = request.get_json()
     ticker = data.get('ticker', 'AAPL')
@@ -202,32 +338,42 @@ def sentiment():
         return jsonify({"error": str(e)}), 400
 
 
+@app.route('/sentiment-bulk', methods=['POST'])
+@admission.limit('analysis')
+def sentiment_bulk():
+    """Headline sentiment for many tickers, scored in one batch."""
+    data = request.get_json()
+    tickers = data.get('tickers', [])
+    
+    try:
+        return jsonify(get_bulk_sentiment(tickers))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+def _quote_json(quote: dict) -> dict:
+    """Quote in the {symbol, price, change_percent} response format (zeros if unavailable)."""
+    if quote['price'] is None:
+        return {"symbol": quote['symbol'], "price": 0.0, "change_percent": 0.0}
+    return {
+        "symbol": quote['symbol'],
+        "price": round(quote['price'], 2),
+        "change_percent": round(quote['change_percent'], 2)
+    }
+
+
 @app.route('/market-overview', methods=['GET'])
+@admission.limit('quote')
 def market_overview():
     """Returns live price and daily change for major indices."""
-    symbols = ['SPY', 'QQQ', 'DIA', 'BTC-USD', 'AAPL', 'NVDA', 'TSLA', 'MSFT']
-    result = []
     try:
-        for sym in symbols:
-            try:
-                ticker_obj = yf.Ticker(sym)
-                info = ticker_obj.fast_info
-                current = float(info.last_price) if info.last_price else 0.0
-                prev_close = float(info.previous_close) if info.previous_close else current
-                change_pct = ((current - prev_close) / prev_close * 100) if prev_close else 0.0
-                result.append({
-                    "symbol": sym,
-                    "price": round(current, 2),
-                    "change_percent": round(change_pct, 2)
-                })
-            except Exception:
-                result.append({"symbol": sym, "price": 0.0, "change_percent": 0.0})
-        return jsonify(result)
+        return jsonify([_quote_json(q) for q in quotes.get_quotes(MARKET_OVERVIEW_SYMBOLS)])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/compare', methods=['POST'])
+@admission.limit('ml')
 def compare():
     """Returns predictions for two tickers for comparison."""
     data = request.get_json()
@@ -250,35 +396,23 @@ def compare():
 
 
 @app.route('/watchlist-prices', methods=['POST'])
+@admission.limit('quote')
 def watchlist_prices():
     """Batch fetch current prices for a list of tickers."""
     data = request.get_json()
     tickers = data.get('tickers', [])
-    result = []
-    for sym in tickers:
-        try:
-            ticker_obj = yf.Ticker(sym)
-            info = ticker_obj.fast_info
-            current = float(info.last_price) if info.last_price else 0.0
-            prev_close = float(info.previous_close) if info.previous_close else current
-            change_pct = ((current - prev_close) / prev_close * 100) if prev_close else 0.0
-            result.append({
-                "symbol": sym,
-                "price": round(current, 2),
-                "change_percent": round(change_pct, 2)
-            })
-        except Exception:
-            result.append({"symbol": sym, "price": 0.0, "change_percent": 0.0})
-    return jsonify(result)
+    return jsonify([_quote_json(q) for q in quotes.get_quotes(tickers)])
 
 
 @app.route('/stock-info', methods=['GET'])
+@admission.limit('quote')
 def stock_info():
     """Returns company metadata: name, sector, market cap, PE, 52w high/low."""
     ticker = request.args.get('ticker', 'AAPL').upper()
     try:
         t = yf.Ticker(ticker)
-        info = t.info or {}
+        with upstream('yf.info'):
+            info = t.info or {}
         fast = t.fast_info
 
         def safe(val, default='N/A'):
@@ -312,27 +446,12 @@ def stock_info():
 
 
 @app.route('/top-movers', methods=['GET'])
+@admission.limit('quote')
 def top_movers():
     """Returns top 5 gainers & losers from a curated list."""
-    symbols = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', 'META', 'GOOGL', 'NFLX', 'AMD', 'SPY', 
-               'QQQ', 'DIA', 'BTC-USD', 'ETH-USD', 'COIN', 'PLTR', 'SNOW', 'CRWD', 'PANW', 'SMCI']
-    results = []
     try:
-        for sym in symbols:
-            try:
-                t = yf.Ticker(sym)
-                info = t.fast_info
-                current = float(info.last_price) if info.last_price else 0.0
-                prev_close = float(info.previous_close) if info.previous_close else current
-                if prev_close > 0:
-                    change_pct = ((current - prev_close) / prev_close) * 100
-                    results.append({
-                        "symbol": sym,
-                        "price": round(current, 2),
-                        "change_percent": round(change_pct, 2)
-                    })
-            except Exception:
-                continue
+        results = [_quote_json(q) for q in quotes.get_quotes(TOP_MOVER_SYMBOLS)
+                   if q['price'] is not None and q['prev_close'] and q['prev_close'] > 0]
         # sort and get top gainers and losers
         results.sort(key=lambda x: x['change_percent'], reverse=True)
         return jsonify({
@@ -343,142 +462,410 @@ def top_movers():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/heatmap', methods=['GET'])
+@admission.limit('quote')
+def sector_heatmap():
+    """
+    Market-cap weighted sector heatmap over the whole fundamentals universe.
+    Precomputed from bulk-refreshed quotes; supports If-None-Match.
+    """
+    try:
+        payload, version = heatmap.get_heatmap()
+        response = Response(payload, mimetype='application/json')
+        response.set_etag(version)
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/news', methods=['GET'])
+@admission.limit('analysis')
 def news():
-    """Returns latest headlines for a ticker, defaulting to general market if not provided."""
-    ticker = request.args.get('ticker', 'SPY').upper()
+    """
+    Returns stored headlines, newest first, from the local news store.
+    Query params: ticker (default SPY unless q is given), q (keywords), page, page_size.
+    Paging info is returned in the X-Total-Count / X-Page / X-Page-Size headers.
+    """
+    query = request.args.get('q', '').strip()
+    ticker = request.args.get('ticker', '' if query else 'SPY').upper()
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', 20, type=int)
     try:
-        from sentiment import get_market_sentiment
-        sentiment_data = get_market_sentiment(ticker)
-        return jsonify(sentiment_data.get('news', []))
+        store = news_store.get_store()
+        if ticker:
+            store.ensure_fresh(ticker)
+        result = store.search(ticker=ticker or None, query=query, page=page, page_size=page_size)
+        items = result['items']
+        if not items and ticker and not query and result['page'] == 1:
+            # Nothing stored for this ticker: fall back to the sentiment engine's headlines
+            items = get_market_sentiment(ticker).get('news', [])
+        response = jsonify(items)
+        response.headers['X-Total-Count'] = str(result['total'])
+        response.headers['X-Page'] = str(result['page'])
+        response.headers['X-Page-Size'] = str(result['page_size'])
+        return response
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/technical-analysis', methods=['GET'])
+@admission.limit('analysis')
 def technical_analysis():
     """Returns Bollinger Bands, RSI, MACD, support/resistance for a ticker."""
     ticker = request.args.get('ticker', 'AAPL').upper()
     try:
-        df = yf.download(ticker, period="6mo", progress=False)
-        if df.empty:
-            return jsonify({"error": "No data found"}), 404
-            
-        close = df['Close'].squeeze()
-        
-        # RSI
-        delta = close.diff()
-        gain = delta.clip(lower=0).rolling(14).mean()
-        loss = (-delta.clip(upper=0)).rolling(14).mean()
-        rs = gain / (loss + 1e-10)
-        rsi = 100 - (100 / (1 + rs))
-        
-        # MACD
-        ema12 = close.ewm(span=12, adjust=False).mean()
-        ema26 = close.ewm(span=26, adjust=False).mean()
-        macd = ema12 - ema26
-        signal = macd.ewm(span=9, adjust=False).mean()
-        hist = macd - signal
-        
-        # Bollinger Bands
-        sma20 = close.rolling(20).mean()
-        std20 = close.rolling(20).std()
-        upper_bb = sma20 + (std20 * 2)
-        lower_bb = sma20 - (std20 * 2)
-        
-        # Support/Resistance approx (min/max of last 3 months)
-        recent = close.tail(60)
-        support = recent.min()
-        resistance = recent.max()
-        
-        return jsonify({
-            "ticker": ticker,
-            "rsi": round(float(rsi.iloc[-1]), 2),
-            "macd": round(float(macd.iloc[-1]), 2),
-            "macd_signal": round(float(signal.iloc[-1]), 2),
-            "macd_hist": round(float(hist.iloc[-1]), 2),
-            "bb_upper": round(float(upper_bb.iloc[-1]), 2),
-            "bb_lower": round(float(lower_bb.iloc[-1]), 2),
-            "bb_mid": round(float(sma20.iloc[-1]), 2),
-            "support": round(float(support), 2),
-            "resistance": round(float(resistance), 2),
-            "current_price": round(float(close.iloc[-1]), 2)
-        })
+        return jsonify(indicator_snapshots.table.get(ticker))
+    except ValueError:
+        return jsonify({"error": "No data found"}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/technical-analysis-bulk', methods=['POST'])
+@admission.limit('analysis')
+def technical_analysis_bulk():
+    """Returns indicator snapshots for many tickers in one call."""
+    data = request.get_json()
+    tickers = data.get('tickers', [])
+    try:
+        return jsonify(indicator_snapshots.table.get_many(tickers))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/historical-range', methods=['GET'])
+@admission.limit('analysis')
 def historical_range():
-    """Returns OHLCV data for custom date range."""
+    """Returns OHLCV data for custom date range (interval: 1d, 1wk, 1mo or 1h)."""
     ticker = request.args.get('ticker', 'AAPL').upper()
     start = request.args.get('start')
     end = request.args.get('end')
     period = request.args.get('period', '1mo')
+    interval = request.args.get('interval', '1d')
     
     try:
-        if start and end:
-            df = yf.download(ticker, start=start, end=end, progress=False)
-        else:
-            df = yf.download(ticker, period=period, progress=False)
-            
+        # Served from the local OHLCV pyramid; upstream is only hit for missing history
+        df = resample.get_range(ticker, interval=interval, period=period,
+                                start=start if start and end else None,
+                                end=end if start and end else None)
         if df.empty:
             return jsonify([])
-            
-        result = []
-        for idx, row in df.iterrows():
-            date_val = idx
-            if isinstance(date_val, pd.Series):
-                date_val = date_val.iloc[0]
-                
-            result.append({
-                "date": pd.to_datetime(date_val).strftime('%Y-%m-%d'),
-                "open": float(row['Open'].iloc[0]) if isinstance(row['Open'], pd.Series) else float(row['Open']),
-                "high": float(row['High'].iloc[0]) if isinstance(row['High'], pd.Series) else float(row['High']),
-                "low": float(row['Low'].iloc[0]) if isinstance(row['Low'], pd.Series) else float(row['Low']),
-                "close": float(row['Close'].iloc[0]) if isinstance(row['Close'], pd.Series) else float(row['Close']),
-                "volume": int(row['Volume'].iloc[0]) if isinstance(row['Volume'], pd.Series) else int(row['Volume'])
-            })
+        
+        date_format = '%Y-%m-%d %H:%M' if interval in ('1h', '60m') else '%Y-%m-%d'
+        dates = df['Date'].dt.strftime(date_format).tolist()
+        result = [{
+            "date": dates[i],
+            "open": float(o),
+            "high": float(h),
+            "low": float(l),
+            "close": float(c),
+            "volume": int(v)
+        } for i, (o, h, l, c, v) in enumerate(df[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy())]
         return jsonify(result)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/screener', methods=['GET'])
+@app.route('/screener', methods=['GET', 'POST'])
+@admission.limit('analysis')
 def screener():
-    """Filters a curated stock list by basic metrics."""
-    # List of 15 mega/large-cap stocks to quickly screen
-    symbols = ['AAPL', 'MSFT', 'NVDA', 'GOOGL', 'AMZN', 'META', 'BRK-B', 'LLY', 'AVGO', 'JPM', 'TSLA', 'WMT', 'UNH', 'V', 'XOM']
-    results = []
+    """
+    Screens the local fundamentals store.
+    GET params: filter (repeatable, e.g. 'pe<30', 'sector==Technology'), sort, order, page, page_size.
+    POST body: {"filters": [{"field", "op", "value"}], "sort", "order", "page", "page_size"}.
+    Paging info is returned in the X-Total-Count / X-Page / X-Page-Size headers.
+    """
     try:
-        for sym in symbols:
-            try:
-                t = yf.Ticker(sym)
-                info = t.info or {}
-                results.append({
-                    "ticker": sym,
-                    "name": info.get('shortName', sym),
-                    "sector": info.get('sector', 'N/A'),
-                    "price": round(float(info.get('currentPrice', 0)), 2) if info.get('currentPrice') else 0,
-                    "pe": round(float(info.get('trailingPE', 0)), 2) if info.get('trailingPE') else None,
-                    "marketCap": info.get('marketCap'),
-                    "dividendYield": round(float(info.get('dividendYield', 0)) * 100, 2) if info.get('dividendYield') else 0
-                })
-            except Exception:
-                continue
-        return jsonify(results)
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            filters = data.get('filters', [])
+        else:
+            data = request.args
+            filters = [fundamentals.parse_filter(f) for f in request.args.getlist('filter')]
+        result = fundamentals.get_store().screen(
+            filters=filters,
+            sort=data.get('sort', 'marketCap'),
+            order=data.get('order', 'desc'),
+            page=int(data.get('page', 1)),
+            page_size=int(data.get('page_size', 50))
+        )
+        response = jsonify(result['items'])
+        response.headers['X-Total-Count'] = str(result['total'])
+        response.headers['X-Page'] = str(result['page'])
+        response.headers['X-Page-Size'] = str(result['page_size'])
+        return response
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/correlation', methods=['POST'])
+@admission.limit('analysis')
+def correlation_matrix():
+    """Pairwise daily-return correlations for a set of tickers over a rolling window."""
+    data = request.get_json()
+    tickers = data.get('tickers', [])
+    window = int(data.get('window', correlation.DEFAULT_WINDOW))
+    try:
+        return jsonify(correlation.engine.get(tickers, window))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/options/surface', methods=['POST'])
+@admission.limit('analysis')
+def options_surface():
+    """Black-Scholes prices and Greeks over a strike x expiry x volatility grid."""
+    data = request.get_json(silent=True) or {}
+    try:
+        payload = options.get_surface(
+            data.get('ticker', 'AAPL'),
+            strikes=data.get('strikes'),
+            expiries=data.get('expiries_days'),
+            vols=data.get('vols'),
+            rate=data.get('rate', options.DEFAULT_RATE),
+            dividend_yield=data.get('dividend_yield', 0.0),
+            spot=data.get('spot'),
+            outputs=data.get('outputs'))
+        # Cached as serialized JSON; no re-encoding per request
+        return Response(payload, mimetype='application/json')
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route('/portfolio-prices', methods=['POST'])
+@admission.limit('quote')
 def portfolio_prices():
     """Batch fetch current prices for a list of portfolio tickers. Identical to watchlist_prices."""
-    return watchlist_prices()
+    # Unwrapped: this request already holds a quote slot
+    return watchlist_prices.__wrapped__()
+
+
+@app.route('/portfolio-analytics', methods=['POST'])
+@admission.limit('analysis')
+def portfolio_analytics():
+    """Market value, P&L, volatility, VaR and beta for a list of holdings."""
+    data = request.get_json()
+    holdings = data.get('holdings', [])
+    window = int(data.get('window', portfolio.DEFAULT_WINDOW))
+    confidence = float(data.get('confidence', 0.95))
+    try:
+        return jsonify(portfolio.analyze_portfolio(holdings, window, confidence))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/paper/accounts', methods=['POST'])
+@admission.limit('quote')
+def paper_open_account():
+    """Open a server-side paper-trading account."""
+    data = request.get_json(silent=True) or {}
+    try:
+        ledger = paper_trading.get_ledger()
+        account = ledger.open_account(data.get('starting_cash', paper_trading.STARTING_CASH))
+        return jsonify(ledger.snapshot(account)), 201
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/paper/accounts/<account_id>', methods=['GET'])
+@admission.limit('quote')
+def paper_account(account_id):
+    """Cash, equity, P&L, positions and recent orders, marked to the latest quotes."""
+    try:
+        return jsonify(paper_trading.get_ledger().snapshot(account_id))
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/paper/accounts/<account_id>/orders', methods=['POST'])
+@admission.limit('quote')
+def paper_order(account_id):
+    """Fill a market order at the current quote: {"symbol", "side": "BUY"|"SELL", "qty"}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        ledger = paper_trading.get_ledger()
+        fill = ledger.place_order(account_id, data.get('symbol'), data.get('side'), data.get('qty', 0))
+        return jsonify({"fill": fill, "account": ledger.snapshot(account_id)})
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/paper/accounts/<account_id>/reset', methods=['POST'])
+@admission.limit('quote')
+def paper_reset(account_id):
+    """Drop all positions and orders and restore the starting cash."""
+    try:
+        ledger = paper_trading.get_ledger()
+        ledger.reset(account_id)
+        return jsonify(ledger.snapshot(account_id))
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/paper/leaderboard', methods=['GET'])
+@admission.limit('quote')
+def paper_leaderboard():
+    """Top paper-trading accounts by return."""
+    limit = int(request.args.get('limit', 10))
+    try:
+        return jsonify(paper_trading.get_ledger().leaderboard(limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/bots', methods=['POST'])
+@admission.limit('quote')
+def create_bot():
+    """Start a live trading bot: {"ticker", "interval", "buy_rules", "sell_rules", "initial_capital"}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        bot = bots.get_runtime().create_bot(data.get('ticker'), data.get('buy_rules', []),
+                                            data.get('sell_rules', []), interval=data.get('interval', '1d'),
+                                            capital=data.get('initial_capital', 10000))
+        return jsonify(bot), 201
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/bots', methods=['GET'])
+@admission.limit('quote')
+def list_bots():
+    """Active bots with their current cash and shares."""
+    try:
+        return jsonify(bots.get_runtime().list_bots())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/bots/<bot_id>', methods=['DELETE'])
+@admission.limit('quote')
+def stop_bot(bot_id):
+    """Stop a bot; its event history is kept."""
+    try:
+        runtime = bots.get_runtime()
+        runtime.stop_bot(bot_id)
+        return jsonify(runtime.get_bot(bot_id))
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/bots/events', methods=['GET'])
+@admission.limit('quote')
+def bot_events():
+    """Signals and fills after sequence number `since` (optionally for one `bot_id`)."""
+    since = int(request.args.get('since', 0))
+    limit = min(int(request.args.get('limit', 100)), 1000)
+    try:
+        return jsonify(bots.get_runtime().events(request.args.get('bot_id'), since, limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _ticker_list(value) -> list:
+    """Tickers from a JSON list or a comma-separated query parameter."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(t).strip().upper() for t in value or [] if str(t).strip()]
+
+
+@app.route('/anomalies', methods=['GET'])
+@admission.limit('quote')
+def anomaly_alerts():
+    """
+    Volume / price anomaly alerts. Query params: tickers (comma-separated),
+    min_z, limit, since (alerts after this seq, oldest first; default: the newest, newest first).
+    """
+    tickers = _ticker_list(request.args.get('tickers'))
+    limit = min(int(request.args.get('limit', 20)), 1000)
+    min_z = float(request.args.get('min_z', 0))
+    since = request.args.get('since')
+    try:
+        monitor = anomalies.get_monitor()
+        if since is None:
+            return jsonify(monitor.alerts(tickers, min_z=min_z, limit=limit, newest_first=True))
+        return jsonify(monitor.alerts(tickers, since=int(since), min_z=min_z, limit=limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/anomalies/subscriptions', methods=['POST'])
+@admission.limit('quote')
+def subscribe_anomalies():
+    """Subscribe to new alerts: {"tickers": [...] (default all), "min_z": 0}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        subscription = anomalies.get_monitor().subscribe(_ticker_list(data.get('tickers')),
+                                                         float(data.get('min_z', 0)))
+        return jsonify(subscription), 201
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/anomalies/subscriptions/<sub_id>', methods=['GET'])
+@admission.limit('quote')
+def poll_anomalies(sub_id):
+    """Alerts for a subscription since its last poll, oldest first."""
+    limit = min(int(request.args.get('limit', 100)), 1000)
+    try:
+        return jsonify(anomalies.get_monitor().poll(sub_id, limit))
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/anomalies/subscriptions/<sub_id>', methods=['DELETE'])
+@admission.limit('quote')
+def unsubscribe_anomalies(sub_id):
+    """Close a subscription."""
+    try:
+        anomalies.get_monitor().unsubscribe(sub_id)
+        return jsonify({"id": sub_id, "active": False})
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/models/staleness', methods=['GET'])
+@admission.limit('analysis')
+def model_staleness():
+    """Every model's age, new sessions since training and recent traffic, plus the nightly retraining plan."""
+    try:
+        return jsonify(retraining.get_scheduler().report())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
 import traceback
 
 @app.route('/chat', methods=['POST'])
+@admission.limit('ml')
 def chat():
     """Rule-based AI Analyst Chatbot"""
     data = request.get_json()
@@ -489,16 +876,7 @@ def chat():
     
     try:
         if 'rsi' in message or 'overbought' in message or 'oversold' in message:
-            df = yf.download(ticker, period="3mo", progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            close = df['Close']
-            delta = close.diff()
-            gain = delta.clip(lower=0).rolling(14).mean()
-            loss = (-delta.clip(upper=0)).rolling(14).mean()
-            rs = gain / (loss + 1e-10)
-            rsi = 100 - (100 / (1 + rs))
-            current_rsi = float(rsi.iloc[-1])
+            current_rsi = float(indicator_snapshots.table.get(ticker)['rsi'])
             
             status = "neutral"
             if current_rsi > 70:
@@ -509,16 +887,7 @@ def chat():
             response = f"The 14-day RSI for {ticker} is currently {current_rsi:.2f}. This indicates the stock is {status}."
             
         elif 'macd' in message or 'trend' in message:
-            df = yf.download(ticker, period="3mo", progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.get_level_values(0)
-            close = df['Close']
-            ema12 = close.ewm(span=12, adjust=False).mean()
-            ema26 = close.ewm(span=26, adjust=False).mean()
-            macd = ema12 - ema26
-            signal = macd.ewm(span=9, adjust=False).mean()
-            hist = macd - signal
-            current_hist = float(hist.iloc[-1])
+            current_hist = float(indicator_snapshots.table.get(ticker)['macd_hist'])
             
             trend = "bullish (upward momentum)" if current_hist > 0 else "bearish (downward momentum)"
             response = f"The MACD histogram for {ticker} is at {current_hist:.3f}, suggesting a {trend} trend."
@@ -535,7 +904,8 @@ def chat():
                 
         elif 'price' in message or 'current' in message:
             t_obj = yf.Ticker(ticker)
-            price = t_obj.fast_info.last_price
+            with upstream('yf.fast_info'):
+                price = t_obj.fast_info.last_price
             response = f"The current price of {ticker} is ${price:.2f}."
             
         elif 'sentiment' in message or 'news' in message or 'feel' in message:
@@ -555,6 +925,7 @@ def chat():
     return jsonify({"response": response})
 
 @app.route('/backtest-strategy', methods=['POST'])
+@admission.limit('ml')
 def backtest_strategy():
     data = request.get_json()
     ticker = data.get('ticker', 'AAPL').upper()
@@ -563,7 +934,8 @@ def backtest_strategy():
     initial_capital = float(data.get('initial_capital', 10000))
     
     try:
-        df = yf.download(ticker, period="1y", progress=False)
+        with upstream('yf.download'):
+            df = yf.download(ticker, period="1y", progress=False)
         if df.empty:
              return jsonify({"error": "No data found for backtesting."}), 404
              
@@ -663,5 +1035,19 @@ def backtest_strategy():
 def health():
     return jsonify({"status": "healthy"})
 
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, cache hit rates, upstream errors."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
+    # Development server; production runs under gunicorn (see serving.py)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        quotes.board.start_background_refresh()
+        bots.get_runtime().start_background()
+        heatmap.heatmap.start_background_refresh()
+        anomalies.get_monitor().start_background()
+        fundamentals.get_store().start_background_refresh()
+        news_store.get_store().start_background_refresh()
     app.run(debug=True, port=5000)
@@ -0,0 +1,180 @@
+"""
+Bar Store Module
+Process-wide cache of daily OHLCV bars and their technical indicators.
+Prediction, sentiment and analysis code read bars from here so each ticker
+is downloaded once per refresh interval instead of once per request.
+"""
+
+import time
+import threading
+import pandas as pd
+
+from data_loader import fetch_stock_data
+from preprocessing import add_technical_indicators
+from metrics import record_cache
+
+
+# Calendar days covered by each yfinance period string
+PERIOD_DAYS = {
+    '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731,
+    '5y': 1827, '10y': 3653,
+}
+
+# Daily bars are re-downloaded after this many seconds (today's bar keeps moving)
+BAR_TTL = 15 * 60
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten yfinance MultiIndex columns and make sure 'Date' is a datetime column."""
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df.loc[:, ~df.columns.duplicated()]
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df.reset_index(drop=True)
+
+
+class BarStore:
+    """Thread-safe in-memory cache of daily bars keyed by ticker."""
+
+    def __init__(self, ttl: float = BAR_TTL):
+        self.ttl = ttl
+        # ticker -> (bars DataFrame, period string, fetched_at)
+        self._bars = {}
+        # ticker -> (last bar date, period string, indicators DataFrame)
+        self._indicators = {}
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """
+        Register callback(ticker, bars) to run whenever fresh bars are downloaded.
+
+        Args:
+            callback: Function taking (ticker: str, bars: pd.DataFrame)
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, ticker: str, df: pd.DataFrame):
+        for callback in list(self._listeners):
+            try:
+                callback(ticker, df)
+            except Exception as e:
+                print(f"❌ Bar listener {getattr(callback, '__name__', callback)} failed for {ticker}: {str(e)}")
+
+    def is_fresh(self, ticker: str) -> bool:
+        """True if the cached bars for ticker are within the TTL (no download needed)."""
+        entry = self._bars.get(ticker.upper())
+        return entry is not None and time.time() - entry[2] <= self.ttl
+
+    def _ticker_lock(self, ticker: str):
+        with self._lock:
+            lock = self._ticker_locks.get(ticker)
+            if lock is None:
+                lock = self._ticker_locks[ticker] = threading.RLock()
+            return lock
+
+    def _fresh_entry(self, ticker: str, period: str):
+        entry = self._bars.get(ticker)
+        if entry is None:
+            return None
+        df, cached_period, fetched_at = entry
+        if time.time() - fetched_at > self.ttl:
+            return None
+        if period not in PERIOD_DAYS:
+            # 'max', 'ytd', ...: only an identical request can be served from cache
+            return entry if cached_period == period else None
+        if PERIOD_DAYS.get(cached_period, float('inf')) < PERIOD_DAYS[period]:
+            return None
+        return entry
+
+    def get_bars(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        """
+        Get daily bars for a ticker, downloading only on a miss.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            period (str): Look-back period ('1mo' ... '10y')
+
+        Returns:
+            pd.DataFrame: Bars with columns ['Date', 'Open', 'High', 'Low', 'Close', 'Volume', ...]
+        """
+        df, hit = self._load(ticker.upper(), period)
+        record_cache('bars', hit)
+        return df
+
+    def _load(self, ticker: str, period: str):
+        entry = self._fresh_entry(ticker, period)
+        hit = entry is not None
+        if entry is None:
+            with self._ticker_lock(ticker):
+                # Another thread may have filled the cache while we waited
+                entry = self._fresh_entry(ticker, period)
+                if entry is None:
+                    df = _normalize(fetch_stock_data(ticker, period=period))
+                    entry = (df, period, time.time())
+                    self._bars[ticker] = entry
+                    self._notify(ticker, df)
+        return self._slice(entry[0], period), hit
+
+    def get_indicators(self, ticker: str, period: str = "1y") -> pd.DataFrame:
+        """
+        Get bars with technical indicators (see add_technical_indicators),
+        recomputed only when new bars arrive.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            period (str): Look-back period of the underlying bars
+
+        Returns:
+            pd.DataFrame: Bars plus SMA/EMA/RSI/MACD columns
+        """
+        ticker = ticker.upper()
+        bars, _ = self._load(ticker, period)
+        last_date = bars['Date'].iloc[-1]
+        cached = self._indicators.get(ticker)
+        hit = cached is not None and cached[0] == last_date and cached[1] == period
+        record_cache('indicators', hit)
+        if not hit:
+            with self._ticker_lock(ticker):
+                cached = self._indicators.get(ticker)
+                if cached is None or cached[0] != last_date or cached[1] != period:
+                    cached = (last_date, period, add_technical_indicators(bars))
+                    self._indicators[ticker] = cached
+        return cached[2].copy()
+
+    @staticmethod
+    def _slice(df: pd.DataFrame, period: str) -> pd.DataFrame:
+        days = PERIOD_DAYS.get(period)
+        if days is None or df.empty:
+            return df.copy()
+        cutoff = df['Date'].iloc[-1] - pd.Timedelta(days=days)
+        return df[df['Date'] > cutoff].reset_index(drop=True)
+
+    def invalidate(self, ticker: str = None):
+        """Drop cached bars for one ticker, or for all tickers."""
+        with self._lock:
+            if ticker is None:
+                self._bars.clear()
+                self._indicators.clear()
+            else:
+                self._bars.pop(ticker.upper(), None)
+                self._indicators.pop(ticker.upper(), None)
+
+    def tickers(self) -> list:
+        return list(self._bars)
+
+
+# Shared instance used by the API and the sentiment engine
+store = BarStore()
+
+
+def get_bars(ticker: str, period: str = "1y") -> pd.DataFrame:
+    """Module-level shortcut for store.get_bars."""
+    return store.get_bars(ticker, period)
+
+
+def get_indicators(ticker: str, period: str = "1y") -> pd.DataFrame:
+    """Module-level shortcut for store.get_indicators."""
+    return store.get_indicators(ticker, period)
@@ -0,0 +1,101 @@
+"""
+Training Benchmark
+Compares epoch time and throughput of the default training path with the
+fast CPU mode of train.py (pinned threads, float32 tf.data + prefetch,
+optionally XLA).
+
+Each mode runs in a fresh process so thread settings and XLA state do not
+leak between runs.
+
+Usage:
+    python src/benchmark_train.py AAPL --epochs 5
+    python src/benchmark_train.py --synthetic --jit
+"""
+
+import os
+import sys
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _synthetic_bars(days: int = 1260) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+    return pd.DataFrame({
+        'Date': pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days),
+        'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+        'Volume': rng.integers(1_000_000, 2_000_000, days),
+    })
+
+
+def run_mode(mode: str, ticker: str, epochs: int, batch_size: int, threads: int) -> dict:
+    """Train for a fixed number of epochs in one mode and time it."""
+    import train
+    from preprocessing import add_technical_indicators, prepare_data, split_data
+    from model import create_lstm_model
+
+    fast = mode != 'default'
+    if fast:
+        train.configure_cpu(threads)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        bars = _synthetic_bars() if ticker is None else train.fetch_stock_data(ticker, period="5y")
+        X, y, _ = prepare_data(add_technical_indicators(bars), sequence_length=60)
+        X_train, _, y_train, _ = split_data(X, y, train_ratio=0.8)
+        model = create_lstm_model((X.shape[1], X.shape[2]), units=[100, 50, 50],
+                                  dropout_rate=0.2, jit_compile=mode == 'fast+xla')
+        timer = train.EpochTimer()
+        train.fit_model(model, X_train, y_train, epochs=epochs, batch_size=batch_size,
+                        callbacks=[timer], fast=fast)
+
+    # The first epoch includes graph tracing / XLA compilation
+    steady = timer.seconds[1:] or timer.seconds
+    epoch_seconds = float(np.mean(steady))
+    return {
+        "mode": mode,
+        "first_epoch_s": round(timer.seconds[0], 2),
+        "epoch_s": round(epoch_seconds, 2),
+        "samples_per_sec": round(len(X_train) * 0.9 / epoch_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark default vs fast CPU training")
+    parser.add_argument("ticker", nargs="?", default="AAPL")
+    parser.add_argument("--synthetic", action="store_true", help="Use generated bars (no download)")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--jit", action="store_true", help="Also benchmark fast mode with XLA")
+    args = parser.parse_args()
+
+    modes = ['default', 'fast'] + (['fast+xla'] if args.jit else [])
+    ticker = None if args.synthetic else args.ticker.upper()
+    context = multiprocessing.get_context("spawn")
+
+    print("=" * 70)
+    print(f"⏱️ TRAINING BENCHMARK - {ticker or 'synthetic data'}, {args.epochs} epochs")
+    print("=" * 70)
+    results = []
+    for mode in modes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_mode, mode, ticker, args.epochs, args.batch_size, args.threads).result()
+        results.append(result)
+        print(f"{mode:<10} first epoch {result['first_epoch_s']:>6.2f}s   "
+              f"epoch {result['epoch_s']:>6.2f}s   {result['samples_per_sec']:>8,.0f} samples/sec")
+
+    baseline = results[0]['epoch_s']
+    for result in results[1:]:
+        print(f"🚀 {result['mode']}: {baseline / result['epoch_s']:.2f}x faster per epoch than default")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
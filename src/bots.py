@@ -0,0 +1,475 @@
+"""
+Trading Bots Module
+Runs StrategyBuilder rule sets forward on live bars and quotes.
+
+A bot is a ticker, an interval, buy rules and sell rules in the format of
+/backtest-strategy ({"col": "RSI", "op": "<", "val": 30}), and a starting
+capital. It trades like the backtest: all-in on a buy signal while flat,
+all-out on a sell signal while holding.
+
+Bots are stored in SQLite (data/bots.db), so any worker can create or stop
+one, while exactly one runtime evaluates them. Under gunicorn that is the
+quote refresher process; with the dev server it is a background thread.
+The runtime keeps one streaming IndicatorState (see intraday.py) per
+ticker and interval. Each closed bar advances that state once, and every
+quote tick re-checks the rules with the live price as Close. All bots on
+a ticker are compiled into flat rule arrays, so one tick costs a few
+vectorized comparisons over that ticker's rules. Bots on other tickers are
+never touched. Rising-edge signals and every fill go to the bot_events log.
+"""
+
+import os
+import json
+import time
+import secrets
+import sqlite3
+import threading
+import numpy as np
+
+import bar_store
+import intraday
+import quotes
+import metrics
+from intraday import IndicatorState, to_bars, FETCH_PERIODS
+from market_hours import bar_delta
+
+
+DB_PATH = os.environ.get('NEUROSTOCK_BOTS_DB', 'data/bots.db')
+
+# Seconds between runtime ticks when running as a background thread
+TICK_INTERVAL = quotes.REFRESH_INTERVAL
+
+# History used to warm up a ticker's indicators before its first live bar
+WARMUP_PERIOD = '1y'
+WARMUP_DAYS = 5
+
+INTERVALS = ('1d',) + tuple(FETCH_PERIODS)
+
+# Rule column -> IndicatorState feature column ('MACD' is the histogram, as in /backtest-strategy)
+RULE_COLUMNS = {
+    'Close': 0, 'Price': 0, 'Volume': 1, 'SMA20': 2, 'SMA50': 3, 'EMA12': 4, 'EMA26': 5,
+    'RSI': 6, 'MACD_Line': 7, 'MACD_Signal': 8, 'MACD': 9,
+}
+OPS = ('<', '>')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bots (
+    id TEXT PRIMARY KEY,
+    ticker TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    buy_rules TEXT NOT NULL,
+    sell_rules TEXT NOT NULL,
+    capital REAL NOT NULL,
+    created_at REAL NOT NULL,
+    stopped_at REAL,
+    stop_seq INTEGER
+);
+CREATE TABLE IF NOT EXISTS bot_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    bot_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    side TEXT NOT NULL,
+    price REAL NOT NULL,
+    shares REAL,
+    cash REAL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bot_events_bot ON bot_events(bot_id, seq);
+"""
+
+EVENTS = metrics.register(metrics.Counter(
+    'neurostock_bot_events_total', 'Bot signals and fills emitted by the runtime', ('kind', 'side')))
+
+
+def validate_rules(rules) -> list:
+    """Normalize [{"col", "op", "val"}, ...]; raises ValueError on unknown columns or operators."""
+    if not isinstance(rules, list):
+        raise ValueError("Rules must be a list of {col, op, val}")
+    normalized = []
+    for r in rules:
+        col, op = r.get('col'), r.get('op')
+        if col not in RULE_COLUMNS:
+            raise ValueError(f"Unknown rule column '{col}'. Options: {', '.join(RULE_COLUMNS)}")
+        if op not in OPS:
+            raise ValueError(f"Unknown rule operator '{op}'. Options: {', '.join(OPS)}")
+        normalized.append({"col": col, "op": op, "val": float(r.get('val'))})
+    return normalized
+
+
+class _RuleSet:
+    """All bots' rules for one side, flattened: rule i belongs to bot owner[i]."""
+
+    def __init__(self, rule_lists: list):
+        flat = [(owner, RULE_COLUMNS[r['col']], r['op'] == '<', r['val'])
+                for owner, rules in enumerate(rule_lists) for r in rules]
+        self.owner = np.array([f[0] for f in flat], dtype=np.int64)
+        self.col = np.array([f[1] for f in flat], dtype=np.int64)
+        self.less = np.array([f[2] for f in flat], dtype=bool)
+        self.val = np.array([f[3] for f in flat], dtype=np.float64)
+        self.counts = np.array([len(rules) for rules in rule_lists], dtype=np.int64)
+
+    def match(self, values: np.ndarray) -> np.ndarray:
+        """Per bot: every rule holds (a bot without rules never matches, as in the backtest)."""
+        v = values[self.col]
+        passed = np.where(self.less, v < self.val, v > self.val)
+        hits = np.bincount(self.owner[passed], minlength=len(self.counts))
+        return (hits == self.counts) & (self.counts > 0)
+
+
+class _BotGroup:
+    """The bots trading one ticker at one interval, plus that stream's indicator state."""
+
+    def __init__(self, ticker: str, interval: str):
+        self.ticker = ticker
+        self.interval = interval
+        self.ids = []
+        self.rules = []                 # (buy rules, sell rules) per bot
+        self.cash = np.empty(0)
+        self.shares = np.empty(0)
+        self.buy_prev = np.empty(0, dtype=bool)
+        self.sell_prev = np.empty(0, dtype=bool)
+        self.state = None               # IndicatorState after the last closed bar
+        self.values = None              # feature row of the last closed bar
+        self.last_bar_ts = -1
+        self.last_quote_at = 0.0
+        self._pending = []
+        self._compile()
+
+    def add(self, bot_id: str, buy_rules: list, sell_rules: list, cash: float, shares: float):
+        # Batched: a sync adding thousands of bots compiles the rule arrays once
+        self._pending.append((bot_id, buy_rules, sell_rules, cash, shares))
+
+    def remove(self, bot_id: str):
+        self._flush()
+        i = self.ids.index(bot_id)
+        del self.ids[i], self.rules[i]
+        self.cash, self.shares = np.delete(self.cash, i), np.delete(self.shares, i)
+        self.buy_prev, self.sell_prev = np.delete(self.buy_prev, i), np.delete(self.sell_prev, i)
+        self._compile()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self.ids += [p[0] for p in pending]
+        self.rules += [(p[1], p[2]) for p in pending]
+        self.cash = np.concatenate([self.cash, [p[3] for p in pending]])
+        self.shares = np.concatenate([self.shares, [p[4] for p in pending]])
+        self.buy_prev = np.concatenate([self.buy_prev, np.zeros(len(pending), dtype=bool)])
+        self.sell_prev = np.concatenate([self.sell_prev, np.zeros(len(pending), dtype=bool)])
+        self._compile()
+
+    def _compile(self):
+        self.buy = _RuleSet([b for b, _ in self.rules])
+        self.sell = _RuleSet([s for _, s in self.rules])
+
+    def size(self) -> int:
+        return len(self.ids) + len(self._pending)
+
+    def evaluate(self, values: np.ndarray, price: float, ts: float, source: str) -> list:
+        """
+        Check every bot's rules against one feature row and fill at `price`.
+
+        Returns:
+            list: Event tuples (bot_id, ts, kind, side, price, shares, cash, source)
+        """
+        self._flush()
+        buy_ok = self.buy.match(values)
+        sell_ok = self.sell.match(values)
+        holding = self.shares > 0
+        sell = holding & sell_ok
+        buy = ~holding & buy_ok
+
+        events = []
+        for i in np.flatnonzero(buy_ok & ~self.buy_prev):
+            events.append((self.ids[i], ts, 'SIGNAL', 'BUY', price, None, None, source))
+        for i in np.flatnonzero(sell_ok & ~self.sell_prev):
+            events.append((self.ids[i], ts, 'SIGNAL', 'SELL', price, None, None, source))
+        self.buy_prev, self.sell_prev = buy_ok, sell_ok
+
+        self.cash[sell] += self.shares[sell] * price
+        self.shares[sell] = 0.0
+        self.shares[buy] = self.cash[buy] / price
+        self.cash[buy] = 0.0
+        for side, mask in (('SELL', sell), ('BUY', buy)):
+            for i in np.flatnonzero(mask):
+                events.append((self.ids[i], ts, 'FILL', side, price, float(self.shares[i]),
+                               float(self.cash[i]), source))
+        return events
+
+
+class BotRuntime:
+    """Bot registry (any process) and live evaluation engine (one process)."""
+
+    def __init__(self, path: str = DB_PATH, board: quotes.QuoteBoard = None):
+        self.path = path
+        self.board = board or quotes.board
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        if 'stop_seq' not in {r[1] for r in self._conn.execute('PRAGMA table_info(bots)')}:
+            # Databases created before stops were sequenced
+            with self._conn:
+                self._conn.execute('ALTER TABLE bots ADD COLUMN stop_seq INTEGER')
+                self._conn.execute('UPDATE bots SET stop_seq = rowid WHERE stopped_at IS NOT NULL')
+        self._lock = threading.RLock()
+        # Engine state, only populated in the process that calls tick()
+        self._groups = {}               # (ticker, interval) -> _BotGroup
+        self._bot_groups = {}           # bot id -> (ticker, interval)
+        self._synced_rowid = 0
+        self._synced_stop_seq = 0
+        self._runner = None
+
+    # ----- registry (API side) -----
+
+    def create_bot(self, ticker: str, buy_rules: list, sell_rules: list, interval: str = '1d',
+                   capital: float = 10000.0) -> dict:
+        """
+        Register a bot; the runtime picks it up on its next tick.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            buy_rules (list): [{"col", "op", "val"}, ...], all must hold to buy
+            sell_rules (list): Same format, all must hold to sell
+            interval (str): Bar interval the indicators run on ('1d', '1m' ... '1h')
+            capital (float): Starting cash
+
+        Returns:
+            dict: The stored bot
+        """
+        ticker = str(ticker or '').upper()
+        if not ticker:
+            raise ValueError("Missing ticker")
+        if interval not in INTERVALS:
+            raise ValueError(f"Unsupported interval '{interval}'. Options: {', '.join(INTERVALS)}")
+        buy_rules, sell_rules = validate_rules(buy_rules), validate_rules(sell_rules)
+        if not buy_rules:
+            raise ValueError("A bot needs at least one buy rule")
+        capital = float(capital)
+        if not capital > 0:
+            raise ValueError("Capital must be positive")
+        bot_id = secrets.token_hex(8)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO bots (id, ticker, interval, buy_rules, sell_rules, capital, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (bot_id, ticker, interval, json.dumps(buy_rules), json.dumps(sell_rules), capital, time.time()))
+        return self.get_bot(bot_id)
+
+    def stop_bot(self, bot_id: str):
+        # stop_seq is assigned inside the write transaction, so stops are
+        # numbered in commit order and sync() cannot miss one (a timestamp can
+        # be taken before a sync and committed after it)
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                'UPDATE bots SET stopped_at = ?, stop_seq = (SELECT COALESCE(MAX(stop_seq), 0) + 1 FROM bots) '
+                'WHERE id = ? AND stopped_at IS NULL', (time.time(), bot_id))
+        if cur.rowcount == 0 and self.get_bot(bot_id) is None:
+            raise KeyError(f"Unknown bot: {bot_id}")
+
+    def get_bot(self, bot_id: str):
+        bots = self.list_bots(bot_id=bot_id, include_stopped=True)
+        return bots[0] if bots else None
+
+    def list_bots(self, bot_id: str = None, include_stopped: bool = False) -> list:
+        """Bots with their position from the latest fill."""
+        query = ('SELECT b.id, b.ticker, b.interval, b.buy_rules, b.sell_rules, b.capital, b.created_at, '
+                 'b.stopped_at, e.side, e.price, e.shares, e.cash, e.ts FROM bots b '
+                 'LEFT JOIN bot_events e ON e.seq = (SELECT MAX(seq) FROM bot_events '
+                 "WHERE bot_id = b.id AND kind = 'FILL')")
+        clauses, params = [], []
+        if bot_id is not None:
+            clauses.append('b.id = ?')
+            params.append(bot_id)
+        if not include_stopped:
+            clauses.append('b.stopped_at IS NULL')
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY b.created_at', params).fetchall()
+        return [{
+            "id": r[0], "ticker": r[1], "interval": r[2],
+            "buy_rules": json.loads(r[3]), "sell_rules": json.loads(r[4]),
+            "capital": r[5], "created_at": r[6], "active": r[7] is None,
+            "cash": r[11] if r[8] else r[5],
+            "shares": r[10] if r[8] else 0.0,
+            "last_fill": {"side": r[8], "price": r[9], "timestamp": r[12]} if r[8] else None,
+        } for r in rows]
+
+    def events(self, bot_id: str = None, since: int = 0, limit: int = 100) -> list:
+        """Events after sequence number `since`, oldest first (poll with the last seq seen)."""
+        query = 'SELECT seq, bot_id, ts, kind, side, price, shares, cash, source FROM bot_events WHERE seq > ?'
+        params = [since]
+        if bot_id is not None:
+            query += ' AND bot_id = ?'
+            params.append(bot_id)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY seq LIMIT ?', params + [limit]).fetchall()
+        return [{"seq": r[0], "bot_id": r[1], "timestamp": r[2], "kind": r[3], "side": r[4],
+                 "price": r[5], "shares": r[6], "cash": r[7], "source": r[8]} for r in rows]
+
+    # ----- engine (runtime side) -----
+
+    def sync(self):
+        """Pick up bots created or stopped since the last sync."""
+        with self._lock:
+            added = self._conn.execute(
+                'SELECT rowid, id, ticker, interval, buy_rules, sell_rules, capital FROM bots '
+                'WHERE rowid > ? AND stopped_at IS NULL ORDER BY rowid', (self._synced_rowid,)).fetchall()
+            stopped = self._conn.execute('SELECT id, stop_seq FROM bots WHERE stop_seq > ? ORDER BY stop_seq',
+                                         (self._synced_stop_seq,)).fetchall()
+            for rowid, bot_id, ticker, interval, buy_rules, sell_rules, capital in added:
+                # Resume from the latest fill if the runtime restarted
+                fill = self._conn.execute(
+                    "SELECT cash, shares FROM bot_events WHERE bot_id = ? AND kind = 'FILL' "
+                    'ORDER BY seq DESC LIMIT 1', (bot_id,)).fetchone()
+                cash, shares = fill if fill else (capital, 0.0)
+                key = (ticker, interval)
+                group = self._groups.get(key)
+                if group is None:
+                    group = self._groups[key] = _BotGroup(ticker, interval)
+                group.add(bot_id, json.loads(buy_rules), json.loads(sell_rules), cash, shares)
+                self._bot_groups[bot_id] = key
+                self._synced_rowid = rowid
+            for bot_id, stop_seq in stopped:
+                self._synced_stop_seq = stop_seq
+                key = self._bot_groups.pop(bot_id, None)
+                if key is None:
+                    continue
+                group = self._groups[key]
+                group.remove(bot_id)
+                if not group.size():
+                    del self._groups[key]
+
+    def _closed_bars(self, ticker: str, interval: str, after_ts: int) -> np.ndarray:
+        """Closed bars newer than after_ts from the bar stores (downloads only when stale)."""
+        if interval == '1d':
+            rows = to_bars(bar_store.get_bars(ticker, WARMUP_PERIOD))
+        else:
+            intraday.store.refresh(ticker, interval)
+            parts = []
+            for day in reversed(intraday.store.days(ticker, interval)[-WARMUP_DAYS:]):
+                part = intraday.store.partition(ticker, interval, day)
+                parts.append(part[part['ts'] > after_ts])
+                if len(part) and part['ts'][0] <= after_ts:
+                    break
+            rows = np.concatenate(parts[::-1]) if parts else np.empty(0, dtype=intraday.BAR_DTYPE)
+        closed = rows['ts'] + int(bar_delta(interval).total_seconds()) <= time.time()
+        return rows[closed & (rows['ts'] > after_ts)]
+
+    def on_bars(self, ticker: str, interval: str, bars: np.ndarray) -> list:
+        """
+        Advance a ticker's indicators over newly closed bars and evaluate its
+        bots on each one.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Bar interval
+            bars (np.ndarray): intraday.BAR_DTYPE rows, oldest first
+
+        Returns:
+            list: Emitted events
+        """
+        with self._lock:
+            group = self._groups.get((ticker, interval))
+            if group is None:
+                return []
+            bars = bars[bars['ts'] > group.last_bar_ts]
+            if not len(bars):
+                return []
+            features, group.state = (group.state or IndicatorState()).compute(bars)
+            events = []
+            if group.values is not None:
+                for row, bar in zip(features.astype(np.float64), bars):
+                    events += group.evaluate(row, float(bar['close']), float(bar['ts']), 'bar')
+            # else: first bars of a new group only warm up the indicators
+            group.values = features[-1].astype(np.float64)
+            group.last_bar_ts = int(bars['ts'][-1])
+            self._record(events)
+            return events
+
+    def on_quote(self, ticker: str, price: float, ts: float) -> list:
+        """Re-check the ticker's bots with the live price as Close (indicators from the last closed bar)."""
+        with self._lock:
+            events = []
+            for interval in INTERVALS:
+                group = self._groups.get((ticker, interval))
+                if group is None or group.values is None or ts <= group.last_quote_at:
+                    continue
+                values = group.values.copy()
+                values[RULE_COLUMNS['Close']] = price
+                events += group.evaluate(values, price, ts, 'quote')
+                group.last_quote_at = ts
+            self._record(events)
+            return events
+
+    def _record(self, events: list):
+        if not events:
+            return
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO bot_events (bot_id, ts, kind, side, price, shares, cash, source) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', events)
+        for event in events:
+            EVENTS.inc(kind=event[2], side=event[3])
+
+    def tick(self) -> int:
+        """
+        One runtime pass: sync bots, feed closed bars, then feed quotes from
+        the shared board.
+
+        Returns:
+            int: Events emitted
+        """
+        self.sync()
+        emitted = 0
+        for (ticker, interval), group in list(self._groups.items()):
+            try:
+                emitted += len(self.on_bars(ticker, interval, self._closed_bars(ticker, interval, group.last_bar_ts)))
+            except Exception as e:
+                print(f"❌ Bot bars for {ticker} {interval} failed: {str(e)}")
+        for ticker in dict.fromkeys(t for t, _ in list(self._groups)):
+            row = self.board.read(ticker)
+            if row is None or np.isnan(row[0]):
+                self.board.get_quotes([ticker])     # puts the symbol on the board for the refresher
+                continue
+            emitted += len(self.on_quote(ticker, row[0], row[2]))
+        return emitted
+
+    def active_count(self) -> int:
+        return sum(group.size() for group in list(self._groups.values()))
+
+    def start_background(self, interval: float = TICK_INTERVAL):
+        """Run tick() on a daemon thread (single-process dev server)."""
+        if self._runner is not None and self._runner.is_alive():
+            return
+        self._runner = threading.Thread(target=self._run, args=(interval,), name='bot-runtime', daemon=True)
+        self._runner.start()
+
+    def _run(self, interval: float):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"❌ Bot runtime tick failed: {str(e)}")
+            time.sleep(interval)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> BotRuntime:
+    """Shared runtime (opened on first use, so each process gets its own connection)."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = BotRuntime()
+        return _runtime
+
+
+metrics.register_gauge('neurostock_bots_active', 'Bots evaluated by the runtime in this process',
+                       lambda: _runtime.active_count() if _runtime is not None else 0)
@@ -0,0 +1,310 @@
+"""
+Correlation Module
+Rolling return-correlation (and covariance) matrices for large ticker sets.
+
+Daily log returns from the bar store are aligned into one (days x tickers)
+array and the matrix is computed with a single matrix product. Each cached
+(universe, window) keeps running sums and cross-products over closed bars,
+so when new bars arrive the window slides in O(n^2) per new day instead of
+being recomputed. Today's still-moving bar is applied as a correction on
+read rather than triggering a rebuild.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+import bar_store
+from metrics import record_cache
+
+
+DEFAULT_WINDOW = 60
+MAX_TICKERS = 500
+BULK_FETCH_WORKERS = 8
+
+# Full recompute after this many incremental slides to bound float drift
+RESYNC_EVERY = 250
+
+# (universe, window) states and rendered matrices kept, least recently used evicted
+MAX_CACHE_ENTRIES = 32
+
+
+def _period_for(window: int) -> str:
+    """Smallest bar-store period that covers window + 1 trading days."""
+    if window < 240:
+        return "1y"
+    if window < 490:
+        return "2y"
+    return "5y"
+
+
+def aligned_returns(tickers: list, period: str) -> tuple:
+    """
+    Daily log returns for tickers aligned on common trading dates.
+
+    Returns:
+        tuple: (dates ndarray, returns ndarray of shape (days, len(kept)),
+                kept tickers, missing tickers, latest closes ndarray)
+    """
+    def load(t):
+        try:
+            bars = bar_store.get_bars(t, period)
+            return t, pd.Series(bars['Close'].astype(float).values, index=bars['Date'].values)
+        except Exception:
+            return t, None
+
+    with ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS) as pool:
+        loaded = list(pool.map(load, tickers))
+    kept = [t for t, s in loaded if s is not None and len(s) > 1]
+    missing = [t for t, s in loaded if s is None or len(s) <= 1]
+    if not kept:
+        return np.array([]), np.empty((0, 0)), kept, missing, np.array([])
+
+    closes = pd.concat({t: s for t, s in loaded if t in kept}, axis=1, join='inner').sort_index()
+    values = closes.to_numpy(dtype=np.float64)
+    returns = np.diff(np.log(values), axis=0)
+    return closes.index.values[1:], returns, kept, missing, values[-1]
+
+
+class RollingCorrelation:
+    """
+    Sliding-window correlation state for one (universe, window).
+
+    Running sums cover closed bars only. The newest aligned row (today's
+    bar, still moving during the session) is held apart as a provisional
+    row and folded into the window when statistics are read. A moving
+    partial bar therefore never forces a resync, and it slides into the
+    closed state once the next day's bar arrives.
+    """
+
+    def __init__(self, tickers: list, window: int, dates: np.ndarray, returns: np.ndarray):
+        self.tickers = tickers
+        self.window = window
+        self.revision = 0
+        self.versions = ()
+        self.missing = []
+        self.last_prices = np.array([])
+        self.resync(dates, returns)
+
+    def resync(self, dates: np.ndarray, returns: np.ndarray):
+        """Full recompute: the last `window` closed rows plus the provisional newest row."""
+        self.closed = returns[:-1][-self.window:].copy()
+        self.closed_dates = list(dates[:-1][-self.window:])
+        self.sums = self.closed.sum(axis=0)
+        self.cross = self.closed.T @ self.closed
+        self.partial_date, self.partial = dates[-1], returns[-1].copy()
+        self.slides = 0
+        self.revision += 1
+
+    def slide(self, date, row: np.ndarray):
+        """Add one closed day of returns and drop the oldest once the window is full."""
+        self.sums += row
+        self.cross += np.outer(row, row)
+        if len(self.closed) >= self.window:
+            oldest = self.closed[0]
+            self.sums -= oldest
+            self.cross -= np.outer(oldest, oldest)
+            self.closed = self.closed[1:]
+            self.closed_dates = self.closed_dates[1:]
+        self.closed = np.vstack([self.closed, row])
+        self.closed_dates = self.closed_dates + [date]
+        self.slides += 1
+        self.revision += 1
+
+    def advance(self, dates: np.ndarray, returns: np.ndarray):
+        """
+        Catch up with freshly aligned returns: slide in rows that closed since
+        the last call and replace the provisional row. Resyncs only when
+        closed history itself changed (e.g. re-adjusted for a split).
+        """
+        if len(self.closed_dates):
+            positions = np.flatnonzero(dates[:-1] == self.closed_dates[-1])
+            if len(positions) == 0 or not np.allclose(returns[positions[0]], self.closed[-1]):
+                self.resync(dates, returns)
+                return
+            first = positions[0] + 1
+        else:
+            first = 0
+        for i in range(first, len(dates) - 1):
+            self.slide(dates[i], returns[i])
+        if self.partial_date != dates[-1] or not np.array_equal(self.partial, returns[-1]):
+            self.partial_date, self.partial = dates[-1], returns[-1].copy()
+            self.revision += 1
+
+    def _window_stats(self) -> tuple:
+        """(rows, sums, cross-products) of the window with the provisional row folded in."""
+        row = self.partial
+        sums, cross = self.sums + row, self.cross + np.outer(row, row)
+        if len(self.closed) >= self.window:
+            oldest = self.closed[0]
+            return len(self.closed), sums - oldest, cross - np.outer(oldest, oldest)
+        return len(self.closed) + 1, sums, cross
+
+    @property
+    def buffer(self) -> np.ndarray:
+        """Returns in the window, oldest first (the last row is provisional)."""
+        closed = self.closed[len(self.closed) - self.window + 1:] if len(self.closed) >= self.window else self.closed
+        return np.vstack([closed, self.partial])
+
+    @property
+    def dates(self) -> list:
+        closed = self.closed_dates[len(self.closed_dates) - self.window + 1:] \
+            if len(self.closed_dates) >= self.window else self.closed_dates
+        return closed + [self.partial_date]
+
+    def copy(self):
+        """Independent copy; slide() and resync() on the original leave it untouched."""
+        twin = copy.copy(self)
+        twin.closed = self.closed.copy()
+        twin.closed_dates = list(self.closed_dates)
+        twin.sums = self.sums.copy()
+        twin.cross = self.cross.copy()
+        twin.partial = self.partial.copy()
+        twin.last_prices = self.last_prices.copy()
+        twin.missing = list(self.missing)
+        return twin
+
+    def means(self) -> np.ndarray:
+        n, sums, _ = self._window_stats()
+        return sums / n
+
+    def covariance(self) -> np.ndarray:
+        """Sample covariance of daily log returns over the window."""
+        n, sums, cross = self._window_stats()
+        return (cross - np.outer(sums, sums) / n) / max(n - 1, 1)
+
+    def matrix(self) -> np.ndarray:
+        cov = self.covariance()
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        corr = np.clip(np.nan_to_num(corr, nan=0.0), -1.0, 1.0)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+
+class CorrelationEngine:
+    """Caches RollingCorrelation state per (universe, window)."""
+
+    def __init__(self, store: bar_store.BarStore = None):
+        self.store = store or bar_store.store
+        self._states = OrderedDict()
+        # Bumped whenever the bar store downloads new bars for a ticker
+        self._versions = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.store.subscribe(self._on_new_bars)
+
+    def _on_new_bars(self, ticker: str, bars: pd.DataFrame):
+        self._versions[ticker] = self._versions.get(ticker, 0) + 1
+
+    def _versions_for(self, tickers: tuple) -> tuple:
+        return tuple(self._versions.get(t, 0) for t in tickers)
+
+    @staticmethod
+    def _lookup(cache: OrderedDict, key):
+        # Caller holds self._lock
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _store(cache: OrderedDict, key, value):
+        # Caller holds self._lock
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > MAX_CACHE_ENTRIES:
+            cache.popitem(last=False)
+
+    def state(self, tickers: list, window: int = DEFAULT_WINDOW) -> RollingCorrelation:
+        """
+        Rolling state for a universe, reused while no new bars have arrived and
+        slid forward incrementally when they have.
+
+        Args:
+            tickers (list): Ticker symbols
+            window (int): Rolling window length in trading days
+
+        Returns:
+            RollingCorrelation: State whose .tickers lists the symbols with data
+        """
+        tickers = tuple(dict.fromkeys(t.upper() for t in tickers))
+        if not tickers:
+            raise ValueError("At least one ticker is required")
+        if len(tickers) > MAX_TICKERS:
+            raise ValueError(f"At most {MAX_TICKERS} tickers are supported")
+        window = int(window)
+        if window < 5:
+            raise ValueError("Window must be at least 5 days")
+        key = (tickers, window)
+
+        with self._lock:
+            state = self._lookup(self._states, key)
+        if (state is not None and state.versions == self._versions_for(tickers)
+                and all(self.store.is_fresh(t) for t in tickers)):
+            record_cache('correlation', True)
+            return state
+        record_cache('correlation', False)
+
+        dates, returns, kept, missing, last_prices = aligned_returns(list(tickers), _period_for(window))
+        if not kept or len(returns) < 2:
+            raise ValueError("Not enough overlapping data to compute correlations")
+
+        with self._lock:
+            state = self._lookup(self._states, key)
+            if state is None or state.tickers != kept or state.slides >= RESYNC_EVERY:
+                state = RollingCorrelation(kept, window, dates, returns)
+                self._store(self._states, key, state)
+            else:
+                state.advance(dates, returns)
+            state.missing = missing
+            state.last_prices = last_prices
+            state.versions = self._versions_for(tickers)
+        return state
+
+    def snapshot(self, tickers: list, window: int = DEFAULT_WINDOW) -> RollingCorrelation:
+        """
+        Like state(), but a copy taken under the engine lock, so its
+        covariance, returns and prices all come from the same window even if
+        a concurrent request slides or resyncs the shared state.
+        """
+        state = self.state(tickers, window)
+        with self._lock:
+            return state.copy()
+
+    def get(self, tickers: list, window: int = DEFAULT_WINDOW) -> dict:
+        """
+        Correlation matrix of daily returns over the last `window` days.
+
+        Args:
+            tickers (list): Ticker symbols (order is preserved in the output)
+            window (int): Rolling window length in trading days
+
+        Returns:
+            dict: {"tickers", "window", "as_of", "matrix", "missing"}
+        """
+        if len(set(t.upper() for t in tickers)) < 2:
+            raise ValueError("At least two tickers are required")
+        state = self.state(tickers, window)
+        key = (tuple(state.tickers), state.window)
+        with self._lock:
+            cached = self._lookup(self._results, key)
+            if cached is not None and cached[0] is state and cached[1] == state.revision:
+                return cached[2]
+            result = {
+                "tickers": state.tickers,
+                "window": len(state.buffer),
+                "as_of": pd.to_datetime(state.dates[-1]).strftime('%Y-%m-%d'),
+                "matrix": np.round(state.matrix(), 4).tolist(),
+                "missing": state.missing
+            }
+            self._store(self._results, key, (state, state.revision, result))
+        return result
+
+
+# Shared engine used by the API
+engine = CorrelationEngine()
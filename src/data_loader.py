@@ -7,6 +7,8 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
 
+from metrics import upstream, record_upstream_error
+
 
 def fetch_stock_data(ticker: str, period: str = "5y", interval: str = "1d") -> pd.DataFrame:
     """
@@ -24,20 +26,26 @@ def fetch_stock_data(ticker: str, period: str = "5y", interval: str = "1d") -> p
     
     try:
         # Method 1: Try using yf.download (more reliable)
-        df = yf.download(ticker, period=period, interval=interval, progress=False)
+        with upstream('yf.download'):
+            df = yf.download(ticker, period=period, interval=interval, progress=False)
         
         # If empty, try alternative method
         if df.empty:
+            record_upstream_error('yf.download')
             print("⚠️ First method failed, trying alternative...")
             stock = yf.Ticker(ticker)
-            df = stock.history(period=period, interval=interval)
+            with upstream('yf.history'):
+                df = stock.history(period=period, interval=interval)
         
         if df.empty:
+            record_upstream_error('yf.history')
             # Try with a shorter period as fallback
             print("⚠️ Trying with shorter period (1y)...")
-            df = yf.download(ticker, period="1y", interval=interval, progress=False)
+            with upstream('yf.download'):
+                df = yf.download(ticker, period="1y", interval=interval, progress=False)
         
         if df.empty:
+            record_upstream_error('yf.download')
             raise ValueError(f"No data found for ticker: {ticker}. Please check:\n"
                            f"  1. Ticker symbol is correct\n"
                            f"  2. You have internet connection\n"
@@ -80,9 +88,11 @@ def fetch_stock_data_by_dates(ticker: str, start_date: str, end_date: str) -> pd
     
     try:
         stock = yf.Ticker(ticker)
-        df = stock.history(start=start_date, end=end_date)
+        with upstream('yf.history'):
+            df = stock.history(start=start_date, end=end_date)
         
         if df.empty:
+            record_upstream_error('yf.history')
             raise ValueError(f"No data found for ticker: {ticker}")
         
         # Reset index to make Date a column
@@ -109,7 +119,8 @@ def get_latest_price(ticker: str) -> float:
     """
     try:
         stock = yf.Ticker(ticker)
-        data = stock.history(period="1d")
+        with upstream('yf.history'):
+            data = stock.history(period="1d")
         return data['Close'].iloc[-1]
     except Exception as e:
         print(f"❌ Error getting latest price: {str(e)}")
@@ -0,0 +1,377 @@
+"""
+Walk-Forward Evaluation
+Measures how the LSTM setup from train.py would have performed over time.
+
+For each ticker the history is cut into consecutive folds: a model is
+trained on a rolling train span and evaluated on the following test span,
+then both slide forward. Folds run in a process pool, each fold scores its
+whole test span in one batched predict call, and per-ticker features are
+cached on disk so every fold builds its windows as views over one array.
+
+Usage:
+    python src/evaluate.py AAPL MSFT NVDA --workers 8
+    python src/evaluate.py --tickers-file data/universe.txt --period 10y
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from data_loader import fetch_stock_data
+from preprocessing import add_technical_indicators, FEATURE_COLUMNS
+
+
+REPORT_DIR = "reports/walkforward"
+
+# Fold layout in trading days: ~3 years of training, ~1 quarter of testing
+TRAIN_DAYS = 756
+TEST_DAYS = 63
+
+SEQUENCE_LENGTH = 60
+EPOCHS = 10
+BATCH_SIZE = 32
+
+# Stochastic passes per test window for interval calibration
+MC_SAMPLES = 50
+
+FETCH_WORKERS = 8
+
+# Per-worker cache of ticker feature arrays (kept across folds)
+_features = {}
+
+
+def _cache_path(out_dir: str, ticker: str) -> str:
+    return os.path.join(out_dir, "cache", f"{ticker}.npz")
+
+
+def cache_features(ticker: str, period: str, out_dir: str, refresh: bool = False) -> int:
+    """
+    Download bars, add indicators and store the feature matrix for a ticker.
+    A cache written today is reused unless refresh is set.
+
+    Returns:
+        int: Number of feature rows
+    """
+    path = _cache_path(out_dir, ticker)
+    if not refresh and os.path.exists(path):
+        written = datetime.fromtimestamp(os.path.getmtime(path)).date()
+        if written == datetime.now().date():
+            with np.load(path) as data:
+                return len(data['features'])
+
+    df = add_technical_indicators(fetch_stock_data(ticker, period=period))
+    features = df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    dates = df['Date'].to_numpy(dtype='datetime64[D]')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez(path, features=features, dates=dates)
+    return len(features)
+
+
+def load_features(out_dir: str, ticker: str) -> tuple:
+    """Cached (features, dates) arrays for a ticker, loaded once per process."""
+    if ticker not in _features:
+        with np.load(_cache_path(out_dir, ticker)) as data:
+            _features[ticker] = (data['features'], data['dates'])
+    return _features[ticker]
+
+
+def plan_folds(num_rows: int, train_days: int = TRAIN_DAYS, test_days: int = TEST_DAYS,
+               sequence_length: int = SEQUENCE_LENGTH) -> list:
+    """
+    Fold boundaries as row indices into the feature matrix.
+
+    Returns:
+        list: [(train_start, train_end, test_end), ...]; targets of a fold are
+            rows [train_start + sequence_length, train_end) for training and
+            [train_end, test_end) for testing
+    """
+    if train_days <= sequence_length:
+        raise ValueError("train_days must be larger than sequence_length")
+    folds = []
+    start = 0
+    while start + train_days + test_days <= num_rows:
+        folds.append((start, start + train_days, start + train_days + test_days))
+        start += test_days
+    if folds and start + train_days < num_rows:
+        # Last, shorter test span up to the most recent bar
+        folds.append((start, start + train_days, num_rows))
+    return folds
+
+
+def init_tf_worker(threads: int):
+    """Process-pool initializer: pin TensorFlow's thread pools before any op runs."""
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def run_fold(ticker: str, fold: int, bounds: tuple, config: dict) -> dict:
+    """
+    Train on one fold's train span and score its test span.
+
+    Returns:
+        dict: Fold metrics (prices in the ticker's currency)
+    """
+    from model import create_lstm_model, mc_dropout_predict, EarlyStopping, keras
+
+    train_start, train_end, test_end = bounds
+    seq = config['sequence_length']
+    features, dates = load_features(config['out_dir'], ticker)
+
+    # Scaler fitted on the train span only, so test data never leaks into it
+    low = features[train_start:train_end].min(axis=0)
+    span = features[train_start:train_end].max(axis=0) - low
+    span[span == 0] = 1.0
+    scaled = ((features - low) / span).astype(np.float32)
+
+    # windows[k] covers rows [k, k + seq) and predicts row k + seq
+    windows = sliding_window_view(scaled, seq, axis=0).transpose(0, 2, 1)
+    train_targets = np.arange(train_start + seq, train_end)
+    test_targets = np.arange(train_end, test_end)
+    X_train, y_train = windows[train_targets - seq], scaled[train_targets, 0]
+    X_test = windows[test_targets - seq]
+
+    keras.utils.set_random_seed(config['seed'] + fold)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        model = create_lstm_model((seq, scaled.shape[1]), units=[100, 50, 50], dropout_rate=0.2)
+        history = model.fit(
+            X_train, y_train,
+            epochs=config['epochs'],
+            batch_size=config['batch_size'],
+            validation_split=0.1,
+            callbacks=[EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)],
+            verbose=0
+        )
+    train_seconds = time.perf_counter() - start
+
+    def to_price(values):
+        return values * span[0] + low[0]
+
+    predicted = to_price(model.predict(X_test, batch_size=len(X_test), verbose=0)[:, 0])
+    actual = features[test_targets, 0]
+    previous = features[test_targets - 1, 0]
+    errors = np.abs(predicted - actual)
+
+    result = {
+        "fold": fold,
+        "train_start": str(dates[train_start]),
+        "train_end": str(dates[train_end - 1]),
+        "test_start": str(dates[train_end]),
+        "test_end": str(dates[test_end - 1]),
+        "n_test": int(len(test_targets)),
+        "mae": float(errors.mean()),
+        "mape": float((errors / actual).mean() * 100),
+        "naive_mae": float(np.abs(previous - actual).mean()),
+        "directional_accuracy": float((np.sign(predicted - previous) == np.sign(actual - previous)).mean()),
+        "epochs_run": len(history.history['loss']),
+        "train_seconds": round(train_seconds, 2),
+    }
+
+    # Calibration of Monte Carlo dropout intervals against realized closes
+    if config['mc_samples'] > 1:
+        paths = to_price(mc_dropout_predict(model, X_test, config['mc_samples']))
+        p5, p25, p75, p95 = np.percentile(paths, [5, 25, 75, 95], axis=0)
+        result["coverage_50"] = float(((actual >= p25) & (actual <= p75)).mean())
+        result["coverage_90"] = float(((actual >= p5) & (actual <= p95)).mean())
+        result["interval_90_width_pct"] = float(((p95 - p5) / actual).mean() * 100)
+
+    keras.backend.clear_session()
+    return result
+
+
+def summarize(folds: list) -> dict:
+    """Test-size weighted averages of the fold metrics."""
+    weights = np.array([f['n_test'] for f in folds], dtype=np.float64)
+    summary = {"folds": len(folds), "n_test": int(weights.sum())}
+    for key in ("mae", "mape", "naive_mae", "directional_accuracy",
+                "coverage_50", "coverage_90", "interval_90_width_pct"):
+        if all(key in f for f in folds):
+            summary[key] = round(float(np.average([f[key] for f in folds], weights=weights)), 6)
+    return summary
+
+
+def write_summary_csv(reports: list, path: str):
+    columns = ["ticker", "folds", "n_test", "mae", "mape", "naive_mae", "directional_accuracy",
+               "coverage_50", "coverage_90", "interval_90_width_pct"]
+    with open(path, 'w') as f:
+        f.write(",".join(columns) + "\n")
+        for report in reports:
+            row = dict(report['summary'], ticker=report['ticker'])
+            f.write(",".join(str(row.get(c, "")) for c in columns) + "\n")
+
+
+def walk_forward(tickers: list, period: str = "10y", train_days: int = TRAIN_DAYS,
+                 test_days: int = TEST_DAYS, sequence_length: int = SEQUENCE_LENGTH,
+                 epochs: int = EPOCHS, batch_size: int = BATCH_SIZE, mc_samples: int = MC_SAMPLES,
+                 workers: int = None, threads_per_worker: int = 1, out_dir: str = REPORT_DIR,
+                 refresh: bool = False, resume: bool = False, seed: int = 42) -> list:
+    """
+    Run walk-forward evaluation for many tickers.
+
+    Args:
+        tickers (list): Stock ticker symbols
+        period (str): History to download per ticker
+        train_days (int): Rows in each fold's train span
+        test_days (int): Rows in each fold's test span (also the slide step)
+        sequence_length (int): Look-back window of the model
+        epochs (int): Max epochs per fold (early stopping on val_loss)
+        batch_size (int): Training batch size
+        mc_samples (int): Monte Carlo dropout passes for calibration (0 to skip)
+        workers (int): Fold processes (default: CPU count)
+        threads_per_worker (int): TensorFlow intra-op threads per process
+        out_dir (str): Directory for reports and the feature cache
+        refresh (bool): Re-download bars even if cached today
+        resume (bool): Skip tickers that already have a report
+        seed (int): Base random seed (fold i uses seed + i)
+
+    Returns:
+        list: Per-ticker reports
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    config = {
+        "period": period, "train_days": train_days, "test_days": test_days,
+        "sequence_length": sequence_length, "epochs": epochs, "batch_size": batch_size,
+        "mc_samples": mc_samples, "seed": seed, "out_dir": out_dir,
+    }
+
+    print("=" * 70)
+    print(f"🧪 STOCK MARKET PREDICTOR - WALK-FORWARD EVALUATION")
+    print("=" * 70)
+    print(f"📊 Tickers: {len(tickers)}")
+    print(f"📅 Folds: train {train_days} / test {test_days} days over {period}")
+    print(f"⚙️ Workers: {workers} x {threads_per_worker} thread(s)")
+    print("=" * 70)
+
+    reports = []
+    if resume:
+        for ticker in list(tickers):
+            path = os.path.join(out_dir, f"{ticker}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    reports.append(json.load(f))
+                tickers.remove(ticker)
+        if reports:
+            print(f"⏭️ Skipping {len(reports)} ticker(s) with existing reports")
+
+    # Step 1: download and cache features (I/O bound, threads)
+    print("\n[1/3] 📥 Caching features...")
+    rows = {}
+
+    def cache(ticker):
+        try:
+            return ticker, cache_features(ticker, period, out_dir, refresh)
+        except Exception as e:
+            print(f"❌ {ticker}: {str(e)}")
+            return ticker, 0
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            rows = dict(pool.map(cache, tickers))
+
+    plans = {t: plan_folds(n, train_days, test_days, sequence_length) for t, n in rows.items()}
+    for ticker, folds in plans.items():
+        if not folds:
+            print(f"⚠️ {ticker}: not enough history ({rows[ticker]} rows) for one fold")
+    tasks = [(t, i, b) for t, folds in plans.items() for i, b in enumerate(folds)]
+
+    # Step 2: train and score folds (CPU bound, processes)
+    print(f"\n[2/3] 🏋️ Running {len(tasks)} folds...")
+    start = time.perf_counter()
+    results = {t: [] for t in plans}
+    # spawn: TensorFlow is not fork-safe once initialized
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=init_tf_worker, initargs=(threads_per_worker,)) as pool:
+        futures = {pool.submit(run_fold, t, i, b, config): (t, i) for t, i, b in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            ticker, fold = futures[future]
+            try:
+                results[ticker].append(future.result())
+            except Exception as e:
+                print(f"❌ {ticker} fold {fold}: {str(e)}")
+            if done % max(1, len(tasks) // 20) == 0 or done == len(tasks):
+                print(f"   {done}/{len(tasks)} folds ({time.perf_counter() - start:.0f}s)")
+
+    # Step 3: write reports
+    print("\n[3/3] 📝 Writing reports...")
+    config.pop("out_dir")
+    for ticker, folds in results.items():
+        if not folds:
+            continue
+        folds.sort(key=lambda f: f['fold'])
+        report = {
+            "ticker": ticker,
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "config": config,
+            "summary": summarize(folds),
+            "folds": folds,
+        }
+        with open(os.path.join(out_dir, f"{ticker}.json"), 'w') as f:
+            json.dump(report, f, indent=4)
+        reports.append(report)
+
+    reports.sort(key=lambda r: r['ticker'])
+    summary_path = os.path.join(out_dir, "summary.csv")
+    write_summary_csv(reports, summary_path)
+
+    print("\n" + "=" * 70)
+    print("🎉 EVALUATION COMPLETE!")
+    print("=" * 70)
+    for report in reports:
+        s = report['summary']
+        calibration = f"  90% cover {s['coverage_90']:.0%}" if 'coverage_90' in s else ""
+        print(f"{report['ticker']:<8} folds {s['folds']:>3}  MAE {s['mae']:.2f} (naive {s['naive_mae']:.2f})"
+              f"  dir {s['directional_accuracy']:.1%}{calibration}")
+    print(f"📁 Reports saved: {out_dir}/<TICKER>.json, {summary_path}")
+    print("=" * 70)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation of the LSTM models")
+    parser.add_argument("tickers", nargs="*", help="Ticker symbols")
+    parser.add_argument("--tickers-file", help="File with one ticker per line")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--train-days", type=int, default=TRAIN_DAYS)
+    parser.add_argument("--test-days", type=int, default=TEST_DAYS)
+    parser.add_argument("--sequence-length", type=int, default=SEQUENCE_LENGTH)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--mc-samples", type=int, default=MC_SAMPLES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--out-dir", default=REPORT_DIR)
+    parser.add_argument("--refresh", action="store_true", help="Re-download cached bars")
+    parser.add_argument("--resume", action="store_true", help="Skip tickers with existing reports")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if not tickers:
+        parser.error("No tickers given")
+
+    walk_forward(tickers, period=args.period, train_days=args.train_days, test_days=args.test_days,
+                 sequence_length=args.sequence_length, epochs=args.epochs, batch_size=args.batch_size,
+                 mc_samples=args.mc_samples, workers=args.workers,
+                 threads_per_worker=args.threads_per_worker, out_dir=args.out_dir,
+                 refresh=args.refresh, resume=args.resume)
+
+
+if __name__ == "__main__":
+    main()
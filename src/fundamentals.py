@@ -0,0 +1,324 @@
+"""
+Fundamentals Store Module
+Local columnar store of per-symbol fundamentals (price, PE, market cap,
+dividend yield, sector) with a vectorized screening engine.
+
+The store holds one immutable snapshot of NumPy column arrays. A background
+thread re-downloads the whole universe in bulk and swaps in a new snapshot,
+so screens never wait on Yahoo and run as boolean-mask operations.
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import yfinance as yf
+
+from metrics import upstream, record_cache
+
+
+DATA_PATH = os.environ.get('NEUROSTOCK_FUNDAMENTALS_PATH', 'data/fundamentals.npz')
+
+# One symbol per line; falls back to DEFAULT_UNIVERSE when missing
+UNIVERSE_FILE = os.environ.get('NEUROSTOCK_UNIVERSE_FILE', 'data/universe.txt')
+
+DEFAULT_UNIVERSE = ['AAPL', 'MSFT', 'NVDA', 'GOOGL', 'AMZN', 'META', 'BRK-B', 'LLY', 'AVGO',
+                    'JPM', 'TSLA', 'WMT', 'UNH', 'V', 'XOM']
+
+# Full-universe refresh interval and download parallelism
+REFRESH_INTERVAL = 6 * 60 * 60
+REFRESH_WORKERS = 16
+
+TEXT_FIELDS = ('ticker', 'name', 'sector')
+NUMERIC_FIELDS = ('price', 'pe', 'marketCap', 'dividendYield')
+
+OPERATORS = {
+    '<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+    '==': np.equal, '!=': np.not_equal,
+}
+
+
+def load_universe(path: str = UNIVERSE_FILE) -> list:
+    """Symbols to track: the universe file if present, else DEFAULT_UNIVERSE."""
+    if os.path.exists(path):
+        with open(path) as f:
+            symbols = [line.strip().upper() for line in f if line.strip() and not line.startswith('#')]
+        if symbols:
+            return list(dict.fromkeys(symbols))
+    return list(DEFAULT_UNIVERSE)
+
+
+def _fetch_fundamentals(symbol: str):
+    """Download one symbol's fundamentals; returns None if Yahoo has nothing."""
+    try:
+        with upstream('yf.info'):
+            info = yf.Ticker(symbol).info or {}
+    except Exception:
+        return None
+    if not info:
+        return None
+    return {
+        "ticker": symbol,
+        "name": info.get('shortName', symbol) or symbol,
+        "sector": info.get('sector', 'N/A') or 'N/A',
+        "price": float(info['currentPrice']) if info.get('currentPrice') else np.nan,
+        "pe": float(info['trailingPE']) if info.get('trailingPE') else np.nan,
+        "marketCap": float(info['marketCap']) if info.get('marketCap') else np.nan,
+        "dividendYield": float(info['dividendYield']) * 100 if info.get('dividendYield') else 0.0,
+    }
+
+
+class FundamentalsSnapshot:
+    """Immutable set of aligned column arrays, one row per symbol."""
+
+    def __init__(self, columns: dict, updated_at: float):
+        self.columns = columns
+        self.updated_at = updated_at
+        self.size = len(columns['ticker'])
+        self.index = {t: i for i, t in enumerate(columns['ticker'])}
+
+    @classmethod
+    def from_rows(cls, rows: list, updated_at: float = None):
+        columns = {f: np.array([r[f] for r in rows], dtype=str) for f in TEXT_FIELDS}
+        columns.update({f: np.array([r[f] for r in rows], dtype=np.float64) for f in NUMERIC_FIELDS})
+        return cls(columns, time.time() if updated_at is None else updated_at)
+
+    @classmethod
+    def empty(cls):
+        return cls.from_rows([], 0.0)
+
+    def merged(self, rows: list):
+        """New snapshot with rows replacing/adding symbols (existing symbols keep their values otherwise)."""
+        by_symbol = {t: self.row(i) for t, i in self.index.items()}
+        by_symbol.update({r['ticker']: r for r in rows})
+        return FundamentalsSnapshot.from_rows(list(by_symbol.values()))
+
+    def row(self, i: int) -> dict:
+        return {f: self.columns[f][i].item() for f in TEXT_FIELDS + NUMERIC_FIELDS}
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, updated_at=np.array(self.updated_at), **self.columns)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            columns = {f: data[f] for f in TEXT_FIELDS + NUMERIC_FIELDS}
+            return cls(columns, float(data['updated_at']))
+
+
+def parse_filter(expr: str) -> dict:
+    """
+    Parse a filter string such as 'pe<30', 'marketCap>=1e11' or 'sector==Technology'.
+
+    Returns:
+        dict: {"field", "op", "value"}
+    """
+    for op in ('<=', '>=', '==', '!=', '<', '>'):
+        if op in expr:
+            field, value = expr.split(op, 1)
+            return {"field": field.strip(), "op": op, "value": value.strip()}
+    raise ValueError(f"Invalid filter: {expr}")
+
+
+def _predicate_mask(snapshot: FundamentalsSnapshot, predicate: dict) -> np.ndarray:
+    field, op, value = predicate['field'], predicate['op'], predicate['value']
+    if field not in snapshot.columns:
+        raise ValueError(f"Unknown field: {field}")
+    column = snapshot.columns[field]
+    if op == 'in':
+        values = value if isinstance(value, (list, tuple)) else str(value).split(',')
+        if field in TEXT_FIELDS:
+            return np.isin(column, [str(v).strip() for v in values])
+        return np.isin(column, np.asarray(values, dtype=np.float64))
+    if op == 'between':
+        low, high = (float(v) for v in value)
+        return (column >= low) & (column <= high)
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator: {op}")
+    if field in TEXT_FIELDS:
+        if op not in ('==', '!='):
+            raise ValueError(f"Operator {op} not supported for text field {field}")
+        return OPERATORS[op](column, str(value))
+    # NaN compares False, so rows with missing values drop out of numeric filters
+    return OPERATORS[op](column, float(value))
+
+
+def query(snapshot: FundamentalsSnapshot, filters: list = None, sort: str = 'marketCap',
+          order: str = 'desc', page: int = 1, page_size: int = 50) -> dict:
+    """
+    Run a screen over a snapshot.
+
+    Args:
+        snapshot (FundamentalsSnapshot): Column arrays to screen
+        filters (list): Predicates {"field", "op", "value"}; op is one of
+            <, <=, >, >=, ==, !=, in, between. All predicates must hold.
+        sort (str): Field to sort by (missing values sort last)
+        order (str): 'asc' or 'desc'
+        page (int): 1-based page number
+        page_size (int): Rows per page
+
+    Returns:
+        dict: {"total", "page", "page_size", "items": [...]}
+    """
+    mask = np.ones(snapshot.size, dtype=bool)
+    for predicate in filters or []:
+        mask &= _predicate_mask(snapshot, predicate)
+    rows = np.flatnonzero(mask)
+
+    if sort:
+        if sort not in snapshot.columns:
+            raise ValueError(f"Unknown sort field: {sort}")
+        keys = snapshot.columns[sort][rows]
+        if sort in NUMERIC_FIELDS:
+            missing = np.isnan(keys)
+            keys = np.where(missing, 0.0, keys)
+            keys = -keys if order == 'desc' else keys
+            # lexsort uses the last key as primary: missing values go last
+            rows = rows[np.lexsort((keys, missing))]
+        else:
+            ranked = np.argsort(keys, kind='stable')
+            rows = rows[ranked[::-1] if order == 'desc' else ranked]
+
+    page = max(1, int(page))
+    page_size = max(1, min(500, int(page_size)))
+    selected = rows[(page - 1) * page_size: page * page_size]
+
+    items = []
+    for i in selected:
+        row = snapshot.row(i)
+        items.append({
+            "ticker": row['ticker'],
+            "name": row['name'],
+            "sector": row['sector'],
+            "price": round(row['price'], 2) if not np.isnan(row['price']) else 0,
+            "pe": round(row['pe'], 2) if not np.isnan(row['pe']) else None,
+            "marketCap": int(row['marketCap']) if not np.isnan(row['marketCap']) else None,
+            "dividendYield": round(row['dividendYield'], 2),
+        })
+    return {"total": int(len(rows)), "page": page, "page_size": page_size, "items": items}
+
+
+class FundamentalsStore:
+    """Holds the current snapshot and refreshes it in the background."""
+
+    def __init__(self, path: str = DATA_PATH, refresh_interval: float = REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.snapshot = FundamentalsSnapshot.empty()
+        # mtime of the file the snapshot was last loaded from or saved to
+        self._mtime = None
+        if os.path.exists(path):
+            try:
+                self.snapshot = FundamentalsSnapshot.load(path)
+                self._mtime = os.path.getmtime(path)
+            except Exception as e:
+                print(f"⚠️ Could not load fundamentals from {path}: {str(e)}")
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def refresh(self, symbols: list = None) -> int:
+        """
+        Download fundamentals for symbols (default: the whole universe) in
+        parallel and atomically swap in the merged snapshot.
+
+        Returns:
+            int: Number of symbols updated
+        """
+        symbols = symbols or load_universe()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+            rows = [r for r in pool.map(_fetch_fundamentals, symbols) if r is not None]
+        with self._lock:
+            self.snapshot = self.snapshot.merged(rows)
+            try:
+                self.snapshot.save(self.path)
+                self._mtime = os.path.getmtime(self.path)
+            except Exception as e:
+                print(f"⚠️ Could not persist fundamentals: {str(e)}")
+        print(f"✅ Refreshed fundamentals for {len(rows)}/{len(symbols)} symbols "
+              f"in {time.perf_counter() - start:.1f}s")
+        return len(rows)
+
+    def reload(self) -> bool:
+        """
+        Pick up a snapshot another process has saved since this one was loaded.
+
+        Returns:
+            bool: True if a newer snapshot was swapped in
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            snapshot = FundamentalsSnapshot.load(self.path)
+        except Exception as e:
+            print(f"⚠️ Could not reload fundamentals from {self.path}: {str(e)}")
+            return False
+        with self._lock:
+            self._mtime = mtime
+            if snapshot.updated_at <= self.snapshot.updated_at:
+                return False
+            self.snapshot = snapshot
+        return True
+
+    def screen(self, **kwargs) -> dict:
+        """
+        Run query() against the current snapshot, picking up the refresher's
+        latest save first (and seeding an empty store on first use).
+        """
+        self.reload()
+        snapshot = self.snapshot
+        record_cache('fundamentals', snapshot.size > 0)
+        if snapshot.size == 0:
+            self.refresh(DEFAULT_UNIVERSE)
+            snapshot = self.snapshot
+        return query(snapshot, **kwargs)
+
+    def start_background_refresh(self):
+        """Start a daemon thread that re-downloads the universe every refresh_interval."""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop,
+                                               name='fundamentals-refresher', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        # A snapshot that does not cover the universe yet (empty, or only the
+        # screener's seed) is refreshed right away whatever its age
+        covered = set(load_universe()) <= set(self.snapshot.index)
+        while True:
+            age = time.time() - self.snapshot.updated_at
+            if age >= self.refresh_interval or not covered:
+                covered = True
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Fundamentals refresh failed: {str(e)}")
+                age = 0
+            time.sleep(max(60.0, self.refresh_interval - age))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> FundamentalsStore:
+    """
+    Shared FundamentalsStore instance. The background refresh is started by
+    the process that owns it (serving.py's refresher, or app.py's dev
+    server); gunicorn workers pick up its saves with reload().
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FundamentalsStore()
+        return _store
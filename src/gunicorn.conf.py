@@ -0,0 +1,72 @@
+"""
+Gunicorn settings for production serving (see serving.py).
+
+    gunicorn -c src/gunicorn.conf.py app:app
+
+Environment:
+    NEUROSTOCK_BIND       Address to listen on (default 0.0.0.0:5000)
+    NEUROSTOCK_WORKERS    Worker processes (default: CPU count)
+    NEUROSTOCK_THREADS    Request threads per worker (default 32)
+    NEUROSTOCK_METRICS_DIR  Per-process metric files merged by /metrics
+                          (default: a directory under the system temp dir)
+"""
+
+import os
+import tempfile
+import multiprocessing
+
+
+pythonpath = 'src'
+bind = os.environ.get('NEUROSTOCK_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('NEUROSTOCK_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+# Requests wait on their class executor (admission.py) while holding a request
+# thread; keep this above the ML + analysis capacity so quotes always get one
+threads = int(os.environ.get('NEUROSTOCK_THREADS', 32))
+
+# Import the app (and its caches) once in the master; workers fork from it
+preload_app = True
+
+# /predict trains a model inline for tickers that have none yet
+timeout = 300
+graceful_timeout = 30
+keepalive = 5
+
+# Set before the app is imported: each process then writes its metrics here
+# and any worker's /metrics reports all of them (see metrics.py)
+os.environ.setdefault('NEUROSTOCK_METRICS_DIR',
+                      os.path.join(tempfile.gettempdir(), f"neurostock-metrics-{os.getpid()}"))
+
+
+def when_ready(server):
+    """Master is up, workers not yet forked: warm shared state."""
+    import metrics
+    import serving
+    metrics.clear_multiprocess_dir()
+    serving.preload()
+    serving.start_quote_refresher()
+
+
+def on_reload(server):
+    """SIGHUP: re-map newly published bundles before the new workers fork.
+    Old workers finish their in-flight requests within graceful_timeout."""
+    import serving
+    serving.preload()
+
+
+def post_worker_init(worker):
+    import serving
+    serving.warm_worker()
+
+
+def worker_exit(server, worker):
+    """Keep the exiting worker's final counts in the merged /metrics output."""
+    import metrics
+    metrics.flush()
+
+
+def on_exit(server):
+    import metrics
+    import serving
+    serving.stop_quote_refresher()
+    metrics.clear_multiprocess_dir()
@@ -0,0 +1,173 @@
+"""
+Headline Scoring Module
+Offline finance-lexicon sentiment scorer for news headlines.
+
+Headlines are tokenized once, mapped to lexicon weights and reduced per
+headline with np.bincount, so thousands of headlines from many tickers are
+scored in a single vectorized pass. Scores are memoized by headline hash.
+"""
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+# Word -> polarity weight in [-1, 1], biased towards financial news usage
+FINANCE_LEXICON = {
+    # Positive
+    'beat': 0.8, 'beats': 0.8, 'surge': 0.9, 'surges': 0.9, 'surged': 0.9, 'soar': 0.9,
+    'soars': 0.9, 'soared': 0.9, 'rally': 0.8, 'rallies': 0.8, 'rallied': 0.8,
+    'jump': 0.7, 'jumps': 0.7, 'jumped': 0.7, 'gain': 0.6, 'gains': 0.6, 'gained': 0.6,
+    'rise': 0.5, 'rises': 0.5, 'rising': 0.5, 'rose': 0.5, 'climb': 0.5, 'climbs': 0.5,
+    'record': 0.5, 'high': 0.3, 'highs': 0.4, 'upgrade': 0.9, 'upgrades': 0.9,
+    'upgraded': 0.9, 'outperform': 0.8, 'outperforms': 0.8, 'buy': 0.5, 'bullish': 0.9,
+    'strong': 0.6, 'stronger': 0.6, 'robust': 0.6, 'growth': 0.6, 'grow': 0.5,
+    'grows': 0.5, 'profit': 0.6, 'profits': 0.6, 'profitable': 0.7, 'boost': 0.6,
+    'boosts': 0.6, 'boosted': 0.6, 'expand': 0.4, 'expands': 0.4, 'expansion': 0.4,
+    'approval': 0.6, 'approved': 0.6, 'approves': 0.6, 'win': 0.6, 'wins': 0.6,
+    'won': 0.6, 'partnership': 0.4, 'launch': 0.3, 'launches': 0.3, 'innovative': 0.5,
+    'breakthrough': 0.8, 'optimism': 0.7, 'optimistic': 0.7, 'confident': 0.5,
+    'dividend': 0.4, 'buyback': 0.6, 'exceed': 0.7, 'exceeds': 0.7, 'exceeded': 0.7,
+    'tops': 0.6, 'topped': 0.6, 'recover': 0.5, 'recovers': 0.5, 'recovery': 0.5,
+    'rebound': 0.6, 'rebounds': 0.6, 'upbeat': 0.7, 'momentum': 0.4, 'raises': 0.5,
+    'raised': 0.4, 'higher': 0.4, 'best': 0.6, 'positive': 0.6, 'opportunity': 0.4,
+    'accelerate': 0.5, 'accelerates': 0.5, 'secure': 0.4, 'secures': 0.5,
+    # Negative
+    'miss': -0.8, 'misses': -0.8, 'missed': -0.8, 'plunge': -0.9, 'plunges': -0.9,
+    'plunged': -0.9, 'crash': -1.0, 'crashes': -1.0, 'tumble': -0.8, 'tumbles': -0.8,
+    'tumbled': -0.8, 'slump': -0.8, 'slumps': -0.8, 'fall': -0.5, 'falls': -0.5,
+    'fell': -0.5, 'drop': -0.5, 'drops': -0.5, 'dropped': -0.5, 'decline': -0.5,
+    'declines': -0.5, 'declined': -0.5, 'sink': -0.6, 'sinks': -0.6, 'slide': -0.5,
+    'slides': -0.5, 'low': -0.3, 'lows': -0.4, 'downgrade': -0.9, 'downgrades': -0.9,
+    'downgraded': -0.9, 'underperform': -0.8, 'sell': -0.5, 'selloff': -0.8,
+    'bearish': -0.9, 'weak': -0.6, 'weaker': -0.6, 'loss': -0.6, 'losses': -0.6,
+    'lose': -0.5, 'loses': -0.5, 'lawsuit': -0.7, 'sued': -0.7, 'sues': -0.6,
+    'probe': -0.6, 'investigation': -0.6, 'scrutiny': -0.5, 'fine': -0.4, 'fined': -0.7,
+    'penalty': -0.6, 'recall': -0.6, 'recalls': -0.6, 'layoffs': -0.7, 'layoff': -0.7,
+    'cuts': -0.5, 'cut': -0.4, 'warn': -0.6, 'warns': -0.6, 'warning': -0.6,
+    'risk': -0.4, 'risks': -0.4, 'uncertainty': -0.5, 'uncertain': -0.5, 'fear': -0.7,
+    'fears': -0.7, 'concern': -0.5, 'concerns': -0.5, 'worries': -0.6, 'worry': -0.5,
+    'volatile': -0.4, 'volatility': -0.3, 'bankruptcy': -1.0, 'default': -0.8,
+    'fraud': -1.0, 'scandal': -0.9, 'delay': -0.5, 'delays': -0.5, 'delayed': -0.5,
+    'halt': -0.6, 'halts': -0.6, 'slowdown': -0.6, 'recession': -0.8, 'inflation': -0.3,
+    'lower': -0.4, 'worst': -0.8, 'negative': -0.6, 'disappoint': -0.7,
+    'disappoints': -0.7, 'disappointing': -0.7, 'struggle': -0.6, 'struggles': -0.6,
+    'tariff': -0.4, 'tariffs': -0.4, 'ban': -0.6, 'bans': -0.6, 'shortfall': -0.7,
+    'pressure': -0.4, 'dump': -0.6, 'dumps': -0.6, 'breach': -0.7, 'hack': -0.7,
+}
+
+# Words that flip the polarity of the following NEGATION_SCOPE tokens
+NEGATIONS = {'not', 'no', 'never', 'without', "isn't", "wasn't", "doesn't", "don't",
+             "didn't", "won't", "can't", 'fails', 'failed', 'fail'}
+NEGATION_SCOPE = 3
+
+# VADER-style normalisation constant: score = x / sqrt(x^2 + ALPHA)
+ALPHA = 4.0
+
+MAX_MEMO_ENTRIES = 200_000
+
+_TOKEN_RE = re.compile(r"[a-z][a-z']*")
+
+_vocab = {word: i for i, word in enumerate(FINANCE_LEXICON)}
+_weights = np.array(list(FINANCE_LEXICON.values()), dtype=np.float32)
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def headline_key(title: str) -> str:
+    """Stable hash of a normalized headline, used for memoization and deduplication."""
+    return hashlib.blake2b(' '.join(title.lower().split()).encode('utf-8'),
+                           digest_size=12).hexdigest()
+
+
+def _encode(titles: list) -> tuple:
+    """
+    Convert headlines to flat arrays of (headline index, lexicon id, sign).
+    """
+    doc_idx, term_idx, signs = [], [], []
+    for i, title in enumerate(titles):
+        negate = 0
+        for token in _TOKEN_RE.findall(title.lower()):
+            if token in NEGATIONS:
+                negate = NEGATION_SCOPE
+                continue
+            term = _vocab.get(token)
+            if term is not None:
+                doc_idx.append(i)
+                term_idx.append(term)
+                signs.append(-1.0 if negate else 1.0)
+            if negate:
+                negate -= 1
+    return (np.asarray(doc_idx, dtype=np.int64),
+            np.asarray(term_idx, dtype=np.int64),
+            np.asarray(signs, dtype=np.float32))
+
+
+def _score_uncached(titles: list) -> np.ndarray:
+    if not titles:
+        return np.zeros(0, dtype=np.float32)
+    doc_idx, term_idx, signs = _encode(titles)
+    totals = np.bincount(doc_idx, weights=_weights[term_idx] * signs,
+                         minlength=len(titles)).astype(np.float32)
+    return totals / np.sqrt(totals * totals + ALPHA)
+
+
+def score_headlines(titles: list) -> np.ndarray:
+    """
+    Score headlines in one batch.
+
+    Args:
+        titles (list): Headline strings
+
+    Returns:
+        np.ndarray: Scores in [-1, 1], one per headline (0 means no lexicon hits)
+    """
+    keys = [headline_key(t) for t in titles]
+    scores = np.empty(len(titles), dtype=np.float32)
+    missing = []
+    with _memo_lock:
+        for i, key in enumerate(keys):
+            cached = _memo.get(key)
+            if cached is None:
+                missing.append(i)
+            else:
+                scores[i] = cached
+    if missing:
+        fresh = _score_uncached([titles[i] for i in missing])
+        scores[missing] = fresh
+        with _memo_lock:
+            for i, value in zip(missing, fresh):
+                _memo[keys[i]] = float(value)
+            while len(_memo) > MAX_MEMO_ENTRIES:
+                _memo.popitem(last=False)
+    return scores
+
+
+def score_tickers(headlines_by_ticker: dict) -> dict:
+    """
+    Score headlines for many tickers in a single batch and aggregate per ticker.
+
+    Args:
+        headlines_by_ticker (dict): {ticker: [headline, ...]}
+
+    Returns:
+        dict: {ticker: (aggregate score in -100..100, [per-headline scores])}
+    """
+    tickers = list(headlines_by_ticker)
+    lengths = np.array([len(headlines_by_ticker[t]) for t in tickers], dtype=np.int64)
+    flat = [title for t in tickers for title in headlines_by_ticker[t]]
+    scores = score_headlines(flat)
+
+    owners = np.repeat(np.arange(len(tickers)), lengths)
+    sums = np.bincount(owners, weights=scores, minlength=len(tickers))
+    means = np.divide(sums, lengths, out=np.zeros(len(tickers)), where=lengths > 0)
+    aggregate = np.clip(np.rint(means * 100), -100, 100).astype(int)
+
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return {
+        t: (int(aggregate[i]), scores[bounds[i]:bounds[i + 1]].tolist())
+        for i, t in enumerate(tickers)
+    }
@@ -0,0 +1,253 @@
+"""
+Heatmap Module
+Market-wide sector heatmap over the fundamentals universe (data/universe.txt),
+grouped by sector and weighted by market cap.
+
+A background refresher downloads the latest and previous close for every
+universe symbol in a few bulk yf.download calls and writes them to the
+shared quote board. Sectors and market caps come from the fundamentals
+store. Each process keeps the finished heatmap as serialized JSON and
+rebuilds it only when the board has been refreshed, so a page load is a
+counter comparison and a cached response whatever the universe size.
+"""
+
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import fundamentals
+import quotes
+from metrics import upstream, record_cache, record_upstream_error
+
+
+# Seconds between bulk refreshes of the universe's quotes
+REFRESH_INTERVAL = 60
+
+# Symbols per yf.download call and the daily history it covers (enough to
+# reach the previous close over a long weekend)
+BULK_CHUNK = 200
+BULK_PERIOD = '5d'
+
+
+def _last_two(closes: np.ndarray) -> tuple:
+    """Last and previous non-NaN value per column of a (days x symbols) array."""
+    rows = np.arange(len(closes))[:, None]
+    valid_rows = np.where(np.isnan(closes), -1, rows)
+    last = valid_rows.max(axis=0)
+    prev = np.where(valid_rows == last, -1, valid_rows).max(axis=0)
+
+    def pick(index):
+        values = np.take_along_axis(closes, np.maximum(index, 0)[None, :], axis=0)[0]
+        return np.where(index >= 0, values, np.nan)
+
+    return pick(last), pick(prev)
+
+
+def bulk_quotes(symbols: list) -> tuple:
+    """
+    Latest and previous daily close for many symbols, in chunks of BULK_CHUNK.
+
+    Returns:
+        tuple: (price, prev_close) arrays aligned with symbols; NaN where a
+               symbol could not be downloaded
+    """
+    price = np.full(len(symbols), np.nan)
+    prev_close = np.full(len(symbols), np.nan)
+    for start in range(0, len(symbols), BULK_CHUNK):
+        chunk = symbols[start:start + BULK_CHUNK]
+        try:
+            with upstream('yf.download'):
+                df = yf.download(chunk, period=BULK_PERIOD, interval='1d', auto_adjust=False,
+                                 group_by='column', threads=True, progress=False)
+        except Exception:
+            record_upstream_error('yf.download')
+            continue
+        if df.empty:
+            record_upstream_error('yf.download')
+            continue
+        closes = df['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(chunk[0])
+        closes = closes.reindex(columns=chunk).to_numpy(dtype=np.float64)
+        price[start:start + len(chunk)], prev_close[start:start + len(chunk)] = _last_two(closes)
+    return price, prev_close
+
+
+def build_heatmap(snapshot: fundamentals.FundamentalsSnapshot, symbols: list,
+                  price: np.ndarray, prev_close: np.ndarray, updated_at: np.ndarray) -> dict:
+    """
+    Group quoted symbols by sector with market-cap weights.
+
+    Market caps from the fundamentals snapshot are scaled by the move in
+    price since that snapshot, so weights follow the live quotes. Symbols
+    without a quote or a market cap are left out and counted as missing.
+
+    Args:
+        snapshot (FundamentalsSnapshot): Sector, name, market cap and price per symbol
+        symbols (list): Universe symbols
+        price, prev_close, updated_at (np.ndarray): Quote arrays aligned with symbols
+
+    Returns:
+        dict: Market totals plus one entry per sector (largest first) with
+              column lists for its symbols (largest first)
+    """
+    rows = np.array([snapshot.index.get(s, -1) for s in symbols], dtype=np.int64)
+    known = rows >= 0
+    cap = np.full(len(symbols), np.nan)
+    cap[known] = snapshot.columns['marketCap'][rows[known]]
+    snapshot_price = np.full(len(symbols), np.nan)
+    snapshot_price[known] = snapshot.columns['price'][rows[known]]
+    cap = np.where(snapshot_price > 0, cap * price / snapshot_price, cap)
+
+    keep = np.flatnonzero((cap > 0) & (price > 0) & (prev_close > 0))
+    rows, cap, price, prev_close = rows[keep], cap[keep], price[keep], prev_close[keep]
+    change = (price - prev_close) / prev_close * 100
+    total_cap = cap.sum()
+
+    sector_names, sector_of = np.unique(snapshot.columns['sector'][rows], return_inverse=True)
+    sector_cap = np.bincount(sector_of, weights=cap, minlength=len(sector_names))
+    sector_change = np.bincount(sector_of, weights=cap * change, minlength=len(sector_names)) / sector_cap
+    advancers = np.bincount(sector_of, weights=change > 0, minlength=len(sector_names))
+    decliners = np.bincount(sector_of, weights=change < 0, minlength=len(sector_names))
+
+    sector_order = np.argsort(-sector_cap, kind='stable')
+    sector_rank = np.empty_like(sector_order)
+    sector_rank[sector_order] = np.arange(len(sector_order))
+    # Tiles grouped by sector (largest sector first), largest cap first within a sector
+    order = np.lexsort((-cap, sector_rank[sector_of]))
+    bounds = np.r_[0, np.cumsum(np.bincount(sector_of, minlength=len(sector_names))[sector_order])]
+
+    tickers = snapshot.columns['ticker'][rows[order]].tolist()
+    names = snapshot.columns['name'][rows[order]].tolist()
+    prices = np.round(price[order], 2).tolist()
+    changes = np.round(change[order], 2).tolist()
+    weights = np.round(cap[order] / total_cap * 100, 4).tolist() if len(order) else []
+
+    sectors = []
+    for i, s in enumerate(sector_order):
+        lo, hi = bounds[i], bounds[i + 1]
+        sectors.append({
+            "sector": str(sector_names[s]),
+            "market_cap": float(sector_cap[s]),
+            "weight": round(float(sector_cap[s] / total_cap * 100), 4),
+            "change_percent": round(float(sector_change[s]), 2),
+            "advancers": int(advancers[s]),
+            "decliners": int(decliners[s]),
+            "symbols": tickers[lo:hi],
+            "names": names[lo:hi],
+            "prices": prices[lo:hi],
+            "changes": changes[lo:hi],
+            "weights": weights[lo:hi],
+        })
+
+    quoted_at = updated_at[updated_at > 0]
+    return {
+        "universe": len(symbols),
+        "quoted": int(len(keep)),
+        "missing": int(len(symbols) - len(keep)),
+        "market_cap": float(total_cap),
+        "change_percent": round(float((cap * change).sum() / total_cap), 2) if len(keep) else None,
+        "advancers": int((change > 0).sum()),
+        "decliners": int((change < 0).sum()),
+        "updated_at": float(quoted_at.min()) if len(quoted_at) else None,
+        "fundamentals_updated_at": snapshot.updated_at,
+        "sectors": sectors,
+    }
+
+
+class SectorHeatmap:
+    """Bulk-refreshed universe quotes and the cached heatmap built from them."""
+
+    def __init__(self, board: quotes.QuoteBoard = None, refresh_interval: float = REFRESH_INTERVAL):
+        self.board = board or quotes.board
+        self.refresh_interval = refresh_interval
+        self._payload = None
+        self._version = None
+        self._seeded = False
+        # Symbols whose fundamentals have been requested at least once
+        self._looked_up = set()
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def refresh(self, symbols: list = None) -> int:
+        """
+        Download quotes for the universe in bulk and write them to the board.
+        Symbols the fundamentals store has not seen are looked up first.
+
+        Returns:
+            int: Number of symbols quoted
+        """
+        symbols = symbols or fundamentals.load_universe()
+        store = fundamentals.get_store()
+        unseen = [s for s in symbols if s not in store.snapshot.index and s not in self._looked_up]
+        if unseen:
+            self._looked_up.update(unseen)
+            store.refresh(unseen)
+
+        start = time.perf_counter()
+        price, prev_close = bulk_quotes(symbols)
+        self.board.write_many(symbols, price, prev_close)
+        quoted = int(np.count_nonzero(~np.isnan(price)))
+        print(f"✅ Refreshed heatmap quotes for {quoted}/{len(symbols)} symbols "
+              f"in {time.perf_counter() - start:.1f}s")
+        return quoted
+
+    def get(self) -> tuple:
+        """
+        The heatmap as a JSON document, rebuilt only after the quote board
+        has been refreshed.
+
+        Returns:
+            tuple: (payload str, version str usable as an ETag)
+        """
+        version = self.board.refresh_count()
+        hit = version == self._version
+        record_cache('heatmap', hit)
+        if hit:
+            return self._payload, str(version)
+        with self._lock:
+            if self._version != version:
+                store = fundamentals.get_store()
+                store.reload()
+                symbols = fundamentals.load_universe()
+                price, prev_close, updated_at = self.board.read_many(symbols)
+                if np.all(np.isnan(price)) and not self._seeded:
+                    # Nothing on the board yet (no refresher running): seed once inline
+                    self._seeded = True
+                    self.refresh(symbols)
+                    version = self.board.refresh_count()
+                    price, prev_close, updated_at = self.board.read_many(symbols)
+                self._payload = json.dumps(build_heatmap(store.snapshot, symbols, price,
+                                                         prev_close, updated_at))
+                self._version = version
+            return self._payload, str(self._version)
+
+    def start_background_refresh(self):
+        """Start a daemon thread that re-downloads the universe every refresh_interval."""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop,
+                                               name='heatmap-refresher', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Heatmap refresh failed: {str(e)}")
+            time.sleep(max(1.0, self.refresh_interval - (time.time() - started)))
+
+
+# Shared heatmap; the bulk refresher runs in the quote refresher process (serving.py)
+heatmap = SectorHeatmap()
+
+
+def get_heatmap() -> tuple:
+    """Module-level shortcut for heatmap.get."""
+    return heatmap.get()
@@ -0,0 +1,144 @@
+"""
+Indicator Snapshot Module
+Keeps the latest RSI / MACD / Bollinger / support-resistance values per
+tracked ticker. Snapshots are recomputed when the bar store downloads new
+bars, so /technical-analysis and /chat become dictionary lookups.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+import bar_store
+from metrics import record_cache
+
+
+# Bars used for the snapshot (shares the 1y bars cached for /predict and sentiment)
+SNAPSHOT_PERIOD = "1y"
+
+# Downloads with fewer bars (e.g. the OHLCV pyramid's 1mo top-up) are too
+# short for EMA26/MACD and support/resistance and do not replace a snapshot
+SNAPSHOT_MIN_BARS = 200
+
+# Support/resistance look-back in bars (~3 months)
+SUPPORT_WINDOW = 60
+
+BULK_FETCH_WORKERS = 8
+
+
+def compute_snapshot(ticker: str, bars: pd.DataFrame) -> dict:
+    """
+    Compute the latest indicator values from daily bars.
+
+    Args:
+        ticker (str): Stock ticker symbol
+        bars (pd.DataFrame): Bars with 'Date' and 'Close' columns
+
+    Returns:
+        dict: Snapshot in the /technical-analysis response format
+    """
+    close = bars['Close'].astype(float)
+
+    # RSI
+    delta = close.diff()
+    gain = delta.clip(lower=0).rolling(14).mean()
+    loss = (-delta.clip(upper=0)).rolling(14).mean()
+    rs = gain / (loss + 1e-10)
+    rsi = 100 - (100 / (1 + rs))
+
+    # MACD
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    macd = ema12 - ema26
+    signal = macd.ewm(span=9, adjust=False).mean()
+    hist = macd - signal
+
+    # Bollinger Bands
+    sma20 = close.rolling(20).mean()
+    std20 = close.rolling(20).std()
+    upper_bb = sma20 + (std20 * 2)
+    lower_bb = sma20 - (std20 * 2)
+
+    # Support/Resistance approx (min/max of last 3 months)
+    recent = close.tail(SUPPORT_WINDOW)
+
+    return {
+        "ticker": ticker,
+        "rsi": round(float(rsi.iloc[-1]), 2),
+        "macd": round(float(macd.iloc[-1]), 2),
+        "macd_signal": round(float(signal.iloc[-1]), 2),
+        "macd_hist": round(float(hist.iloc[-1]), 2),
+        "bb_upper": round(float(upper_bb.iloc[-1]), 2),
+        "bb_lower": round(float(lower_bb.iloc[-1]), 2),
+        "bb_mid": round(float(sma20.iloc[-1]), 2),
+        "support": round(float(recent.min()), 2),
+        "resistance": round(float(recent.max()), 2),
+        "current_price": round(float(close.iloc[-1]), 2),
+        "as_of": pd.to_datetime(bars['Date'].iloc[-1]).strftime('%Y-%m-%d')
+    }
+
+
+class SnapshotTable:
+    """Latest indicator snapshot per ticker, maintained from bar-store updates."""
+
+    def __init__(self, store: bar_store.BarStore = None):
+        self.store = store or bar_store.store
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self.store.subscribe(self._on_new_bars)
+
+    def _on_new_bars(self, ticker: str, bars: pd.DataFrame):
+        if len(bars) < SNAPSHOT_MIN_BARS:
+            # Short download: leave it to get(), which reads SNAPSHOT_PERIOD of bars
+            return
+        snapshot = compute_snapshot(ticker, bars)
+        with self._lock:
+            self._snapshots[ticker] = snapshot
+
+    def get(self, ticker: str) -> dict:
+        """
+        Snapshot for one ticker. A lookup is O(1) while the ticker's bars are
+        fresh; otherwise the snapshot is rebuilt from SNAPSHOT_PERIOD of bars
+        (downloaded only if the bar store holds less).
+        """
+        ticker = ticker.upper()
+        snapshot = self._snapshots.get(ticker)
+        hit = snapshot is not None and self.store.is_fresh(ticker)
+        record_cache('indicator_snapshots', hit)
+        if hit:
+            return snapshot
+        bars = self.store.get_bars(ticker, SNAPSHOT_PERIOD)
+        if bars.empty:
+            raise ValueError(f"No data found for ticker: {ticker}")
+        # Built here even if the download's listener already did: the cached
+        # bars may predate the table, and a young ticker has fewer than
+        # SNAPSHOT_MIN_BARS bars even over the full period
+        snapshot = compute_snapshot(ticker, bars)
+        with self._lock:
+            self._snapshots[ticker] = snapshot
+        return snapshot
+
+    def get_many(self, tickers: list) -> dict:
+        """
+        Snapshots for many tickers; cache misses are fetched in parallel.
+
+        Returns:
+            dict: {ticker: snapshot or {"ticker", "error"}}
+        """
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+
+        def safe_get(t):
+            try:
+                return self.get(t)
+            except Exception as e:
+                return {"ticker": t, "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS) as pool:
+            return dict(zip(tickers, pool.map(safe_get, tickers)))
+
+    def tickers(self) -> list:
+        return list(self._snapshots)
+
+
+# Shared table used by the API
+table = SnapshotTable()
@@ -0,0 +1,401 @@
+"""
+Intraday Module
+Minute-resolution bars stored as append-only day partitions.
+
+Each ticker/interval keeps one partition per trading day, both in memory
+and on disk under data/intraday/<TICKER>/<interval>/<YYYY-MM-DD>.bin.
+A partition is a packed array of BAR_DTYPE rows (28 bytes per bar); new
+bars are only ever appended. Finished days never change. Technical
+indicators are computed one partition at a time, carrying the rolling and
+EMA state across partitions. This matches add_technical_indicators on
+the full series, and a new bar only recomputes today's chunk. Training
+windows are cut per partition with sliding_window_view, so the full
+(samples, sequence_length, features) array is never built.
+
+Three months of 1-minute bars (~25k bars) take about 0.7 MB per ticker,
+or about 1.7 MB with indicators.
+"""
+
+import os
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+from data_loader import fetch_stock_data
+from preprocessing import FEATURE_COLUMNS
+from market_hours import exchange_tz, bar_delta, is_intraday
+from metrics import record_cache
+
+
+DATA_DIR = os.environ.get('NEUROSTOCK_INTRADAY_DIR', 'data/intraday')
+
+# Partitions (trading days) retained per ticker and interval
+MAX_DAYS = 90
+
+# Seconds before the latest partition is topped up from yfinance
+INTRADAY_TTL = 60
+
+# Look-back yfinance allows per interval (1m is limited to the last 7 days)
+FETCH_PERIODS = {'1m': '5d', '2m': '1mo', '5m': '1mo', '15m': '1mo', '30m': '1mo',
+                 '60m': '1y', '90m': '60d', '1h': '1y'}
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),           # bar start, epoch seconds (UTC)
+    ('open', '<f4'),
+    ('high', '<f4'),
+    ('low', '<f4'),
+    ('close', '<f4'),
+    ('volume', '<f4'),
+])
+
+# Indicator columns in computation order (superset of FEATURE_COLUMNS)
+INDICATOR_COLUMNS = ['Close', 'Volume', 'SMA_20', 'SMA_50', 'EMA_12', 'EMA_26',
+                     'RSI', 'MACD', 'MACD_Signal', 'MACD_Hist']
+
+# Bars of history a partition needs from its predecessor (SMA_50 window)
+WARMUP_BARS = 50
+
+
+def _ema(values: np.ndarray, span: int, prev: float) -> np.ndarray:
+    """adjust=False EMA continuing from prev (NaN prev: start at the first value)."""
+    alpha = 2.0 / (span + 1)
+    if np.isnan(prev):
+        prev, values = values[0], values[1:]
+        head = [prev]
+    else:
+        head = []
+    out, _ = lfilter([alpha], [1, -(1 - alpha)], values, zi=[(1 - alpha) * prev])
+    return np.concatenate([head, out])
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.insert(values, 0, 0.0))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def to_bars(df: pd.DataFrame) -> np.ndarray:
+    """BAR_DTYPE rows from a bars DataFrame ('Date' + OHLCV), dropping rows without a close."""
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    dates = pd.to_datetime(df['Date'])
+    if dates.dt.tz is None:
+        dates = dates.dt.tz_localize('UTC')
+    rows = np.empty(len(df), dtype=BAR_DTYPE)
+    rows['ts'] = ((dates - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(np.int64)
+    for field, column in (('open', 'Open'), ('high', 'High'), ('low', 'Low'),
+                          ('close', 'Close'), ('volume', 'Volume')):
+        rows[field] = df[column].to_numpy(dtype=np.float64)
+    return rows[np.isfinite(rows['close'])]
+
+
+class IndicatorState:
+    """Carry-over between partitions: recent closes and the EMA levels."""
+
+    def __init__(self):
+        self.tail = np.empty(0)
+        self.ema12 = self.ema26 = self.signal = np.nan
+
+    def compute(self, bars: np.ndarray) -> tuple:
+        """
+        Indicators for one partition.
+
+        Returns:
+            tuple: (features float32 (n, len(INDICATOR_COLUMNS)), state after the partition)
+        """
+        close = bars['close'].astype(np.float64)
+        full = np.concatenate([self.tail, close])
+        skip = len(self.tail)
+
+        sma20 = _rolling_mean(full, 20)[skip:]
+        sma50 = _rolling_mean(full, 50)[skip:]
+        ema12 = _ema(close, 12, self.ema12)
+        ema26 = _ema(close, 26, self.ema26)
+        macd = ema12 - ema26
+        signal = _ema(macd, 9, self.signal)
+
+        delta = np.diff(full, prepend=np.nan)
+        gain = _rolling_mean(np.where(delta > 0, delta, 0.0), 14)
+        loss = _rolling_mean(np.where(delta < 0, -delta, 0.0), 14)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = (100 - 100 / (1 + gain / loss))[skip:]
+
+        features = np.column_stack([close, bars['volume'], sma20, sma50, ema12, ema26,
+                                    rsi, macd, signal, macd - signal]).astype(np.float32)
+        state = IndicatorState()
+        state.tail = full[-(WARMUP_BARS - 1):]
+        if len(close):
+            state.ema12, state.ema26, state.signal = ema12[-1], ema26[-1], signal[-1]
+        else:
+            state.ema12, state.ema26, state.signal = self.ema12, self.ema26, self.signal
+        return features, state
+
+
+@contextmanager
+def _dir_lock(directory: str):
+    """Exclusive cross-process lock on a partition directory (gunicorn workers and the refresher all append)."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class IntradayStore:
+    """Per ticker/interval list of day partitions, persisted append-only."""
+
+    def __init__(self, data_dir: str = DATA_DIR, max_days: int = MAX_DAYS, ttl: float = INTRADAY_TTL):
+        self.data_dir = data_dir
+        self.max_days = max_days
+        self.ttl = ttl
+        # (ticker, interval) -> {session date: BAR_DTYPE array}
+        self._partitions = {}
+        # (ticker, interval) -> {session date: (row count, features, state after)}
+        self._indicators = {}
+        self._fetched_at = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _key_lock(self, key: tuple):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.RLock())
+
+    def _dir(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.data_dir, ticker, interval)
+
+    def _partitions_for(self, ticker: str, interval: str) -> dict:
+        key = (ticker, interval)
+        parts = self._partitions.get(key)
+        if parts is None:
+            parts = {}
+            if os.path.isdir(self._dir(ticker, interval)):
+                with _dir_lock(self._dir(ticker, interval)):
+                    self._sync(ticker, interval, parts)
+            self._partitions[key] = parts
+        return parts
+
+    def _sync(self, ticker: str, interval: str, parts: dict):
+        """
+        Bring in-memory partitions in line with the files other processes
+        wrote or retired. Call with the directory lock held. A file with
+        duplicate or unordered bars is rewritten sorted and deduplicated.
+        """
+        directory = self._dir(ticker, interval)
+        sizes = {pd.Timestamp(name[:-4]).date(): os.path.getsize(os.path.join(directory, name))
+                 for name in os.listdir(directory) if name.endswith('.bin')}
+        for day in [d for d in parts if d not in sizes]:
+            parts.pop(day)
+            self._indicators.get((ticker, interval), {}).pop(day, None)
+        for day, size in sizes.items():
+            if day in parts and parts[day].nbytes == size:
+                continue
+            path = os.path.join(directory, f"{day.isoformat()}.bin")
+            bars = np.fromfile(path, dtype=BAR_DTYPE)
+            if len(bars) > 1 and not np.all(np.diff(bars['ts']) > 0):
+                _, first = np.unique(bars['ts'], return_index=True)
+                bars = bars[first]
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(bars.tobytes())
+                os.replace(path + '.tmp', path)
+            parts[day] = bars
+
+    def append(self, ticker: str, interval: str, df: pd.DataFrame) -> int:
+        """
+        Append downloaded bars newer than the last stored bar.
+
+        Appends hold a cross-process lock on the partition directory and
+        first re-read what other processes have written, so each bar is
+        stored once whichever process downloaded it.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Bar interval
+            df (pd.DataFrame): Bars with 'Date' and OHLCV columns
+
+        Returns:
+            int: Number of bars appended
+        """
+        ticker = ticker.upper()
+        if df.empty:
+            return 0
+        rows = to_bars(df)
+
+        directory = self._dir(ticker, interval)
+        with self._key_lock((ticker, interval)), _dir_lock(directory):
+            parts = self._partitions.setdefault((ticker, interval), {})
+            self._sync(ticker, interval, parts)
+            last_ts = max((p['ts'][-1] for p in parts.values() if len(p)), default=-1)
+            rows = np.sort(rows[rows['ts'] > last_ts], order='ts')
+            if not len(rows):
+                return 0
+            # Partition by trading day in exchange time
+            days = pd.to_datetime(rows['ts'], unit='s', utc=True).tz_convert(exchange_tz(ticker)).date
+            for day in dict.fromkeys(days):
+                chunk = rows[days == day]
+                with open(os.path.join(directory, f"{day.isoformat()}.bin"), 'ab') as f:
+                    f.write(chunk.tobytes())
+                existing = parts.get(day)
+                parts[day] = chunk if existing is None else np.concatenate([existing, chunk])
+            self._retain(ticker, interval, parts)
+            return len(rows)
+
+    def _retain(self, ticker: str, interval: str, parts: dict):
+        for day in sorted(parts)[:-self.max_days]:
+            parts.pop(day)
+            self._indicators.get((ticker, interval), {}).pop(day, None)
+            try:
+                os.remove(os.path.join(self._dir(ticker, interval), f"{day.isoformat()}.bin"))
+            except OSError:
+                pass
+
+    def refresh(self, ticker: str, interval: str, force: bool = False) -> int:
+        """Top up a ticker from yfinance if its bars are older than the TTL."""
+        ticker = ticker.upper()
+        key = (ticker, interval)
+        hit = not force and time.time() - self._fetched_at.get(key, 0) <= self.ttl
+        record_cache('intraday_bars', hit)
+        if hit:
+            return 0
+        with self._key_lock(key):
+            if not force and time.time() - self._fetched_at.get(key, 0) <= self.ttl:
+                return 0
+            period = FETCH_PERIODS.get(interval)
+            if period is None:
+                raise ValueError(f"Unsupported intraday interval '{interval}'")
+            df = fetch_stock_data(ticker, period=period, interval=interval)
+            # The newest bar is still forming; it is appended once it has closed
+            closed = pd.to_datetime(df['Date'], utc=True) + bar_delta(interval) <= pd.Timestamp.now(tz='UTC')
+            appended = self.append(ticker, interval, df[closed.to_numpy()])
+            self._fetched_at[key] = time.time()
+            return appended
+
+    def days(self, ticker: str, interval: str) -> list:
+        return sorted(self._partitions_for(ticker.upper(), interval))
+
+    def partition(self, ticker: str, interval: str, day) -> np.ndarray:
+        return self._partitions_for(ticker.upper(), interval)[day]
+
+    def indicator_chunks(self, ticker: str, interval: str, days: int = None):
+        """
+        Yield (day, bars, features) per partition, oldest first. Features are
+        computed chunk by chunk and cached. Only chunks whose bar count changed
+        (today's) and the chunks after them are recomputed.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Bar interval
+            days (int): Only yield the most recent N partitions (all are still
+                walked for the indicator state)
+        """
+        ticker = ticker.upper()
+        key = (ticker, interval)
+        with self._key_lock(key):
+            parts = self._partitions_for(ticker, interval)
+            ordered = sorted(parts)
+            cache = self._indicators.setdefault(key, {})
+            state = IndicatorState()
+            dirty = False
+            chunks = []
+            for day in ordered:
+                bars = parts[day]
+                cached = cache.get(day)
+                if dirty or cached is None or cached[0] != len(bars):
+                    features, after = state.compute(bars)
+                    cache[day] = cached = (len(bars), features, after)
+                    dirty = True
+                chunks.append((day, bars, cached[1]))
+                state = cached[2]
+        yield from chunks[-days:] if days else chunks
+
+    def get_indicators(self, ticker: str, interval: str, days: int = 5) -> pd.DataFrame:
+        """
+        Intraday bars with indicators as a DataFrame (like bar_store.get_indicators).
+
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): Bar interval ('1m' ... '90m')
+            days (int): Trading days to include
+
+        Returns:
+            pd.DataFrame: 'Date' (exchange time) plus OHLCV and indicator columns,
+                warm-up rows dropped
+        """
+        if not is_intraday(interval):
+            raise ValueError("Use bar_store for daily bars")
+        self.refresh(ticker, interval)
+        chunks = list(self.indicator_chunks(ticker, interval, days))
+        if not chunks:
+            raise ValueError(f"No intraday data found for ticker: {ticker}")
+        bars = np.concatenate([c[1] for c in chunks])
+        features = np.concatenate([c[2] for c in chunks])
+        df = pd.DataFrame({
+            'Date': pd.to_datetime(bars['ts'], unit='s', utc=True).tz_convert(exchange_tz(ticker)),
+            'Open': bars['open'].astype(np.float64),
+            'High': bars['high'].astype(np.float64),
+            'Low': bars['low'].astype(np.float64),
+        })
+        df[INDICATOR_COLUMNS] = features.astype(np.float64)
+        return df.dropna().reset_index(drop=True)
+
+    def memory_bytes(self) -> int:
+        """Bytes held by partitions and cached indicators."""
+        total = sum(p.nbytes for parts in self._partitions.values() for p in parts.values())
+        total += sum(c[1].nbytes for cache in self._indicators.values() for c in cache.values())
+        return total
+
+
+def stream_windows(chunks, sequence_length: int, feature_idx: list, scaler, warmup_chunks: int = 0):
+    """
+    Yield (X, y) per partition: windows of scaled features and the next
+    bar's scaled close. Windows span partition boundaries through a carried
+    tail, and rows with indicator warm-up NaNs are skipped.
+
+    Args:
+        chunks: Iterable of (day, bars, features) from indicator_chunks()
+        sequence_length (int): Bars per input window
+        feature_idx (list): Indicator column indexes used as model features
+        scaler: Fitted scaler (transform on the selected features)
+        warmup_chunks (int): Leading chunks that only fill the carried tail
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+    carry = np.empty((0, len(feature_idx)), dtype=np.float32)
+    for i, (_, _, features) in enumerate(chunks):
+        selected = features[:, feature_idx]
+        selected = selected[~np.isnan(selected).any(axis=1)]
+        if not len(selected):
+            continue
+        block = np.concatenate([carry, scaler.transform(selected).astype(np.float32)])
+        if i >= warmup_chunks and len(block) > sequence_length:
+            # (n, features, seq) view -> (n, seq, features); the last window has no target
+            windows = sliding_window_view(block, sequence_length, axis=0)[:-1].transpose(0, 2, 1)
+            yield np.ascontiguousarray(windows), block[sequence_length:, 0]
+        carry = block[-sequence_length:]
+
+
+def window_count(chunks, sequence_length: int, feature_idx: list, warmup_chunks: int = 0) -> int:
+    """Number of (X, y) samples stream_windows() yields for the same arguments."""
+    valid = [int((~np.isnan(c[2][:, feature_idx]).any(axis=1)).sum()) for c in chunks]
+    warm = sum(valid[:warmup_chunks])
+    return max(0, warm + sum(valid[warmup_chunks:]) - max(sequence_length, warm))
+
+
+def feature_indexes(feature_columns: list = None) -> list:
+    return [INDICATOR_COLUMNS.index(c) for c in (feature_columns or FEATURE_COLUMNS)]
+
+
+def model_key(ticker: str, interval: str) -> str:
+    """Model bundle name for a ticker's intraday model (daily models use the ticker)."""
+    return ticker.upper() if not is_intraday(interval) else f"{ticker.upper()}_{interval.upper()}"
+
+
+# Shared instance used by the API and training
+store = IntradayStore()
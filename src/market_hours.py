@@ -0,0 +1,88 @@
+"""
+Market Hours Module
+Session calendar used to stamp forecasts with the bar times they will
+actually have: business days for daily equity bars, regular-session bar
+starts (09:30-16:00 New York) for intraday equity bars, and round-the-clock
+bars for crypto. Exchange holidays are not modeled.
+"""
+
+import math
+import pandas as pd
+
+
+EXCHANGE_TZ = 'America/New_York'
+SESSION_OPEN = pd.Timedelta(hours=9, minutes=30)
+SESSION_CLOSE = pd.Timedelta(hours=16)
+
+# Bar length of every yfinance interval up to one day
+INTERVAL_MINUTES = {
+    '1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30,
+    '60m': 60, '90m': 90, '1h': 60, '1d': 24 * 60,
+}
+
+CRYPTO_SUFFIXES = ('-USD', '-USDT', '-EUR', '-GBP', '-BTC', '-ETH')
+
+
+def is_intraday(interval: str) -> bool:
+    return interval != '1d'
+
+
+def trades_24_7(ticker: str) -> bool:
+    return ticker.upper().endswith(CRYPTO_SUFFIXES)
+
+
+def bar_delta(interval: str) -> pd.Timedelta:
+    if interval not in INTERVAL_MINUTES:
+        raise ValueError(f"Unsupported interval '{interval}'. Options: {', '.join(INTERVAL_MINUTES)}")
+    return pd.Timedelta(minutes=INTERVAL_MINUTES[interval])
+
+
+def bars_per_session(ticker: str, interval: str) -> int:
+    """Bars in one trading day: the regular session for equities, 24 hours for 24/7 markets."""
+    if not is_intraday(interval):
+        return 1
+    session = pd.Timedelta(days=1) if trades_24_7(ticker) else SESSION_CLOSE - SESSION_OPEN
+    return math.ceil(session / bar_delta(interval))
+
+
+def exchange_tz(ticker: str) -> str:
+    """Time zone that bars are stamped and split into trading days in."""
+    return 'UTC' if trades_24_7(ticker) else EXCHANGE_TZ
+
+
+def next_bar_times(last: pd.Timestamp, steps: int, interval: str, ticker: str) -> list:
+    """
+    Start times of the next `steps` bars after `last`.
+
+    Args:
+        last (pd.Timestamp): Time of the latest bar (tz-aware for intraday)
+        steps (int): Number of future bars
+        interval (str): Bar interval ('1m' ... '90m', '1h', '1d')
+        ticker (str): Symbol, to tell 24/7 markets from exchange sessions
+
+    Returns:
+        list: pd.Timestamp per future bar
+    """
+    last = pd.Timestamp(last)
+    step = bar_delta(interval)
+    if not is_intraday(interval):
+        if trades_24_7(ticker):
+            return list(pd.date_range(last + step, periods=steps, freq='D'))
+        return list(pd.bdate_range(last + pd.offsets.BDay(1), periods=steps))
+
+    if trades_24_7(ticker):
+        return [last + step * (i + 1) for i in range(steps)]
+
+    # Step through exchange-local wall-clock time so DST changes keep 09:30 at 09:30
+    aware = last.tzinfo is not None
+    current = last.tz_convert(EXCHANGE_TZ).tz_localize(None) if aware else last
+    times = []
+    while len(times) < steps:
+        current = current + step
+        day = current.normalize()
+        if current.weekday() >= 5 or current >= day + SESSION_CLOSE:
+            current = (day + pd.offsets.BDay(1)) + SESSION_OPEN
+        elif current < day + SESSION_OPEN:
+            current = day + SESSION_OPEN
+        times.append(current.tz_localize(EXCHANGE_TZ) if aware else current)
+    return times
@@ -0,0 +1,419 @@
+"""
+Metrics Module
+Collects per-stage latency histograms and counters and renders them
+in the Prometheus text exposition format for the /metrics endpoint.
+
+Under gunicorn (NEUROSTOCK_METRICS_DIR set by gunicorn.conf.py) every
+process writes its metrics to <dir>/<pid>.json about once a second, and
+/metrics merges the files: counters and histograms are summed over all
+processes, including exited workers, and per-process gauges get a pid
+label. Whichever worker answers the scrape, it reports the whole server.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# Latency buckets in seconds (cover cached lookups up to auto-training)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Batch-size buckets for model.predict calls
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# Endpoint of the request currently being served (set by the Flask hooks)
+_current_endpoint = ContextVar('neurostock_endpoint', default='cli')
+
+# Per-process metric files merged by render() (unset: this process only)
+MULTIPROCESS_DIR = os.environ.get('NEUROSTOCK_METRICS_DIR')
+FLUSH_INTERVAL = 1.0
+
+
+def _label_str(labelnames: tuple, values: tuple, extra: str = '') -> str:
+    """Format a Prometheus label set, e.g. {endpoint="predict",stage="fetch"}."""
+    parts = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(dumps) -> dict:
+        """Sum flushed [[labels, value], ...] lists from several processes."""
+        values = {}
+        for dump in dumps:
+            for key, val in dump:
+                key = tuple(key)
+                values[key] = values.get(key, 0.0) + val
+        return values
+
+    def render(self, values: dict = None) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        values = self.collect() if values is None else values
+        for key, val in sorted(values.items()):
+            lines.append(f'{self.name}{_label_str(self.labelnames, key)} {val:g}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * len(self.buckets) + [0.0, 0]
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(dumps) -> dict:
+        """Sum flushed [[labels, series], ...] lists bucket by bucket."""
+        merged = {}
+        for dump in dumps:
+            for key, series in dump:
+                key = tuple(key)
+                total = merged.get(key)
+                merged[key] = list(series) if total is None else [a + b for a, b in zip(total, series)]
+        return merged
+
+    def render(self, series_by_key: dict = None) -> list:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        series_by_key = self.collect() if series_by_key is None else series_by_key
+        for key, series in sorted(series_by_key.items()):
+            for bound, count in zip(self.buckets, series):
+                labels = _label_str(self.labelnames, key, f'le="{bound:g}"')
+                lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _label_str(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {series[-1]}')
+            labels = _label_str(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+class Gauge:
+    """
+    Gauge whose value is computed by a callback at scrape time.
+
+    per_process gauges describe the process they run in; in multiprocess
+    mode each live process reports its own value under a pid label.
+    """
+
+    def __init__(self, name: str, help_text: str, fn, per_process: bool = True):
+        self.name = name
+        self.help_text = help_text
+        self.fn = fn
+        self.per_process = per_process
+
+    def value(self):
+        """Current value (a number or {label_value: number}), or None if the callback fails."""
+        try:
+            value = self.fn()
+        except Exception:
+            return None
+        if isinstance(value, dict):
+            return {str(label): float(val) for label, val in value.items()}
+        return float(value)
+
+    def render(self, values: list = None) -> list:
+        """Render this process's value, or [(pid, value), ...] flushed by live processes."""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        if values is None:
+            value = self.value()
+            values = [] if value is None else [(None, value)]
+        for pid, value in values:
+            pid_label = '' if pid is None else f'pid="{pid}"'
+            if isinstance(value, dict):
+                # {label_value: number} for a single-label gauge
+                for label, val in sorted(value.items()):
+                    lines.append(f'{self.name}{_label_str(("name",), (label,), pid_label)} {val:g}')
+            else:
+                lines.append(f'{self.name}{_label_str((), (), pid_label)} {value:g}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'neurostock_request_seconds', 'End-to-end request latency',
+    ('endpoint', 'status'))
+STAGE_SECONDS = Histogram(
+    'neurostock_stage_seconds', 'Latency of each processing stage within a request',
+    ('endpoint', 'stage'))
+UPSTREAM_SECONDS = Histogram(
+    'neurostock_upstream_seconds', 'Latency of upstream market-data calls',
+    ('endpoint', 'call'))
+UPSTREAM_ERRORS = Counter(
+    'neurostock_upstream_errors_total', 'Upstream market-data calls that raised or returned no data',
+    ('endpoint', 'call'))
+CACHE_REQUESTS = Counter(
+    'neurostock_cache_requests_total', 'Cache lookups by result (hit/miss)',
+    ('cache', 'result'))
+INFERENCE_BATCH = Histogram(
+    'neurostock_inference_batch_size', 'Number of samples per model.predict call',
+    ('endpoint', 'kind'), buckets=BATCH_BUCKETS)
+
+_registry = [REQUEST_SECONDS, STAGE_SECONDS, UPSTREAM_SECONDS, UPSTREAM_ERRORS,
+             CACHE_REQUESTS, INFERENCE_BATCH]
+
+
+def register(metric):
+    """Add a metric (Counter, Histogram or Gauge) to the /metrics output."""
+    _registry.append(metric)
+    return metric
+
+
+def register_gauge(name: str, help_text: str, fn, per_process: bool = True) -> Gauge:
+    """Register a callback gauge evaluated on every scrape."""
+    return register(Gauge(name, help_text, fn, per_process))
+
+
+def _cache_hit_ratio() -> dict:
+    totals = {}
+    if MULTIPROCESS_DIR:
+        values = CACHE_REQUESTS.merge(state['metrics'].get(CACHE_REQUESTS.name, [])
+                                      for _, state in _load_states())
+    else:
+        values = CACHE_REQUESTS.collect()
+    for (cache, result), val in values.items():
+        hits, total = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (val if result == 'hit' else 0.0), total + val)
+    return {cache: (hits / total if total else 0.0) for cache, (hits, total) in totals.items()}
+
+
+def _trained_model_count(models_dir: str = "models") -> int:
+    if not os.path.isdir(models_dir):
+        return 0
+    names = os.listdir(models_dir)
+    # Published bundles (models/<TICKER>/CURRENT) plus legacy models not yet migrated
+    bundled = {n for n in names if os.path.exists(os.path.join(models_dir, n, 'CURRENT'))}
+    legacy = {n[:-len('_metadata.json')].upper() for n in names if n.endswith('_metadata.json')}
+    return len(bundled | legacy)
+
+
+register_gauge('neurostock_cache_hit_ratio', 'Hit ratio per cache since server start', _cache_hit_ratio,
+               per_process=False)
+register_gauge('neurostock_models_trained', 'Number of trained models available on disk', _trained_model_count,
+               per_process=False)
+
+
+def set_endpoint(name: str):
+    """Tag all spans recorded in the current context with an endpoint name."""
+    return _current_endpoint.set(name or 'unknown')
+
+
+def reset_endpoint(token):
+    _current_endpoint.reset(token)
+
+
+def current_endpoint() -> str:
+    return _current_endpoint.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a processing stage of the current request.
+
+    Args:
+        name (str): Stage name, e.g. 'fetch', 'indicators', 'rollout'
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start,
+                              endpoint=_current_endpoint.get(), stage=name)
+
+
+@contextmanager
+def upstream(call: str):
+    """
+    Time an upstream (yfinance) call and count it as an error if it raises.
+
+    Args:
+        call (str): Upstream call name, e.g. 'yf.download', 'yf.fast_info'
+    """
+    endpoint = _current_endpoint.get()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(endpoint=endpoint, call=call)
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, call=call)
+
+
+def record_upstream_error(call: str):
+    """Count an upstream call that returned no data without raising."""
+    UPSTREAM_ERRORS.inc(endpoint=_current_endpoint.get(), call=call)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup for the hit-rate metrics."""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_batch(kind: str, size: int):
+    """Record the number of samples passed to a single model.predict call."""
+    INFERENCE_BATCH.observe(size, endpoint=_current_endpoint.get(), kind=kind)
+
+
+_flusher_pid = None
+_flush_lock = threading.Lock()
+
+
+def _state_path(pid: int) -> str:
+    return os.path.join(MULTIPROCESS_DIR, f"{pid}.json")
+
+
+def flush():
+    """Write this process's counters, histograms and (if it runs the flusher) gauges to its file."""
+    if not MULTIPROCESS_DIR:
+        return
+    state = {'metrics': {}, 'gauges': {}}
+    for metric in list(_registry):
+        if not isinstance(metric, Gauge):
+            state['metrics'][metric.name] = [[list(key), val] for key, val in metric.collect().items()]
+        elif metric.per_process and _flusher_pid == os.getpid():
+            value = metric.value()
+            if value is not None:
+                state['gauges'][metric.name] = value
+    path = _state_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with _flush_lock:
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"⚠️ Could not write metrics: {str(e)}")
+
+
+def start_multiprocess():
+    """
+    Start flushing this process's metrics (gunicorn workers and the quote
+    refresher, right after the fork). Counts inherited from the master are
+    dropped: the master flushes its own file.
+    """
+    global _flusher_pid
+    if not MULTIPROCESS_DIR or _flusher_pid == os.getpid():
+        return
+    for metric in _registry:
+        if not isinstance(metric, Gauge):
+            metric.reset()
+    _flusher_pid = os.getpid()
+    flush()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def clear_multiprocess_dir():
+    """Drop the files of a previous server (master startup, before any fork)."""
+    if not MULTIPROCESS_DIR:
+        return
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+    for name in os.listdir(MULTIPROCESS_DIR):
+        if name.endswith('.json') or '.json.tmp' in name:
+            os.unlink(os.path.join(MULTIPROCESS_DIR, name))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _load_states() -> list:
+    """[(pid, state), ...] for every process that has flushed, exited ones included."""
+    states = []
+    for name in os.listdir(MULTIPROCESS_DIR):
+        if not (name.endswith('.json') and name[:-5].isdigit()):
+            continue
+        try:
+            with open(os.path.join(MULTIPROCESS_DIR, name)) as f:
+                states.append((int(name[:-5]), json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return states
+
+
+def render() -> str:
+    """Render every registered metric in Prometheus text format."""
+    lines = []
+    if not MULTIPROCESS_DIR:
+        for metric in _registry:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    flush()
+    states = _load_states()
+    live = [(pid, state) for pid, state in states if _alive(pid)]
+    for metric in list(_registry):
+        if not isinstance(metric, Gauge):
+            lines.extend(metric.render(metric.merge(state['metrics'].get(metric.name, [])
+                                                    for _, state in states)))
+        elif metric.per_process:
+            lines.extend(metric.render([(pid, state['gauges'][metric.name]) for pid, state in live
+                                        if metric.name in state['gauges']]))
+        else:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
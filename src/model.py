@@ -17,9 +17,21 @@ except (ImportError, AttributeError):
     from keras.callbacks import EarlyStopping, ModelCheckpoint, ReduceLROnPlateau
 
 import os
+import numpy as np
 
 
-def create_lstm_model(input_shape: tuple, units: list = None, dropout_rate: float = 0.2) -> Sequential:
+# Default number of stochastic forward passes for Monte Carlo dropout
+MC_SAMPLES = 100
+MAX_MC_SAMPLES = 1000
+
+# Attribute holding a model's compiled forward passes, keyed by the training
+# flag. Kept on the model itself: the tf.function closures reference the
+# model, so an external cache keyed by it would keep every model alive.
+_FORWARDS_ATTR = '_neurostock_forwards'
+
+
+def create_lstm_model(input_shape: tuple, units: list = None, dropout_rate: float = 0.2,
+                      learning_rate: float = None, jit_compile: bool = False) -> Sequential:
     """
     Create an LSTM model for stock price prediction.
     
@@ -27,6 +39,8 @@ def create_lstm_model(input_shape: tuple, units: list = None, dropout_rate: floa
         input_shape (tuple): Shape of input data (sequence_length, num_features)
         units (list): List of LSTM units for each layer (default: [50, 50, 50])
         dropout_rate (float): Dropout rate for regularization
+        learning_rate (float): Adam learning rate (default: Keras default)
+        jit_compile (bool): Compile the training step with XLA
     
     Returns:
         Sequential: Compiled Keras model
@@ -59,9 +73,10 @@ def create_lstm_model(input_shape: tuple, units: list = None, dropout_rate: floa
     
     # Compile the model
     model.compile(
-        optimizer='adam',
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate) if learning_rate else 'adam',
         loss='mean_squared_error',
-        metrics=['mean_absolute_error']
+        metrics=['mean_absolute_error'],
+        jit_compile=jit_compile
     )
     
     print("✅ Model created successfully!")
@@ -134,6 +149,113 @@ def load_trained_model(model_path: str = "models/best_model.h5") -> Sequential:
     return model
 
 
+def _compiled_forward(model, training: bool):
+    """Graph-compiled model(x, training=...); eager calls are ~10x slower per step."""
+    forwards = getattr(model, _FORWARDS_ATTR, None)
+    if forwards is None:
+        forwards = {}
+        # Bypass Keras attribute tracking (the functions are not model state)
+        object.__setattr__(model, _FORWARDS_ATTR, forwards)
+    forward = forwards.get(training)
+    if forward is None:
+        try:
+            import tensorflow as tf
+        except ImportError:
+            return lambda x: model(x, training=training)
+        spec = tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)
+
+        @tf.function(input_signature=[spec])
+        def forward(x):
+            return model(x, training=training)
+
+        forwards[training] = forward
+    return forward
+
+
+def _stochastic_forward(model):
+    return _compiled_forward(model, training=True)
+
+
+def rollout(model, last_sequence: np.ndarray, steps: int) -> np.ndarray:
+    """
+    Deterministic recursive forecast: each prediction is fed back as the
+    next Close, with one compiled forward call per step instead of
+    model.predict (whose per-call setup dominates single-window inference).
+
+    Args:
+        model: Trained Keras model
+        last_sequence (np.ndarray): Scaled input window of shape (sequence_length, num_features)
+        steps (int): Number of bars to roll forward
+
+    Returns:
+        np.ndarray: Scaled predictions of shape (steps,)
+    """
+    forward = _compiled_forward(model, training=False)
+    window = last_sequence[np.newaxis].astype(np.float32)
+    preds = np.empty(steps, dtype=np.float32)
+
+    for i in range(steps):
+        preds[i] = np.asarray(forward(window))[0, 0]
+        if i < steps - 1:
+            new_row = window[:, -1:, :].copy()
+            new_row[0, 0, 0] = preds[i]
+            window = np.concatenate([window[:, 1:, :], new_row], axis=1)
+
+    return preds
+
+
+def mc_dropout_predict(model, X: np.ndarray, samples: int = MC_SAMPLES) -> np.ndarray:
+    """
+    One-step Monte Carlo dropout predictions for a batch of windows.
+
+    Args:
+        model: Trained Keras model containing Dropout layers
+        X (np.ndarray): Scaled windows of shape (n, sequence_length, num_features)
+        samples (int): Number of stochastic passes per window
+
+    Returns:
+        np.ndarray: Scaled predictions of shape (samples, n)
+    """
+    forward = _stochastic_forward(model)
+    batch = np.tile(X.astype(np.float32), (samples, 1, 1))
+    return np.asarray(forward(batch))[:, 0].reshape(samples, len(X))
+
+
+def mc_dropout_rollout(model, last_sequence: np.ndarray, steps: int,
+                       samples: int = MC_SAMPLES) -> np.ndarray:
+    """
+    Recursive multi-step forecast with Monte Carlo dropout.
+
+    Dropout stays active (training=True), so each of the `samples` trajectories
+    sees a different thinned network. All trajectories are stacked into one
+    batch, giving a single forward call per horizon step instead of
+    `samples` separate predict loops.
+
+    Args:
+        model: Trained Keras model containing Dropout layers
+        last_sequence (np.ndarray): Scaled input window of shape (sequence_length, num_features)
+        steps (int): Number of days to roll forward
+        samples (int): Number of stochastic passes
+
+    Returns:
+        np.ndarray: Scaled predictions of shape (samples, steps)
+    """
+    forward = _stochastic_forward(model)
+    batch = np.repeat(last_sequence[np.newaxis].astype(np.float32), samples, axis=0)
+    paths = np.empty((samples, steps), dtype=np.float32)
+
+    for i in range(steps):
+        pred = np.asarray(forward(batch))[:, 0]
+        paths[:, i] = pred
+        if i < steps - 1:
+            # Each trajectory feeds back its own prediction as the next Close
+            new_rows = batch[:, -1:, :].copy()
+            new_rows[:, 0, 0] = pred
+            batch = np.concatenate([batch[:, 1:, :], new_rows], axis=1)
+
+    return paths
+
+
 if __name__ == "__main__":
     # Test model creation
     input_shape = (60, 9)  # 60 time steps, 9 features
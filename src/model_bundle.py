@@ -0,0 +1,420 @@
+"""
+Model Bundle Module
+Versioned single-file model format: architecture, weights, scaler and
+metadata published together, so a reader never sees a new model with an
+old scaler.
+
+Layout of models/<TICKER>/v<NNNN>.nsb:
+    MAGIC | header length (u64) | JSON header | padding | arrays (64-byte aligned)
+
+The JSON header holds the metadata, feature columns, Keras architecture,
+array offsets and a BLAKE2b content hash. Weights and scaler parameters are
+raw little-endian arrays read through np.memmap, so loading needs neither
+the h5 loader nor pickle. Bundles are written to a temp file and renamed
+into place; the CURRENT pointer is swapped the same way. Older versions
+are kept for rollback.
+
+Usage:
+    python src/model_bundle.py list AAPL
+    python src/model_bundle.py migrate AAPL      # legacy .h5/.pkl/.json -> bundle
+    python src/model_bundle.py rollback AAPL [VERSION]
+"""
+
+import os
+import sys
+import fcntl
+import json
+import time
+import struct
+import hashlib
+import threading
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+MODELS_DIR = "models"
+MAGIC = b"NSBUNDLE"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# Published versions kept per ticker (the current one always survives)
+KEEP_VERSIONS = 5
+
+SCALER_ARRAYS = ('min_', 'scale_', 'data_min_', 'data_max_')
+
+
+class BundleScaler:
+    """MinMaxScaler parameters as plain arrays (transform / inverse_transform only)."""
+
+    def __init__(self, min_: np.ndarray, scale_: np.ndarray,
+                 data_min_: np.ndarray, data_max_: np.ndarray):
+        self.min_ = min_
+        self.scale_ = scale_
+        self.data_min_ = data_min_
+        self.data_max_ = data_max_
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        return cls(*(np.asarray(getattr(scaler, name), dtype=np.float64) for name in SCALER_ARRAYS))
+
+    def transform(self, X) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, X) -> np.ndarray:
+        return (np.asarray(X, dtype=np.float64) - self.min_) / self.scale_
+
+
+class Bundle:
+    """A loaded model version."""
+
+    def __init__(self, ticker: str, version, model, scaler, metadata: dict, content_hash: str = None):
+        self.ticker = ticker
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.metadata = metadata
+        self.content_hash = content_hash
+
+
+def _ticker_dir(ticker: str, models_dir: str = MODELS_DIR) -> str:
+    return os.path.join(models_dir, ticker.upper())
+
+
+def _version_path(ticker: str, version: int, models_dir: str = MODELS_DIR) -> str:
+    return os.path.join(_ticker_dir(ticker, models_dir), f"v{version:04d}.nsb")
+
+
+def list_versions(ticker: str, models_dir: str = MODELS_DIR) -> list:
+    """Published version numbers for a ticker, oldest first."""
+    directory = _ticker_dir(ticker, models_dir)
+    if not os.path.isdir(directory):
+        return []
+    # Zero-length files are versions reserved by a publisher still writing them
+    return sorted(int(name[1:5]) for name in os.listdir(directory)
+                  if name.startswith('v') and name.endswith('.nsb') and name[1:5].isdigit()
+                  and os.path.getsize(os.path.join(directory, name)) > 0)
+
+
+def current_version(ticker: str, models_dir: str = MODELS_DIR):
+    """Version the CURRENT pointer names, or None if the ticker has no bundle."""
+    try:
+        with open(os.path.join(_ticker_dir(ticker, models_dir), "CURRENT")) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def list_tickers(models_dir: str = MODELS_DIR) -> list:
+    """Tickers with a published bundle."""
+    if not os.path.isdir(models_dir):
+        return []
+    return sorted(name for name in os.listdir(models_dir)
+                  if current_version(name, models_dir) is not None)
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _set_current(ticker: str, version: int, models_dir: str = MODELS_DIR):
+    _atomic_write(os.path.join(_ticker_dir(ticker, models_dir), "CURRENT"), f"{version}\n".encode())
+
+
+def _pad(length: int) -> int:
+    return (-length) % ALIGNMENT
+
+
+def publish(ticker: str, model, scaler, metadata: dict, models_dir: str = MODELS_DIR) -> int:
+    """
+    Write a new bundle version and make it current.
+
+    Args:
+        ticker (str): Stock ticker symbol
+        model: Trained Keras model
+        scaler: Fitted MinMaxScaler (or BundleScaler)
+        metadata (dict): Training metadata (must include 'feature_columns')
+        models_dir (str): Root models directory
+
+    Returns:
+        int: The published version number
+    """
+    ticker = ticker.upper()
+    directory = _ticker_dir(ticker, models_dir)
+    os.makedirs(directory, exist_ok=True)
+
+    if not isinstance(scaler, BundleScaler):
+        scaler = BundleScaler.from_sklearn(scaler)
+    arrays = [(f"scaler/{name}", getattr(scaler, name)) for name in SCALER_ARRAYS]
+    arrays += [(f"weights/{i}", w) for i, w in enumerate(model.get_weights())]
+
+    # Array table and data section (each array 64-byte aligned, little-endian)
+    table, chunks, offset = [], [], 0
+    for name, array in arrays:
+        array = np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder('<'))
+        raw = array.tobytes()
+        table.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape),
+                      "offset": offset, "nbytes": len(raw)})
+        chunks.append(raw + b"\0" * _pad(len(raw)))
+        offset += len(raw) + _pad(len(raw))
+    data = b"".join(chunks)
+
+    version = _reserve_version(ticker, models_dir)
+    path = _version_path(ticker, version, models_dir)
+    try:
+        header = {
+            "format_version": FORMAT_VERSION,
+            "ticker": ticker,
+            "version": version,
+            "created_at": time.time(),
+            "metadata": metadata,
+            "feature_columns": list(metadata.get('feature_columns', [])),
+            "architecture": json.loads(model.to_json()),
+            "arrays": table,
+        }
+        header["content_hash"] = _content_hash(header, data)
+
+        header_bytes = json.dumps(header).encode('utf-8')
+        prefix = MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes
+        _atomic_write(path, prefix + b"\0" * _pad(len(prefix)) + data)
+    except BaseException:
+        # Release the reservation rather than leave an empty placeholder behind
+        os.unlink(path)
+        raise
+    with open(os.path.join(directory, ".lock"), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # A concurrent publisher that reserved a later version may have finished first
+        current = current_version(ticker, models_dir)
+        if current is None or version > current:
+            _set_current(ticker, version, models_dir)
+        _prune(ticker, models_dir)
+    return version
+
+
+def _reserve_version(ticker: str, models_dir: str = MODELS_DIR) -> int:
+    """
+    Claim the next version number by creating its file exclusively, so
+    concurrent publishers (workers auto-training, the retraining CLI) never
+    write the same version. The empty file is replaced by the bundle.
+    """
+    versions = list_versions(ticker, models_dir)
+    version = (versions[-1] if versions else 0) + 1
+    while True:
+        try:
+            os.close(os.open(_version_path(ticker, version, models_dir), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return version
+        except FileExistsError:
+            version += 1
+
+
+def _content_hash(header: dict, data: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps({k: v for k, v in header.items() if k != 'content_hash'},
+                             sort_keys=True).encode('utf-8'))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def _prune(ticker: str, models_dir: str = MODELS_DIR, keep: int = KEEP_VERSIONS):
+    current = current_version(ticker, models_dir)
+    versions = list_versions(ticker, models_dir)
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            path = _version_path(ticker, version, models_dir)
+            _mapped.pop(path, None)
+            os.remove(path)
+
+
+# path -> (header, arrays). Published files are never rewritten, so a mapping
+# stays valid; mappings made before a fork are inherited by the workers.
+_mapped = {}
+
+
+def read_bundle(path: str, verify: bool = False) -> tuple:
+    """
+    Read a bundle's header and map its arrays (zero-copy views of the file).
+
+    Returns:
+        tuple: (header dict, {array name: ndarray})
+    """
+    cached = _mapped.get(path)
+    if cached is not None and not verify:
+        return cached
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    if bytes(mapped[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"Not a model bundle: {path}")
+    (header_len,) = struct.unpack('<Q', bytes(mapped[len(MAGIC):len(MAGIC) + 8]))
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(mapped[start:start + header_len]).decode('utf-8'))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {header.get('format_version')}: {path}")
+    data_start = start + header_len + _pad(start + header_len)
+
+    if verify and _content_hash(header, bytes(mapped[data_start:])) != header['content_hash']:
+        raise ValueError(f"Content hash mismatch: {path}")
+
+    arrays = {}
+    for entry in header['arrays']:
+        dtype = np.dtype(entry['dtype'])
+        count = entry['nbytes'] // dtype.itemsize
+        arrays[entry['name']] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                              offset=data_start + entry['offset']).reshape(entry['shape'])
+    _mapped[path] = (header, arrays)
+    return header, arrays
+
+
+def load(ticker: str, version: int = None, verify: bool = False, models_dir: str = MODELS_DIR) -> Bundle:
+    """
+    Load a bundle version (default: current).
+
+    Args:
+        ticker (str): Stock ticker symbol
+        version (int): Version to load (default: the CURRENT pointer)
+        verify (bool): Check the content hash before using the weights
+        models_dir (str): Root models directory
+
+    Returns:
+        Bundle: Model with its scaler and metadata
+    """
+    from model import keras
+
+    ticker = ticker.upper()
+    version = version or current_version(ticker, models_dir)
+    if version is None:
+        raise FileNotFoundError(f"No model bundle for {ticker}")
+    header, arrays = read_bundle(_version_path(ticker, version, models_dir), verify=verify)
+
+    model = keras.models.model_from_json(json.dumps(header['architecture']))
+    weight_count = sum(1 for name in arrays if name.startswith('weights/'))
+    model.set_weights([arrays[f"weights/{i}"] for i in range(weight_count)])
+    scaler = BundleScaler(*(arrays[f"scaler/{name}"] for name in SCALER_ARRAYS))
+    return Bundle(ticker, version, model, scaler, header['metadata'], header['content_hash'])
+
+
+def load_legacy(ticker: str, models_dir: str = MODELS_DIR) -> Bundle:
+    """Load the pre-bundle .h5 / _scaler.pkl / _metadata.json files."""
+    import joblib
+    from model import load_trained_model
+
+    with open(os.path.join(models_dir, f"{ticker}_metadata.json")) as f:
+        metadata = json.load(f)
+    model = load_trained_model(os.path.join(models_dir, f"{ticker}_best_model.h5"))
+    scaler = joblib.load(os.path.join(models_dir, f"{ticker}_scaler.pkl"))
+    return Bundle(ticker, None, model, scaler, metadata)
+
+
+def exists(ticker: str, models_dir: str = MODELS_DIR) -> bool:
+    """True if the ticker has a published bundle or legacy model files."""
+    return (current_version(ticker, models_dir) is not None
+            or os.path.exists(os.path.join(models_dir, f"{ticker}_metadata.json")))
+
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def map_current(ticker: str, models_dir: str = MODELS_DIR) -> tuple:
+    """Map the current bundle's arrays without building the Keras model."""
+    version = current_version(ticker, models_dir)
+    if version is None:
+        raise FileNotFoundError(f"No model bundle for {ticker}")
+    return read_bundle(_version_path(ticker, version, models_dir))
+
+
+def current_metadata(ticker: str, models_dir: str = MODELS_DIR) -> dict:
+    """
+    Metadata of the current bundle, or of the legacy files for a ticker not
+    yet migrated (read only). None if the ticker has never been trained.
+    """
+    try:
+        header, _ = map_current(ticker, models_dir)
+        return header['metadata']
+    except FileNotFoundError:
+        pass
+    path = os.path.join(models_dir, f"{ticker}_metadata.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_model(ticker: str, models_dir: str = MODELS_DIR) -> Bundle:
+    """
+    Current model for a ticker, kept in memory until a newer version is
+    published (one small pointer read per call). Falls back to legacy files.
+    """
+    key = ticker.upper()
+    version = current_version(ticker, models_dir)
+    if version is None:
+        path = os.path.join(models_dir, f"{ticker}_metadata.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No trained model for {ticker}")
+        version = ('legacy', os.path.getmtime(path))
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _load_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        if isinstance(version, int):
+            bundle = load(ticker, version, models_dir=models_dir)
+        else:
+            bundle = load_legacy(ticker, models_dir)
+        _loaded[key] = (version, bundle)
+        return bundle
+
+
+def rollback(ticker: str, version: int = None, models_dir: str = MODELS_DIR) -> int:
+    """
+    Point CURRENT at an older version (default: the one before current).
+
+    Returns:
+        int: The version now current
+    """
+    ticker = ticker.upper()
+    versions = list_versions(ticker, models_dir)
+    current = current_version(ticker, models_dir)
+    if version is None:
+        older = [v for v in versions if current is None or v < current]
+        if not older:
+            raise ValueError(f"No older version of {ticker} to roll back to")
+        version = older[-1]
+    if version not in versions:
+        raise ValueError(f"{ticker} has no version {version} (available: {versions})")
+    _set_current(ticker, version, models_dir)
+    return version
+
+
+def migrate(ticker: str, models_dir: str = MODELS_DIR) -> int:
+    """Publish a ticker's legacy model files as a bundle."""
+    from preprocessing import FEATURE_COLUMNS
+    legacy = load_legacy(ticker, models_dir)
+    metadata = dict(legacy.metadata)
+    metadata.setdefault('feature_columns', FEATURE_COLUMNS)
+    return publish(ticker, legacy.model, legacy.scaler, metadata, models_dir)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('list', 'migrate', 'rollback'):
+        print(__doc__)
+        sys.exit(1)
+    command, symbol = sys.argv[1], sys.argv[2].upper()
+    if command == 'list':
+        current = current_version(symbol)
+        for v in list_versions(symbol):
+            header, _ = read_bundle(_version_path(symbol, v))
+            marker = "*" if v == current else " "
+            print(f"{marker} v{v:04d}  trained {header['metadata'].get('trained_on', '?')}  "
+                  f"test_mae {header['metadata'].get('test_mae', float('nan')):.6f}  {header['content_hash']}")
+    elif command == 'migrate':
+        print(f"✅ Published {symbol} v{migrate(symbol):04d}")
+    else:
+        target = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(f"✅ {symbol} rolled back to v{rollback(symbol, target):04d}")
@@ -0,0 +1,319 @@
+"""
+News Store Module
+Persists yfinance headlines in a local SQLite database so /news and the
+sentiment engine read from disk instead of calling Yahoo per request.
+
+- Each story is stored once, deduplicated by URL hash and by title hash
+- A story syndicated under several tickers is linked to all of them
+- An inverted index (term -> article) serves keyword search
+- Tracked tickers are refreshed incrementally by a background thread
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+import yfinance as yf
+
+from headline_scoring import headline_key
+from metrics import upstream, record_cache
+
+
+DB_PATH = os.environ.get('NEUROSTOCK_NEWS_DB', 'data/news.db')
+
+# A ticker's headlines are re-fetched from Yahoo after this many seconds
+REFRESH_INTERVAL = 10 * 60
+
+# Articles older than this are pruned during refreshes
+RETENTION_DAYS = 30
+
+# Set (by serving.py, before workers fork) when another process runs the
+# background refresh, so this one only reads the shared database
+refreshed_elsewhere = False
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {'a', 'an', 'and', 'the', 'of', 'to', 'in', 'on', 'for', 'at', 'by', 'is',
+             'are', 'as', 'with', 'from', 'its', 'it', 'this', 'that', 'be', 's'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    title_key TEXT NOT NULL UNIQUE,
+    url_key TEXT UNIQUE,
+    title TEXT NOT NULL,
+    source TEXT,
+    url TEXT,
+    published_at REAL,
+    ingested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_articles_published ON articles(published_at DESC);
+CREATE TABLE IF NOT EXISTS article_tickers (
+    ticker TEXT NOT NULL,
+    article_id INTEGER NOT NULL,
+    PRIMARY KEY (ticker, article_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS article_terms (
+    term TEXT NOT NULL,
+    article_id INTEGER NOT NULL,
+    PRIMARY KEY (term, article_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ticker_refresh (
+    ticker TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+
+def _terms(text: str) -> set:
+    return {t for t in _TERM_RE.findall(text.lower()) if t not in STOPWORDS}
+
+
+def _url_key(url: str):
+    if not url or url == '#':
+        return None
+    return hashlib.blake2b(url.strip().encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _parse_published(value) -> float:
+    """yfinance reports either an epoch (old API) or an ISO timestamp (new API)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _relative_time(published_at: float) -> str:
+    diff_hours = max(0, int((time.time() - published_at) / 3600))
+    return f"{diff_hours}h ago" if diff_hours < 48 else f"{diff_hours // 24}d ago"
+
+
+def parse_yf_news(raw_news: list) -> list:
+    """
+    Normalize raw yfinance news items.
+
+    Args:
+        raw_news (list): Items from yf.Ticker(...).news
+
+    Returns:
+        list: [{"title", "source", "url", "published_at"}, ...]
+    """
+    items = []
+    for item in raw_news:
+        content = item.get('content', {}) or {}
+        title = content.get('title') or item.get('title', '')
+        if not title:
+            continue
+        provider = content.get('provider', {}) or {}
+        link = content.get('canonicalUrl', {}) or {}
+        items.append({
+            "title": title,
+            "source": provider.get('displayName') or item.get('publisher') or 'Market News',
+            "url": (link.get('url') if isinstance(link, dict) else None) or item.get('link') or '#',
+            "published_at": _parse_published(content.get('pubDate') or item.get('providerPublishTime')),
+        })
+    return items
+
+
+class NewsStore:
+    """SQLite-backed headline store with ticker and keyword indexes."""
+
+    def __init__(self, path: str = DB_PATH, refresh_interval: float = REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._refresher = None
+
+    def ingest(self, ticker: str, items: list) -> int:
+        """
+        Store headlines for a ticker, linking existing stories instead of duplicating them.
+
+        Args:
+            ticker (str): Ticker the headlines were fetched for
+            items (list): Items from parse_yf_news
+
+        Returns:
+            int: Number of new articles stored
+        """
+        ticker = ticker.upper()
+        added = 0
+        now = time.time()
+        with self._lock, self._conn:
+            for item in items:
+                title_key = headline_key(item['title'])
+                url_key = _url_key(item.get('url'))
+                row = self._conn.execute(
+                    'SELECT id FROM articles WHERE title_key = ? OR (url_key IS NOT NULL AND url_key = ?)',
+                    (title_key, url_key)).fetchone()
+                if row is None:
+                    cur = self._conn.execute(
+                        'INSERT INTO articles (title_key, url_key, title, source, url, published_at, ingested_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (title_key, url_key, item['title'], item.get('source'), item.get('url', '#'),
+                         item.get('published_at', now), now))
+                    article_id = cur.lastrowid
+                    self._conn.executemany(
+                        'INSERT OR IGNORE INTO article_terms (term, article_id) VALUES (?, ?)',
+                        [(term, article_id) for term in _terms(item['title'])])
+                    added += 1
+                else:
+                    article_id = row[0]
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO article_tickers (ticker, article_id) VALUES (?, ?)',
+                    (ticker, article_id))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ticker_refresh (ticker, refreshed_at) VALUES (?, ?)',
+                (ticker, now))
+        return added
+
+    def refresh(self, ticker: str) -> int:
+        """Fetch the latest headlines for a ticker from Yahoo and ingest the new ones."""
+        ticker = ticker.upper()
+        try:
+            with upstream('yf.news'):
+                raw_news = yf.Ticker(ticker).news or []
+        except Exception:
+            raw_news = []
+        return self.ingest(ticker, parse_yf_news(raw_news))
+
+    def last_refreshed(self, ticker: str):
+        with self._lock:
+            row = self._conn.execute('SELECT refreshed_at FROM ticker_refresh WHERE ticker = ?',
+                                     (ticker.upper(),)).fetchone()
+        return row[0] if row else None
+
+    def ensure_fresh(self, ticker: str):
+        """
+        Make sure a ticker has been ingested at least once. Later refreshes of
+        stale tickers run on the background thread when it is running.
+        """
+        refreshed_at = self.last_refreshed(ticker)
+        stale = refreshed_at is None or time.time() - refreshed_at > self.refresh_interval
+        record_cache('news_store', not stale)
+        background = self.refresher_running() or refreshed_elsewhere
+        if refreshed_at is None or (stale and not background):
+            self.refresh(ticker)
+
+    def search(self, ticker: str = None, query: str = None,
+               page: int = 1, page_size: int = 20) -> dict:
+        """
+        Paged headline lookup by ticker and/or keywords (all terms must match).
+
+        Args:
+            ticker (str): Restrict to stories linked to this ticker
+            query (str): Keywords, e.g. 'earnings guidance'
+            page (int): 1-based page number
+            page_size (int): Results per page
+
+        Returns:
+            dict: {"total", "page", "page_size", "items": [...]}
+        """
+        where, params = [], []
+        if ticker:
+            where.append('a.id IN (SELECT article_id FROM article_tickers WHERE ticker = ?)')
+            params.append(ticker.upper())
+        for term in sorted(_terms(query or '')):
+            where.append('a.id IN (SELECT article_id FROM article_terms WHERE term = ?)')
+            params.append(term)
+        clause = ('WHERE ' + ' AND '.join(where)) if where else ''
+        page = max(1, int(page))
+        page_size = max(1, min(100, int(page_size)))
+
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM articles a {clause}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT a.id, a.title, a.source, a.url, a.published_at FROM articles a {clause} '
+                'ORDER BY a.published_at DESC LIMIT ? OFFSET ?',
+                params + [page_size, (page - 1) * page_size]).fetchall()
+            ids = [r[0] for r in rows]
+            links = {}
+            if ids:
+                marks = ','.join('?' * len(ids))
+                for article_id, t in self._conn.execute(
+                        f'SELECT article_id, ticker FROM article_tickers WHERE article_id IN ({marks})', ids):
+                    links.setdefault(article_id, []).append(t)
+
+        items = [{
+            "title": title,
+            "source": source,
+            "time": _relative_time(published_at),
+            "url": url,
+            "published_at": published_at,
+            "tickers": sorted(links.get(article_id, [])),
+        } for article_id, title, source, url, published_at in rows]
+        return {"total": total, "page": page, "page_size": page_size, "items": items}
+
+    def latest(self, ticker: str, limit: int = 5) -> list:
+        """Most recent headlines for a ticker, refreshing it first if never ingested."""
+        self.ensure_fresh(ticker)
+        return self.search(ticker=ticker, page_size=limit)['items']
+
+    def prune(self, retention_days: int = RETENTION_DAYS):
+        cutoff = time.time() - retention_days * 86400
+        with self._lock, self._conn:
+            old = 'SELECT id FROM articles WHERE published_at < ?'
+            self._conn.execute(f'DELETE FROM article_terms WHERE article_id IN ({old})', (cutoff,))
+            self._conn.execute(f'DELETE FROM article_tickers WHERE article_id IN ({old})', (cutoff,))
+            self._conn.execute('DELETE FROM articles WHERE published_at < ?', (cutoff,))
+
+    def stale_tickers(self) -> list:
+        cutoff = time.time() - self.refresh_interval
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                'SELECT ticker FROM ticker_refresh WHERE refreshed_at < ? ORDER BY refreshed_at', (cutoff,))]
+
+    def refresher_running(self) -> bool:
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def start_background_refresh(self, poll_seconds: float = 60.0):
+        """Start a daemon thread that re-fetches stale tracked tickers."""
+        with self._lock:
+            if self.refresher_running():
+                return
+            self._refresher = threading.Thread(target=self._refresh_loop, args=(poll_seconds,),
+                                               name='news-refresher', daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self, poll_seconds: float):
+        while True:
+            for ticker in self.stale_tickers():
+                try:
+                    added = self.refresh(ticker)
+                    if added:
+                        print(f"📰 Stored {added} new headlines for {ticker}")
+                except Exception as e:
+                    print(f"❌ News refresh failed for {ticker}: {str(e)}")
+            try:
+                self.prune()
+            except Exception:
+                pass
+            time.sleep(poll_seconds)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> NewsStore:
+    """
+    Shared NewsStore instance. The background refresh is started by the
+    process that owns it (serving.py's refresher, or app.py's dev server);
+    gunicorn workers only read the database.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = NewsStore()
+        return _store
@@ -0,0 +1,204 @@
+"""
+Options Module
+Black-Scholes prices and Greeks over a strike x expiry x volatility grid.
+
+The whole surface is one broadcast NumPy pass: strikes, expiries and
+volatilities are laid out on separate axes, so d1/d2, the normal CDF and
+PDF and every Greek are computed once per grid cell with no Python loop.
+Spot and historical volatility come from the daily bars in the bar
+store. Finished surfaces are kept as serialized JSON, keyed by a hash of
+every input (including spot and volatility). A repeat request is a dict
+lookup until new bars move the spot.
+
+Conventions: rates, dividend yield and volatilities are annualized
+decimals, expiries are calendar days, theta is per calendar day and vega
+is per volatility point (1%).
+"""
+
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy.special import ndtr
+
+import bar_store
+from metrics import record_cache
+
+
+TRADING_DAYS = 252
+DAYS_PER_YEAR = 365.0
+
+# Daily returns used for historical volatility (~1.5 months)
+HV_WINDOW = 30
+
+DEFAULT_RATE = 0.04
+DEFAULT_STRIKES = 200
+DEFAULT_EXPIRIES = 50
+DEFAULT_STRIKE_RANGE = (0.5, 1.5)       # x spot
+DEFAULT_EXPIRY_RANGE = (7, 365)         # calendar days
+
+# Largest grid served in one response (cells per Greek)
+MAX_CELLS = 250_000
+
+MAX_CACHE_ENTRIES = 32
+
+OUTPUTS = ('call', 'put', 'call_delta', 'put_delta', 'gamma', 'vega', 'call_theta', 'put_theta')
+
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def historical_volatility(close: np.ndarray, window: int = HV_WINDOW) -> float:
+    """Annualized standard deviation of the last `window` daily log returns."""
+    returns = np.diff(np.log(np.asarray(close, dtype=np.float64)))[-window:]
+    if len(returns) < 2:
+        raise ValueError("Not enough bars to estimate volatility")
+    return float(returns.std(ddof=1) * math.sqrt(TRADING_DAYS))
+
+
+def black_scholes_surface(spot: float, strikes: np.ndarray, expiries: np.ndarray, vols: np.ndarray,
+                          rate: float = DEFAULT_RATE, dividend_yield: float = 0.0) -> dict:
+    """
+    Prices and Greeks for every (vol, expiry, strike) combination.
+
+    Args:
+        spot (float): Underlying price
+        strikes (np.ndarray): Strike prices
+        expiries (np.ndarray): Time to expiry in years (> 0)
+        vols (np.ndarray): Annualized volatilities (> 0)
+        rate (float): Continuously compounded risk-free rate
+        dividend_yield (float): Continuous dividend yield
+
+    Returns:
+        dict: OUTPUTS name -> array of shape (len(vols), len(expiries), len(strikes))
+    """
+    K = np.asarray(strikes, dtype=np.float64)[None, None, :]
+    T = np.asarray(expiries, dtype=np.float64)[None, :, None]
+    sigma = np.asarray(vols, dtype=np.float64)[:, None, None]
+
+    sqrt_t = np.sqrt(T)
+    sigma_sqrt_t = sigma * sqrt_t
+    d1 = (np.log(spot / K) + (rate - dividend_yield + 0.5 * sigma * sigma) * T) / sigma_sqrt_t
+    d2 = d1 - sigma_sqrt_t
+
+    disc_r = np.exp(-rate * T)
+    disc_q = np.exp(-dividend_yield * T)
+    nd1, nd2 = ndtr(d1), ndtr(d2)
+    pdf_d1 = _INV_SQRT_2PI * np.exp(-0.5 * d1 * d1)
+
+    spot_q = spot * disc_q
+    strike_r = K * disc_r
+    call = spot_q * nd1 - strike_r * nd2
+    # Put-call parity: P = C - S e^{-qT} + K e^{-rT}
+    put = call - spot_q + strike_r
+
+    decay = -spot_q * pdf_d1 * sigma / (2.0 * sqrt_t)
+    call_theta = decay - rate * strike_r * nd2 + dividend_yield * spot_q * nd1
+    put_theta = decay + rate * strike_r * (1.0 - nd2) - dividend_yield * spot_q * (1.0 - nd1)
+
+    return {
+        'call': call,
+        'put': put,
+        'call_delta': disc_q * nd1,
+        'put_delta': disc_q * (nd1 - 1.0),
+        'gamma': disc_q * pdf_d1 / (spot * sigma_sqrt_t),
+        'vega': spot_q * pdf_d1 * sqrt_t / 100.0,
+        'call_theta': call_theta / DAYS_PER_YEAR,
+        'put_theta': put_theta / DAYS_PER_YEAR,
+    }
+
+
+def _axis(spec, default_range: tuple, default_count: int, name: str) -> np.ndarray:
+    """An explicit list of values, or {"min", "max", "count"} for an evenly spaced axis."""
+    if isinstance(spec, list):
+        values = np.asarray(spec, dtype=np.float64)
+    else:
+        spec = spec or {}
+        count = int(spec.get('count', default_count))
+        if count < 1:
+            raise ValueError(f"{name} count must be at least 1")
+        values = np.linspace(float(spec.get('min', default_range[0])),
+                             float(spec.get('max', default_range[1])), count)
+    if not len(values) or not np.all(np.isfinite(values)) or np.any(values <= 0):
+        raise ValueError(f"{name} must be positive numbers")
+    return values
+
+
+def get_surface(ticker: str, strikes=None, expiries=None, vols=None, rate: float = DEFAULT_RATE,
+                dividend_yield: float = 0.0, spot: float = None, outputs: list = None) -> str:
+    """
+    Black-Scholes surface for a ticker as a JSON document, cached by parameter hash.
+
+    Args:
+        ticker (str): Underlying ticker symbol
+        strikes: List of strikes, or {"min", "max", "count"} (default 0.5-1.5 x spot, 200 strikes)
+        expiries: List of days to expiry, or {"min", "max", "count"} (default 7-365 days, 50 expiries)
+        vols: List of annualized volatilities (default: the ticker's historical volatility)
+        rate (float): Risk-free rate
+        dividend_yield (float): Continuous dividend yield
+        spot (float): Override the underlying price (default: latest close)
+        outputs (list): Subset of OUTPUTS to return (default: all). Serializing
+            the lists costs far more than computing them, so ask only for what is drawn
+
+    Returns:
+        str: JSON with the grid axes, spot, historical volatility and one
+             (vols x expiries x strikes) nested list per output
+    """
+    ticker = ticker.upper()
+    close = bar_store.get_bars(ticker, period="1y")['Close'].to_numpy(dtype=np.float64)
+    hv = historical_volatility(close)
+    if not hv > 0:
+        raise ValueError(f"No price movement in {ticker}'s recent bars to estimate volatility")
+    spot = float(spot) if spot is not None else float(close[-1])
+    if not spot > 0:
+        raise ValueError("Spot must be positive")
+
+    strike_range = (DEFAULT_STRIKE_RANGE[0] * spot, DEFAULT_STRIKE_RANGE[1] * spot)
+    strike_axis = _axis(strikes, strike_range, DEFAULT_STRIKES, "Strikes")
+    expiry_axis = _axis(expiries, DEFAULT_EXPIRY_RANGE, DEFAULT_EXPIRIES, "Expiries")
+    vol_axis = _axis(vols, (hv, hv), 1, "Volatilities") if vols is not None else np.array([hv])
+    cells = len(strike_axis) * len(expiry_axis) * len(vol_axis)
+    if cells > MAX_CELLS:
+        raise ValueError(f"Grid has {cells:,} cells; the limit is {MAX_CELLS:,}")
+    rate, dividend_yield = float(rate), float(dividend_yield)
+    outputs = list(OUTPUTS) if not outputs else list(dict.fromkeys(outputs))
+    unknown = [name for name in outputs if name not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs {unknown}. Options: {', '.join(OUTPUTS)}")
+
+    key = hashlib.blake2b(np.concatenate([
+        [spot, hv, rate, dividend_yield, len(strike_axis), len(expiry_axis)],
+        strike_axis, expiry_axis, vol_axis]).tobytes() + f"{ticker}|{','.join(outputs)}".encode(),
+        digest_size=16).hexdigest()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    record_cache('options_surface', cached is not None)
+    if cached is not None:
+        return cached
+
+    surface = black_scholes_surface(spot, strike_axis, expiry_axis / DAYS_PER_YEAR, vol_axis,
+                                    rate, dividend_yield)
+    payload = json.dumps({
+        "ticker": ticker,
+        "spot": spot,
+        "historical_volatility": hv,
+        "rate": rate,
+        "dividend_yield": dividend_yield,
+        "strikes": strike_axis.tolist(),
+        "expiries_days": expiry_axis.tolist(),
+        "vols": vol_axis.tolist(),
+        "shape": [len(vol_axis), len(expiry_axis), len(strike_axis)],
+        "key": key,
+        **{name: np.round(surface[name], 6).tolist() for name in outputs},
+    })
+    with _cache_lock:
+        _cache[key] = payload
+        while len(_cache) > MAX_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return payload
@@ -0,0 +1,414 @@
+"""
+Paper Trading Module
+Server-side virtual trading accounts: cash, positions and an order log,
+valued against the shared quote board.
+
+Every account change (open, buy, sell, reset) is an event in a SQLite log,
+so accounts survive restarts and every pre-forked worker sees the same
+orders. Each process replays the log into compact NumPy tables:
+
+- accounts:  one row per account (cash, realized P&L, latest valuation)
+- positions: one row per (account, symbol) holding, swap-removed when closed
+- orders:    append-only fills, chained per account for the recent history
+
+Marking to market is one vectorized pass: held symbols are quoted once,
+position values are price[symbol] * qty, and np.bincount sums them per
+account. A pass runs at most once per quote board refresh, however many
+accounts there are, and snapshots are then served from memory.
+"""
+
+import os
+import time
+import secrets
+import sqlite3
+import threading
+import contextlib
+import numpy as np
+
+import quotes
+from metrics import stage, register_gauge
+
+
+DB_PATH = os.environ.get('NEUROSTOCK_PAPER_DB', 'data/paper_trading.db')
+
+STARTING_CASH = 10000.0
+MAX_STARTING_CASH = 1e9
+
+# Orders returned with an account snapshot
+RECENT_ORDERS = 50
+
+# Re-mark even without a board refresh once marks are this old (no refresher running)
+MARK_TTL = quotes.QUOTE_TTL
+
+SIDES = ('BUY', 'SELL')
+
+ACCOUNT_DTYPE = np.dtype([
+    ('cash', '<f8'),
+    ('starting_cash', '<f8'),
+    ('realized_pnl', '<f8'),
+    ('market_value', '<f8'),
+    ('cost_basis', '<f8'),
+    ('equity', '<f8'),
+    ('last_order', '<i8'),     # newest order row, -1 if none
+    ('created_at', '<f8'),
+])
+POSITION_DTYPE = np.dtype([
+    ('account', '<i4'),
+    ('symbol', '<i4'),
+    ('qty', '<f8'),
+    ('cost', '<f8'),           # total cost basis of the open quantity
+])
+ORDER_DTYPE = np.dtype([
+    ('account', '<i4'),
+    ('symbol', '<i4'),
+    ('side', '<i1'),           # index into SIDES
+    ('qty', '<f8'),
+    ('price', '<f8'),
+    ('ts', '<f8'),
+    ('prev', '<i8'),           # the account's previous order row, -1 if none
+])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    symbol TEXT,
+    qty REAL,
+    price REAL,
+    ts REAL NOT NULL
+);
+"""
+
+
+class _Table:
+    """Growable NumPy structured array with a row count."""
+
+    def __init__(self, dtype: np.dtype, capacity: int = 1024):
+        self.rows = np.zeros(capacity, dtype=dtype)
+        self.n = 0
+
+    def append(self) -> int:
+        if self.n == len(self.rows):
+            grown = np.zeros(len(self.rows) * 2, dtype=self.rows.dtype)
+            grown[:self.n] = self.rows
+            self.rows = grown
+        self.n += 1
+        return self.n - 1
+
+    def view(self) -> np.ndarray:
+        return self.rows[:self.n]
+
+
+class PaperLedger:
+    """Event-sourced paper-trading accounts with array-backed state."""
+
+    def __init__(self, path: str = DB_PATH, board: quotes.QuoteBoard = None):
+        self.path = path
+        self.board = board or quotes.board
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Autocommit mode; writes take explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+        self.accounts = _Table(ACCOUNT_DTYPE)
+        self.positions = _Table(POSITION_DTYPE)
+        self.orders = _Table(ORDER_DTYPE)
+        self._account_ids = []          # row -> account id
+        self._account_rows = {}         # account id -> row
+        self._symbols = []              # symbol index -> symbol
+        self._symbol_index = {}         # symbol -> index
+        self._prices = np.empty(0)      # symbol index -> last mark price
+        self._position_rows = {}        # (account row, symbol index) -> position row
+        self._applied_seq = 0
+        self._marked_refresh = -1
+        self._marked_at = 0.0
+
+        with self._lock:
+            self._catch_up()
+
+    # ----- event log -----
+
+    @contextlib.contextmanager
+    def _write(self):
+        """Write transaction that first replays events other workers appended."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._catch_up()
+                yield
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._catch_up()
+
+    def _append_event(self, account: str, kind: str, symbol: str = None, qty: float = None,
+                      price: float = None):
+        self._conn.execute('INSERT INTO events (account, kind, symbol, qty, price, ts) VALUES (?, ?, ?, ?, ?, ?)',
+                           (account, kind, symbol, qty, price, time.time()))
+
+    def _catch_up(self):
+        rows = self._conn.execute('SELECT seq, account, kind, symbol, qty, price, ts FROM events '
+                                  'WHERE seq > ? ORDER BY seq', (self._applied_seq,)).fetchall()
+        for seq, account, kind, symbol, qty, price, ts in rows:
+            self._apply(account, kind, symbol, qty, price, ts)
+            self._applied_seq = seq
+
+    def _apply(self, account: str, kind: str, symbol: str, qty: float, price: float, ts: float):
+        if kind == 'OPEN':
+            row = self.accounts.append()
+            self._account_ids.append(account)
+            self._account_rows[account] = row
+            acct = self.accounts.rows[row]
+            acct['cash'] = acct['starting_cash'] = acct['equity'] = price
+            acct['last_order'] = -1
+            acct['created_at'] = ts
+            return
+
+        row = self._account_rows[account]
+        acct = self.accounts.rows[row]
+        if kind == 'RESET':
+            for sym in [s for (a, s) in self._position_rows if a == row]:
+                self._remove_position(row, sym)
+            acct['cash'] = acct['equity'] = acct['starting_cash']
+            acct['realized_pnl'] = acct['market_value'] = acct['cost_basis'] = 0.0
+            acct['last_order'] = -1
+            return
+
+        sym = self._symbol(symbol)
+        if np.isnan(self._prices[sym]):
+            self._prices[sym] = price
+        pos_row = self._position_rows.get((row, sym))
+        if kind == 'BUY':
+            if pos_row is None:
+                pos_row = self.positions.append()
+                self._position_rows[(row, sym)] = pos_row
+                self.positions.rows[pos_row] = (row, sym, 0.0, 0.0)
+            pos = self.positions.rows[pos_row]
+            pos['qty'] += qty
+            pos['cost'] += qty * price
+            acct['cash'] -= qty * price
+            acct['cost_basis'] += qty * price
+            acct['market_value'] += qty * self._prices[sym]
+        else:
+            pos = self.positions.rows[pos_row]
+            avg_cost = pos['cost'] / pos['qty']
+            acct['cash'] += qty * price
+            acct['realized_pnl'] += qty * (price - avg_cost)
+            acct['cost_basis'] -= qty * avg_cost
+            acct['market_value'] -= qty * self._prices[sym]
+            if qty >= pos['qty']:
+                self._remove_position(row, sym)
+            else:
+                pos['qty'] -= qty
+                pos['cost'] -= qty * avg_cost
+        # Keep the valuation current between mark-to-market passes
+        acct['equity'] = acct['cash'] + acct['market_value']
+
+        order_row = self.orders.append()
+        self.orders.rows[order_row] = (row, sym, SIDES.index(kind), qty, price, ts, acct['last_order'])
+        acct['last_order'] = order_row
+
+    def _symbol(self, symbol: str) -> int:
+        index = self._symbol_index.get(symbol)
+        if index is None:
+            index = self._symbol_index[symbol] = len(self._symbols)
+            self._symbols.append(symbol)
+            self._prices = np.append(self._prices, np.nan)
+        return index
+
+    def _remove_position(self, account_row: int, sym: int):
+        """Swap the last position row into the freed slot."""
+        pos_row = self._position_rows.pop((account_row, sym))
+        last = self.positions.n - 1
+        if pos_row != last:
+            moved = self.positions.rows[last]
+            self.positions.rows[pos_row] = moved
+            self._position_rows[(int(moved['account']), int(moved['symbol']))] = pos_row
+        self.positions.n -= 1
+
+    # ----- commands -----
+
+    def open_account(self, starting_cash: float = STARTING_CASH) -> str:
+        """Create an account funded with starting_cash; returns its id."""
+        starting_cash = float(starting_cash)
+        if not 0 < starting_cash <= MAX_STARTING_CASH:
+            raise ValueError(f"Starting cash must be between 0 and {MAX_STARTING_CASH:,.0f}")
+        account = secrets.token_hex(8)
+        with self._write():
+            self._append_event(account, 'OPEN', price=starting_cash)
+        return account
+
+    def reset(self, account: str):
+        """Close all positions without trading and restore the starting cash."""
+        with self._write():
+            self._require(account)
+            self._append_event(account, 'RESET')
+
+    def place_order(self, account: str, symbol: str, side: str, qty: float) -> dict:
+        """
+        Fill a market order at the current quote.
+
+        Args:
+            account (str): Account id
+            symbol (str): Ticker symbol
+            side (str): 'BUY' or 'SELL'
+            qty (float): Shares, > 0
+
+        Returns:
+            dict: The fill {"symbol", "side", "qty", "price"}
+        """
+        symbol = str(symbol or '').upper()
+        side = str(side or '').upper()
+        qty = float(qty)
+        if not symbol:
+            raise ValueError("Missing symbol")
+        if side not in SIDES:
+            raise ValueError(f"Side must be one of {', '.join(SIDES)}")
+        if not qty > 0:
+            raise ValueError("Quantity must be positive")
+        with self._lock:
+            self._require(account)
+
+        price = self.board.get_quotes([symbol])[0]['price']
+        if not price:
+            raise ValueError(f"Could not quote {symbol}")
+
+        with self._write():
+            row = self._require(account)
+            if side == 'BUY':
+                cash = float(self.accounts.rows[row]['cash'])
+                if qty * price > cash + 1e-9:
+                    raise ValueError(f"Insufficient funds. Need ${qty * price:,.2f}, have ${cash:,.2f}")
+            else:
+                pos_row = self._position_rows.get((row, self._symbol_index.get(symbol)))
+                held = float(self.positions.rows[pos_row]['qty']) if pos_row is not None else 0.0
+                if qty > held + 1e-9:
+                    raise ValueError(f"Not enough shares. You have {held:g}.")
+                qty = min(qty, held)
+            self._append_event(account, side, symbol, qty, price)
+        return {"symbol": symbol, "side": side, "qty": qty, "price": price}
+
+    def _require(self, account: str) -> int:
+        row = self._account_rows.get(account)
+        if row is None:
+            raise KeyError(f"Unknown account: {account}")
+        return row
+
+    # ----- valuation -----
+
+    def mark_to_market(self, force: bool = False) -> bool:
+        """
+        Revalue every account against the quote board in one vectorized pass.
+        Skipped when the board has not refreshed since the last pass.
+
+        Returns:
+            bool: True if a pass ran
+        """
+        with self._lock:
+            self._catch_up()
+            refreshes = self.board.refresh_count()
+            if not force and refreshes == self._marked_refresh and time.time() - self._marked_at < MARK_TTL:
+                return False
+            held = np.unique(self.positions.view()['symbol'])
+            symbols = [self._symbols[i] for i in held]
+
+        with stage('mark_to_market'):
+            # Quoted outside the lock: missing symbols may need an upstream fetch
+            fetched = self.board.get_quotes(symbols)
+            with self._lock:
+                for sym, quote in zip(held, fetched):
+                    if quote['price']:
+                        self._prices[sym] = quote['price']
+                n = self.accounts.n
+                accounts = self.accounts.view()
+                positions = self.positions.view()
+                value = positions['qty'] * self._prices[positions['symbol']]
+                accounts['market_value'] = np.bincount(positions['account'], weights=value, minlength=n)
+                accounts['cost_basis'] = np.bincount(positions['account'], weights=positions['cost'], minlength=n)
+                accounts['equity'] = accounts['cash'] + accounts['market_value']
+                self._marked_refresh = refreshes
+                self._marked_at = time.time()
+        return True
+
+    def snapshot(self, account: str) -> dict:
+        """Cash, equity, P&L, positions and recent orders of one account."""
+        self.mark_to_market()
+        with self._lock:
+            row = self._require(account)
+            acct = self.accounts.rows[row]
+            positions = self.positions.view()
+            mine = positions[positions['account'] == row]
+            prices = self._prices[mine['symbol']]
+
+            orders = []
+            order_row = int(acct['last_order'])
+            while order_row >= 0 and len(orders) < RECENT_ORDERS:
+                order = self.orders.rows[order_row]
+                orders.append({
+                    "symbol": self._symbols[order['symbol']],
+                    "side": SIDES[order['side']],
+                    "qty": float(order['qty']),
+                    "price": float(order['price']),
+                    "timestamp": float(order['ts']),
+                })
+                order_row = int(order['prev'])
+
+            return {
+                "account_id": account,
+                "cash": float(acct['cash']),
+                "starting_cash": float(acct['starting_cash']),
+                "market_value": float(acct['market_value']),
+                "equity": float(acct['equity']),
+                "unrealized_pnl": float(acct['market_value'] - acct['cost_basis']),
+                "realized_pnl": float(acct['realized_pnl']),
+                "return_percent": float((acct['equity'] / acct['starting_cash'] - 1) * 100),
+                "positions": [{
+                    "symbol": self._symbols[p['symbol']],
+                    "qty": float(p['qty']),
+                    "avg_cost": float(p['cost'] / p['qty']),
+                    "price": float(price),
+                    "market_value": float(p['qty'] * price),
+                    "unrealized_pnl": float(p['qty'] * price - p['cost']),
+                } for p, price in zip(mine, prices)],
+                "orders": orders,
+                "marked_at": self._marked_at,
+            }
+
+    def leaderboard(self, limit: int = 10) -> list:
+        """Top accounts by return since their start (or last reset)."""
+        self.mark_to_market()
+        with self._lock:
+            accounts = self.accounts.view()
+            returns = (accounts['equity'] / accounts['starting_cash'] - 1) * 100
+            limit = min(max(1, limit), len(returns))
+            if not limit:
+                return []
+            top = np.argpartition(-returns, limit - 1)[:limit]
+            top = top[np.argsort(-returns[top])]
+            return [{"account_id": self._account_ids[i], "equity": float(accounts['equity'][i]),
+                     "return_percent": float(returns[i])} for i in top]
+
+    def account_count(self) -> int:
+        return self.accounts.n
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> PaperLedger:
+    """Shared ledger (opened on first use, so each worker gets its own connection)."""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = PaperLedger()
+        return _ledger
+
+
+register_gauge('neurostock_paper_accounts', 'Paper-trading accounts loaded in this process',
+               lambda: _ledger.account_count() if _ledger is not None else 0)
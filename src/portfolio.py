@@ -0,0 +1,150 @@
+"""
+Portfolio Analytics Module
+Market value, P&L and risk (volatility, VaR, beta) for a set of holdings.
+
+Risk is computed with batched NumPy over aligned daily returns. The
+covariance matrix comes from the correlation engine's rolling state, so
+repeat requests for the same universe reuse it instead of recomputing.
+"""
+
+import numpy as np
+import pandas as pd
+
+import correlation
+
+
+BENCHMARK = 'SPY'
+TRADING_DAYS = 252
+
+# Trading days of returns used for covariance and historical VaR
+DEFAULT_WINDOW = 252
+
+# One-sided normal quantiles for parametric VaR
+Z_SCORES = {0.90: 1.2816, 0.95: 1.6449, 0.975: 1.9600, 0.99: 2.3263}
+
+
+def _parse_holdings(holdings: list) -> tuple:
+    """
+    Aggregate holdings by ticker.
+
+    Returns:
+        tuple: (sorted tickers, total shares ndarray, total cost ndarray; NaN if any lot lacks a cost basis)
+    """
+    tickers, shares, costs = [], [], []
+    for h in holdings:
+        ticker = str(h.get('ticker', '')).upper()
+        qty = float(h.get('shares', 0) or 0)
+        if not ticker or qty == 0:
+            continue
+        cost = h.get('cost_basis', h.get('avg_price'))
+        tickers.append(ticker)
+        shares.append(qty)
+        costs.append(float(cost) if cost is not None else np.nan)
+    if not tickers:
+        raise ValueError("No holdings with a ticker and non-zero shares")
+    unique, owner = np.unique(np.array(tickers), return_inverse=True)
+    shares = np.asarray(shares)
+    total_shares = np.bincount(owner, weights=shares)
+    # NaN cost propagates through the sum, marking the position's P&L as unknown
+    total_cost = np.bincount(owner, weights=shares * np.asarray(costs))
+    return list(unique), total_shares, total_cost
+
+
+def analyze_portfolio(holdings: list, window: int = DEFAULT_WINDOW,
+                      confidence: float = 0.95) -> dict:
+    """
+    Value a portfolio and compute its risk.
+
+    Args:
+        holdings (list): [{"ticker", "shares", "cost_basis" (optional, per share)}, ...]
+        window (int): Trading days of returns used for covariance / historical VaR
+        confidence (float): VaR confidence level (0.90, 0.95, 0.975 or 0.99)
+
+    Returns:
+        dict: Totals, per-position breakdown and risk metrics (VaR is a 1-day loss in currency)
+    """
+    if confidence not in Z_SCORES:
+        raise ValueError(f"Confidence must be one of {sorted(Z_SCORES)}")
+    tickers, total_shares, total_cost = _parse_holdings(holdings)
+    universe = tickers + ([BENCHMARK] if BENCHMARK not in tickers else [])
+
+    state = correlation.engine.snapshot(universe, window)
+    kept = [t for t in state.tickers if t in tickers]
+    missing = [t for t in tickers if t not in kept]
+    if not kept:
+        raise ValueError("No price history available for the holdings")
+    state_pos = {t: i for i, t in enumerate(state.tickers)}
+    held_idx = np.array([state_pos[t] for t in kept])
+    bench_idx = state.tickers.index(BENCHMARK) if BENCHMARK in state.tickers else None
+
+    # Latest aligned closes held by the rolling state
+    prices = state.last_prices[held_idx]
+    holding_pos = {t: i for i, t in enumerate(tickers)}
+    position_idx = np.array([holding_pos[t] for t in kept])
+    shares = total_shares[position_idx]
+    cost_value = total_cost[position_idx]
+    values = prices * shares
+    total_value = float(values.sum())
+    weights = values / total_value if total_value else np.zeros_like(values)
+    pnl = values - cost_value
+
+    cov_all = state.covariance()
+    cov = cov_all[np.ix_(held_idx, held_idx)]
+    mean = state.means()[held_idx]
+
+    port_var = float(weights @ cov @ weights)
+    daily_vol = np.sqrt(max(port_var, 0.0))
+    port_mean = float(weights @ mean)
+
+    # Parametric (variance-covariance) VaR
+    z = Z_SCORES[confidence]
+    parametric_var = max(0.0, -(port_mean - z * daily_vol)) * total_value
+
+    # Historical VaR from the window's simple returns
+    simple_returns = np.expm1(state.buffer[:, held_idx])
+    port_returns = simple_returns @ weights
+    historical_var = max(0.0, -float(np.quantile(port_returns, 1 - confidence))) * total_value
+
+    # Beta vs benchmark (portfolio and per position)
+    betas = np.full(len(kept), np.nan)
+    port_beta = None
+    if bench_idx is not None and cov_all[bench_idx, bench_idx] > 0:
+        bench_var = cov_all[bench_idx, bench_idx]
+        betas = cov_all[held_idx, bench_idx] / bench_var
+        port_beta = round(float(weights @ betas), 3)
+
+    # Each position's share of portfolio variance
+    marginal = cov @ weights
+    risk_contrib = weights * marginal / port_var if port_var > 0 else np.zeros_like(weights)
+
+    def _num(x, digits=2):
+        return None if np.isnan(x) else round(float(x), digits)
+
+    known_cost = cost_value[~np.isnan(cost_value)]
+    known_pnl = pnl[~np.isnan(pnl)]
+    return {
+        "as_of": pd.to_datetime(state.dates[-1]).strftime('%Y-%m-%d'),
+        "window": len(state.buffer),
+        "confidence": confidence,
+        "market_value": round(total_value, 2),
+        "cost_value": round(float(known_cost.sum()), 2) if len(known_cost) else None,
+        "pnl": round(float(known_pnl.sum()), 2) if len(known_pnl) else None,
+        "daily_volatility": round(daily_vol, 6),
+        "annual_volatility": round(daily_vol * np.sqrt(TRADING_DAYS), 6),
+        "var_parametric": round(parametric_var, 2),
+        "var_historical": round(historical_var, 2),
+        "beta": port_beta,
+        "benchmark": BENCHMARK,
+        "positions": [{
+            "ticker": t,
+            "shares": float(shares[i]),
+            "price": round(float(prices[i]), 2),
+            "market_value": round(float(values[i]), 2),
+            "weight": round(float(weights[i]), 6),
+            "pnl": _num(pnl[i]),
+            "pnl_percent": _num(pnl[i] / cost_value[i] * 100) if cost_value[i] else None,
+            "beta": _num(betas[i], 3),
+            "risk_contribution": round(float(risk_contrib[i]), 6),
+        } for i, t in enumerate(kept)],
+        "missing": missing
+    }
@@ -1,12 +1,24 @@
 """
 Prediction Module
 Makes predictions using the trained LSTM model
+
+Batch mode forecasts many tickers in one run and writes every forecast to a
+single CSV/Parquet/JSON file:
+
+Usage:
+    python src/predict.py AAPL
+    python src/predict.py AAPL MSFT NVDA --horizons 1 5 20 --output forecasts.csv
+    python src/predict.py --tickers-file data/universe.txt --output forecasts.parquet --plot
+    python src/predict.py --all --output forecasts.json
 """
 
 import os
 import sys
-import json
-import joblib
+import time
+import argparse
+import contextlib
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -16,17 +28,25 @@ from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from data_loader import fetch_stock_data
-from preprocessing import add_technical_indicators, inverse_transform_predictions
-from model import load_trained_model
+from preprocessing import add_technical_indicators, inverse_transform_predictions, FEATURE_COLUMNS
+from market_hours import next_bar_times
+from model import rollout
+import model_bundle
+
 
+DEFAULT_HORIZONS = (1, 5)
+OUTPUT_FORMATS = ('csv', 'parquet', 'json')
+FETCH_WORKERS = 8
 
-def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1):
+
+def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1, plot: bool = True):
     """
     Predict future stock prices using the trained model.
     
     Args:
         ticker (str): Stock ticker symbol
         days_ahead (int): Number of days to predict ahead
+        plot (bool): Save the prediction chart to models/{ticker}_prediction.png
     """
     print("=" * 70)
     print(f"🔮 STOCK MARKET PREDICTOR - PREDICTION")
@@ -35,13 +55,13 @@ def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1):
     print(f"📅 Predicting {days_ahead} day(s) ahead")
     print("=" * 70)
     
-    # Load metadata
-    metadata_path = f"models/{ticker}_metadata.json"
-    if not os.path.exists(metadata_path):
+    # Load model, scaler and metadata (versioned bundle, or legacy files)
+    if not model_bundle.exists(ticker):
         raise FileNotFoundError(f"Metadata not found. Please train the model first.")
     
-    with open(metadata_path, 'r') as f:
-        metadata = json.load(f)
+    print("\n[1/3] 🧠 Loading trained model...")
+    bundle = model_bundle.get_model(ticker)
+    model, scaler, metadata = bundle.model, bundle.scaler, bundle.metadata
     
     sequence_length = metadata['sequence_length']
     num_features = metadata['num_features']
@@ -51,21 +71,16 @@ def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1):
     print(f"   Test MAE: {metadata['test_mae']:.6f}")
     print(f"   Sequence Length: {sequence_length}")
     
-    # Load model and scaler
-    print("\n[1/4] 🧠 Loading trained model...")
-    model = load_trained_model(f"models/{ticker}_best_model.h5")
-    
-    print("\n[2/4] 📊 Loading scaler...")
-    scaler = joblib.load(f"models/{ticker}_scaler.pkl")
+    if bundle.version is not None:
+        print(f"   Bundle: v{bundle.version:04d} ({bundle.content_hash})")
     
     # Fetch recent data
-    print("\n[3/4] 📥 Fetching recent data...")
+    print("\n[2/3] 📥 Fetching recent data...")
     df = fetch_stock_data(ticker, period="1y")
     df = add_technical_indicators(df)
     
     # Prepare features
-    feature_columns = ['Close', 'Volume', 'SMA_20', 'SMA_50', 'EMA_12', 
-                      'EMA_26', 'RSI', 'MACD', 'MACD_Signal']
+    feature_columns = metadata.get('feature_columns', FEATURE_COLUMNS)
     data = df[feature_columns].values
     
     # Scale data
@@ -75,7 +90,7 @@ def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1):
     last_sequence = scaled_data[-sequence_length:]
     
     # Make predictions
-    print(f"\n[4/4] 🔮 Making predictions...")
+    print(f"\n[3/3] 🔮 Making predictions...")
     predictions = []
     current_sequence = last_sequence.copy()
     
@@ -124,13 +139,15 @@ def predict_stock_price(ticker: str = "AAPL", days_ahead: int = 1):
         print(f"   {date.strftime('%Y-%m-%d')}: ${price:.2f} ({arrow} {change:+.2f}%)")
     
     # Plot predictions
-    plot_predictions(actual_dates, actual_prices, future_dates, 
-                    predictions_original, ticker)
+    if plot:
+        plot_predictions(actual_dates, actual_prices, future_dates, 
+                        predictions_original, ticker)
     
     print("\n" + "=" * 70)
     print("✅ PREDICTION COMPLETE!")
     print("=" * 70)
-    print(f"📁 Visualization saved: models/{ticker}_prediction.png")
+    if plot:
+        print(f"📁 Visualization saved: models/{ticker}_prediction.png")
     print("=" * 70)
 
 
@@ -172,6 +189,219 @@ def plot_predictions(actual_dates, actual_prices, future_dates,
     plt.close()
 
 
+def output_format(path: str, fmt: str = None) -> str:
+    """Output format from an explicit choice or the file extension."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format '{fmt}'. Options: {', '.join(OUTPUT_FORMATS)}")
+    if fmt == 'parquet' and not any(importlib.util.find_spec(m) for m in ('pyarrow', 'fastparquet')):
+        raise ImportError("Parquet output needs pyarrow (pip install pyarrow)")
+    return fmt
+
+
+def _fetch_features(ticker: str, period: str):
+    """Bars plus indicators for one ticker; returns (ticker, df or error message)."""
+    try:
+        return ticker, add_technical_indicators(fetch_stock_data(ticker, period=period))
+    except Exception as e:
+        return ticker, str(e)
+
+
+def _forecast(bundle, df: pd.DataFrame, steps: int) -> np.ndarray:
+    """Roll one ticker's model forward `steps` bars from its latest window."""
+    metadata = bundle.metadata
+    feature_columns = metadata.get('feature_columns', FEATURE_COLUMNS)
+    window = bundle.scaler.transform(df[feature_columns].values[-metadata['sequence_length']:])
+    scaled = rollout(bundle.model, window, steps)
+    return inverse_transform_predictions(scaled, bundle.scaler, metadata['num_features'])
+
+
+def predict_batch(tickers: list, horizons: list = DEFAULT_HORIZONS, output: str = "models/forecasts.csv",
+                  fmt: str = None, period: str = "1y", workers: int = None, plot: bool = False) -> pd.DataFrame:
+    """
+    Forecast many tickers in one run and write all forecasts to one file.
+
+    Each model is loaded once and rolled forward once to the longest horizon;
+    every requested horizon is read off that path. Bars are downloaded
+    concurrently up front, inference runs across a thread pool (TensorFlow
+    releases the GIL inside the compiled forward pass), and charts are only
+    drawn when asked for.
+
+    Args:
+        tickers (list): Ticker symbols with trained daily models
+        horizons (list): Trading days ahead to report (e.g. [1, 5, 20])
+        output (str): Output file (.csv, .parquet or .json)
+        fmt (str): Output format, overriding the file extension
+        period (str): History to download for the input windows
+        workers (int): Inference threads (default: CPU count, at most 8)
+        plot (bool): Also save models/{ticker}_prediction.png per ticker
+
+    Returns:
+        pd.DataFrame: One row per ticker and horizon
+    """
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    horizons = sorted(set(int(h) for h in horizons))
+    if not tickers:
+        raise ValueError("No tickers given")
+    if not horizons or horizons[0] < 1:
+        raise ValueError("Horizons must be positive numbers of trading days")
+    fmt = output_format(output, fmt)
+    steps = horizons[-1]
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    print("=" * 70)
+    print(f"🔮 STOCK MARKET PREDICTOR - BATCH PREDICTION")
+    print("=" * 70)
+    print(f"📊 Tickers: {len(tickers)}")
+    print(f"📅 Horizons: {', '.join(str(h) for h in horizons)} day(s)")
+    print(f"🧵 Inference workers: {workers}")
+    print("=" * 70)
+
+    failed = {}
+    timings = {}
+    start = time.perf_counter()
+
+    # Step 1: load each model once
+    print("\n[1/4] 🧠 Loading models...")
+    t0 = time.perf_counter()
+    bundles = {}
+    for ticker in tickers:
+        try:
+            bundle = model_bundle.get_model(ticker)
+        except Exception as e:
+            failed[ticker] = f"no model ({e})"
+            continue
+        if bundle.metadata.get('interval', '1d') != '1d':
+            failed[ticker] = f"{bundle.metadata['interval']} model (batch mode forecasts daily models)"
+            continue
+        bundles[ticker] = bundle
+    timings['load'] = time.perf_counter() - t0
+
+    # Step 2: download bars for every ticker concurrently
+    print(f"\n[2/4] 📥 Fetching data for {len(bundles)} tickers...")
+    t0 = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            fetched = dict(pool.map(lambda t: _fetch_features(t, period), bundles))
+    frames = {}
+    for ticker, df in fetched.items():
+        if isinstance(df, str):
+            failed[ticker] = df
+        elif len(df) < bundles[ticker].metadata['sequence_length']:
+            failed[ticker] = f"not enough history ({len(df)} rows)"
+        else:
+            frames[ticker] = df
+    timings['fetch'] = time.perf_counter() - t0
+
+    # Step 3: roll every model forward to the longest horizon
+    print(f"\n[3/4] 🔮 Forecasting {len(frames)} tickers...")
+    t0 = time.perf_counter()
+
+    def forecast(ticker):
+        try:
+            return ticker, _forecast(bundles[ticker], frames[ticker], steps)
+        except Exception as e:
+            return ticker, str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = dict(pool.map(forecast, frames))
+    timings['inference'] = time.perf_counter() - t0
+
+    rows = []
+    plot_seconds = 0.0
+    for ticker in tickers:
+        path = paths.get(ticker)
+        if path is None:
+            continue
+        if isinstance(path, str):
+            failed[ticker] = path
+            continue
+        df = frames[ticker]
+        last_date = pd.to_datetime(df['Date'].iloc[-1])
+        current_price = float(df['Close'].iloc[-1])
+        dates = next_bar_times(last_date, steps, '1d', ticker)
+        version = bundles[ticker].version
+        for h in horizons:
+            price = float(path[h - 1])
+            rows.append({
+                "ticker": ticker,
+                "as_of": last_date.strftime('%Y-%m-%d'),
+                "horizon": h,
+                "date": dates[h - 1].strftime('%Y-%m-%d'),
+                "current_price": current_price,
+                "predicted_price": price,
+                "change_percent": (price - current_price) / current_price * 100,
+                "model_version": version,
+            })
+        if plot:
+            t0 = time.perf_counter()
+            plot_predictions(df['Date'].values[-30:], df['Close'].values[-30:], dates, path, ticker)
+            plot_seconds += time.perf_counter() - t0
+    result = pd.DataFrame(rows, columns=["ticker", "as_of", "horizon", "date", "current_price",
+                                         "predicted_price", "change_percent", "model_version"])
+    # Legacy (unversioned) models have no bundle version
+    result['model_version'] = result['model_version'].astype('Int64')
+    if plot:
+        timings['plot'] = plot_seconds
+
+    # Step 4: write all forecasts to one file
+    print(f"\n[4/4] 💾 Writing {len(result)} forecasts...")
+    t0 = time.perf_counter()
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    if fmt == 'csv':
+        result.to_csv(output, index=False)
+    elif fmt == 'parquet':
+        result.to_parquet(output, index=False)
+    else:
+        result.to_json(output, orient='records', indent=2)
+    timings['write'] = time.perf_counter() - t0
+
+    elapsed = time.perf_counter() - start
+    done = result['ticker'].nunique()
+    print("\n" + "=" * 70)
+    print("✅ BATCH PREDICTION COMPLETE!")
+    print("=" * 70)
+    print(f"📈 Forecast {done}/{len(tickers)} tickers in {elapsed:.2f}s ({done / elapsed:.2f} tickers/sec)")
+    print("⏱️  " + "  ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    for ticker, reason in failed.items():
+        print(f"⚠️ {ticker}: {reason}")
+    print(f"📁 Forecasts saved: {output}")
+    print("=" * 70)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast stock prices with the trained LSTM models")
+    parser.add_argument("tickers", nargs="*", help="Ticker symbols")
+    parser.add_argument("--tickers-file", help="File with one ticker per line")
+    parser.add_argument("--all", action="store_true", help="Every ticker with a published model")
+    parser.add_argument("--horizons", type=int, nargs="+", default=list(DEFAULT_HORIZONS),
+                        help="Trading days ahead to forecast")
+    parser.add_argument("--output", help="Write all forecasts to one .csv/.parquet/.json file")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Output format (default: from --output)")
+    parser.add_argument("--period", default="1y", help="History to download for the input windows")
+    parser.add_argument("--workers", type=int, default=None, help="Inference threads")
+    parser.add_argument("--plot", action="store_true", help="Save a chart per ticker")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        with open(args.tickers_file) as f:
+            tickers += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    if args.all:
+        tickers += model_bundle.list_tickers()
+
+    if len(tickers) == 1 and not args.output:
+        # Single ticker: the interactive report (chart on by default)
+        predict_stock_price(ticker=tickers[0].upper(), days_ahead=max(args.horizons))
+        return
+    if not tickers:
+        # Predict next 5 days for Apple stock
+        predict_stock_price(ticker="AAPL", days_ahead=5)
+        return
+    predict_batch(tickers, horizons=args.horizons, output=args.output or "models/forecasts.csv",
+                  fmt=args.format, period=args.period, workers=args.workers, plot=args.plot)
+
+
 if __name__ == "__main__":
-    # Predict next 5 days for Apple stock
-    predict_stock_price(ticker="AAPL", days_ahead=5)
+    main()
@@ -9,6 +9,11 @@ from sklearn.preprocessing import MinMaxScaler
 from typing import Tuple
 
 
+# Model input features, in scaler column order ('Close' must stay first)
+FEATURE_COLUMNS = ['Close', 'Volume', 'SMA_20', 'SMA_50', 'EMA_12',
+                   'EMA_26', 'RSI', 'MACD', 'MACD_Signal']
+
+
 def add_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add technical indicators to the dataframe.
@@ -72,8 +77,7 @@ def prepare_data(df: pd.DataFrame, sequence_length: int = 60,
         - scaler (MinMaxScaler): Fitted scaler for inverse transformation
     """
     if feature_columns is None:
-        feature_columns = ['Close', 'Volume', 'SMA_20', 'SMA_50', 'EMA_12', 
-                          'EMA_26', 'RSI', 'MACD', 'MACD_Signal']
+        feature_columns = FEATURE_COLUMNS
     
     # Select only the feature columns
     data = df[feature_columns].values
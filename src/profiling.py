@@ -0,0 +1,137 @@
+"""
+Request Profiling Module
+Opt-in sampling profiler for single requests. Stacks of the request thread
+are sampled on a side thread and written as collapsed stacks
+(flamegraph.pl / speedscope compatible).
+
+Profiling is enabled by environment variables:
+    NEUROSTOCK_PROFILE_TOKEN        Callers sending `X-Profile: <token>` are profiled
+    NEUROSTOCK_PROFILE_SAMPLE_RATE  Fraction of requests profiled at random (default 0)
+    NEUROSTOCK_PROFILE_DIR          Output directory (default 'profiles')
+    NEUROSTOCK_PROFILE_MAX_FILES    Number of profiles retained (default 50)
+    NEUROSTOCK_PROFILE_INTERVAL_MS  Sampling interval (default 5)
+"""
+
+import os
+import sys
+import time
+import random
+import threading
+import hmac
+from collections import Counter
+from datetime import datetime
+
+
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_TOKEN = os.environ.get('NEUROSTOCK_PROFILE_TOKEN', '')
+SAMPLE_RATE = float(os.environ.get('NEUROSTOCK_PROFILE_SAMPLE_RATE', '0') or 0)
+PROFILE_DIR = os.environ.get('NEUROSTOCK_PROFILE_DIR', 'profiles')
+MAX_PROFILES = int(os.environ.get('NEUROSTOCK_PROFILE_MAX_FILES', '50') or 50)
+SAMPLE_INTERVAL = float(os.environ.get('NEUROSTOCK_PROFILE_INTERVAL_MS', '5') or 5) / 1000.0
+
+# Checked once per request; when False the hooks return immediately
+ENABLED = bool(PROFILE_TOKEN) or SAMPLE_RATE > 0
+
+_write_lock = threading.Lock()
+
+
+def should_profile(headers) -> bool:
+    """
+    Decide whether the current request should be profiled.
+
+    Args:
+        headers: Request headers (mapping)
+
+    Returns:
+        bool: True if the caller presented the profiling token or the request was sampled
+    """
+    if not ENABLED:
+        return False
+    supplied = headers.get(PROFILE_HEADER)
+    if supplied and PROFILE_TOKEN and hmac.compare_digest(supplied, PROFILE_TOKEN):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name='neurostock-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def collapsed(self) -> str:
+        """Render samples in the collapsed-stack format ('a;b;c <count>')."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def start() -> StackSampler:
+    """Start sampling the calling thread."""
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    return sampler
+
+
+def _prune(directory: str, keep: int):
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.collapsed')),
+        key=os.path.getmtime)
+    for path in files[:max(0, len(files) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def finish(sampler: StackSampler, label: str) -> str:
+    """
+    Stop a sampler and write its profile to PROFILE_DIR.
+
+    Args:
+        sampler (StackSampler): Running sampler returned by start()
+        label (str): Short description used in the file name (endpoint, ticker)
+
+    Returns:
+        str: Path of the written profile
+    """
+    sampler.stop()
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)[:60]
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    with _write_lock:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{stamp}_{safe_label}.collapsed")
+        with open(path, 'w') as f:
+            f.write(sampler.collapsed())
+        _prune(PROFILE_DIR, MAX_PROFILES)
+    print(f"🔬 Profile saved to {path} ({sampler.samples} samples, {sampler.elapsed:.2f}s)")
+    return path
@@ -0,0 +1,287 @@
+"""
+Quote Board Module
+Latest price / previous close per symbol in a shared-memory table.
+
+The table lives in an anonymous shared mapping, so when the server
+pre-forks (see serving.py) every worker process reads the same quotes and
+one refresher keeps them current for all of them. Rows are written under
+a cross-process lock and read lock-free with a per-row sequence counter.
+In the single-process dev server the same table is simply process-local.
+"""
+
+import os
+import mmap
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import yfinance as yf
+
+from metrics import upstream, record_cache, record_upstream_error
+
+
+# A quote is served from the board for this many seconds before re-fetching
+QUOTE_TTL = 30
+
+# Give up on a row still mid-write after this many retries (writer died)
+MAX_READ_RETRIES = 10000
+
+# Symbols read within this window are kept fresh by the background refresher
+ACTIVE_WINDOW = 10 * 60
+REFRESH_INTERVAL = 15
+
+CAPACITY = int(os.environ.get('NEUROSTOCK_QUOTE_SLOTS', 4096))
+FETCH_WORKERS = 8
+
+ROW_DTYPE = np.dtype([
+    ('seq', '<u8'),          # odd while a write is in progress
+    ('symbol', 'S16'),
+    ('price', '<f8'),
+    ('prev_close', '<f8'),
+    ('updated_at', '<f8'),
+    ('last_read', '<f8'),
+])
+HEADER_DTYPE = np.dtype([('count', '<u8'), ('generation', '<u8'), ('refreshes', '<u8')])
+
+
+def fetch_quote(symbol: str) -> tuple:
+    """
+    Fetch (price, previous close) from Yahoo.
+
+    Returns:
+        tuple: (price, prev_close); (nan, nan) if the lookup fails
+    """
+    try:
+        with upstream('yf.fast_info'):
+            info = yf.Ticker(symbol).fast_info
+            price = float(info.last_price) if info.last_price else 0.0
+            prev_close = float(info.previous_close) if info.previous_close else price
+        return price, prev_close
+    except Exception:
+        record_upstream_error('yf.fast_info')
+        return np.nan, np.nan
+
+
+class QuoteBoard:
+    """Fixed-capacity symbol -> quote table in shared memory."""
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        size = HEADER_DTYPE.itemsize + ROW_DTYPE.itemsize * capacity
+        # Anonymous MAP_SHARED mapping: inherited (not copied) by forked workers
+        self._mmap = mmap.mmap(-1, size)
+        self._header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self._mmap)
+        self._rows = np.ndarray((capacity,), dtype=ROW_DTYPE, buffer=self._mmap,
+                                offset=HEADER_DTYPE.itemsize)
+        self._lock = multiprocessing.Lock()
+        # Per-process symbol -> slot index, rebuilt when the shared generation changes
+        self._index = {}
+        self._index_generation = -1
+        self._refresher = None
+
+    def _refresh_index(self):
+        generation = int(self._header['generation'][0])
+        if generation != self._index_generation:
+            count = int(self._header['count'][0])
+            symbols = self._rows['symbol'][:count]
+            self._index = {s.decode(): i for i, s in enumerate(symbols)}
+            self._index_generation = generation
+
+    def _slot(self, symbol: str, create: bool = False):
+        slot = self._index.get(symbol)
+        if slot is not None and self._rows['symbol'][slot] != symbol.encode():
+            # Recycled by another process since this index was built
+            slot = None
+        if slot is None:
+            self._refresh_index()
+            slot = self._index.get(symbol)
+        if slot is None and create:
+            with self._lock:
+                self._refresh_index()
+                slot = self._index.get(symbol)
+                if slot is None:
+                    count = int(self._header['count'][0])
+                    if count < self.capacity:
+                        slot = count
+                        self._header['count'] = count + 1
+                    else:
+                        # Full: reuse the least recently read slot
+                        slot = int(np.argmin(self._rows['last_read']))
+                    row = self._rows[slot]
+                    row['seq'] += 1
+                    row['symbol'] = symbol.encode()
+                    row['price'] = np.nan
+                    row['prev_close'] = np.nan
+                    row['updated_at'] = 0.0
+                    # Only read() marks a symbol active: bulk writes (heatmap)
+                    # must not enrol it in the per-symbol refresh
+                    row['last_read'] = 0.0
+                    row['seq'] += 1
+                    self._header['generation'] += 1
+                    self._refresh_index()
+        return slot
+
+    def write(self, symbol: str, price: float, prev_close: float, updated_at: float = None):
+        """Store a quote (allocating a slot for new symbols)."""
+        slot = self._slot(symbol, create=True)
+        with self._lock:
+            row = self._rows[slot]
+            if row['symbol'].decode() != symbol:
+                return  # slot was recycled meanwhile
+            row['seq'] += 1
+            row['price'] = price
+            row['prev_close'] = prev_close
+            row['updated_at'] = updated_at or time.time()
+            row['seq'] += 1
+
+    def read(self, symbol: str):
+        """
+        Consistent snapshot of one row without taking the lock.
+
+        Returns:
+            tuple: (price, prev_close, updated_at) or None if not on the board
+        """
+        slot = self._slot(symbol)
+        if slot is None:
+            return None
+        row = self._rows[slot]
+        for _ in range(MAX_READ_RETRIES):
+            before = int(row['seq'])
+            if before % 2:
+                continue
+            values = (row['symbol'].decode(), float(row['price']), float(row['prev_close']),
+                      float(row['updated_at']))
+            if int(row['seq']) == before:
+                break
+        else:
+            return None
+        if values[0] != symbol:
+            return None
+        row['last_read'] = time.time()
+        return values[1:]
+
+    def read_many(self, symbols: list) -> tuple:
+        """
+        Consistent snapshot of many rows at once, without taking the lock.
+
+        Unlike read(), this does not mark the symbols as read, so symbols
+        that are only read in bulk are not picked up by the per-symbol
+        background refresher.
+
+        Returns:
+            tuple: (price, prev_close, updated_at) arrays aligned with
+                   symbols; NaN where a symbol is not on the board
+        """
+        self._refresh_index()
+        slots = np.array([self._index.get(s, -1) for s in symbols], dtype=np.int64)
+        found = np.flatnonzero(slots >= 0)
+        for _ in range(MAX_READ_RETRIES):
+            before = self._rows['seq'][slots[found]]
+            rows = self._rows[slots[found]]
+            after = self._rows['seq'][slots[found]]
+            if not np.any((before != after) | (before % 2 == 1)):
+                break
+        # Slots recycled for another symbol since the index was built
+        expected = np.array([symbols[i].encode() for i in found], dtype=ROW_DTYPE['symbol'])
+        found, rows = found[rows['symbol'] == expected], rows[rows['symbol'] == expected]
+
+        price = np.full(len(symbols), np.nan)
+        prev_close = np.full(len(symbols), np.nan)
+        updated_at = np.zeros(len(symbols))
+        price[found], prev_close[found], updated_at[found] = rows['price'], rows['prev_close'], rows['updated_at']
+        return price, prev_close, updated_at
+
+    def symbols(self, active_within: float = None) -> list:
+        count = int(self._header['count'][0])
+        rows = self._rows[:count]
+        if active_within is not None:
+            rows = rows[rows['last_read'] >= time.time() - active_within]
+        return [s.decode() for s in rows['symbol']]
+
+    def refresh(self, symbols: list = None) -> int:
+        """Re-fetch quotes in parallel (default: symbols read recently)."""
+        symbols = symbols if symbols is not None else self.symbols(ACTIVE_WINDOW)
+        if not symbols:
+            return 0
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            fetched = list(pool.map(fetch_quote, symbols))
+        self.write_many(symbols, [q[0] for q in fetched], [q[1] for q in fetched])
+        return len(symbols)
+
+    def write_many(self, symbols: list, prices, prev_closes, updated_at: float = None):
+        """Store one refresh pass of quotes (NaN prices are skipped) and count it as a refresh."""
+        now = updated_at or time.time()
+        for symbol, price, prev_close in zip(symbols, prices, prev_closes):
+            if not np.isnan(price):
+                self.write(symbol, float(price), float(prev_close), now)
+        with self._lock:
+            self._header['refreshes'] += 1
+
+    def refresh_count(self) -> int:
+        """Number of completed refresh passes (shared by all worker processes)."""
+        return int(self._header['refreshes'][0])
+
+    def get_quotes(self, symbols: list, ttl: float = QUOTE_TTL) -> list:
+        """
+        Quotes for many symbols. Fresh ones come from the board; missing or
+        stale ones are fetched in parallel and written back.
+
+        Returns:
+            list: [{"symbol", "price", "prev_close", "change_percent"}, ...]
+                  (price is None when the symbol could not be quoted)
+        """
+        now = time.time()
+        quotes, stale = {}, []
+        for symbol in symbols:
+            row = self.read(symbol)
+            hit = row is not None and not np.isnan(row[0]) and now - row[2] < ttl
+            record_cache('quotes', hit)
+            if hit:
+                quotes[symbol] = row[:2]
+            else:
+                stale.append(symbol)
+
+        if stale:
+            unique = list(dict.fromkeys(stale))
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+                fetched = dict(zip(unique, pool.map(fetch_quote, unique)))
+            for symbol, (price, prev_close) in fetched.items():
+                if not np.isnan(price):
+                    self.write(symbol, price, prev_close, now)
+                quotes[symbol] = (price, prev_close)
+
+        result = []
+        for symbol in symbols:
+            price, prev_close = quotes[symbol]
+            if np.isnan(price):
+                result.append({"symbol": symbol, "price": None, "prev_close": None, "change_percent": None})
+                continue
+            change_pct = ((price - prev_close) / prev_close * 100) if prev_close else 0.0
+            result.append({"symbol": symbol, "price": price, "prev_close": prev_close,
+                           "change_percent": change_pct})
+        return result
+
+    def start_background_refresh(self, interval: float = REFRESH_INTERVAL):
+        """Start a daemon thread that keeps recently read symbols fresh."""
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, args=(interval,),
+                                           name='quote-refresher', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self, interval: float):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Quote refresh failed: {str(e)}")
+            time.sleep(interval)
+
+
+# Shared board; created at import so a pre-forking server maps it before forking
+board = QuoteBoard()
+
+
+def get_quotes(symbols: list) -> list:
+    return board.get_quotes(symbols)
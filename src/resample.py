@@ -0,0 +1,294 @@
+"""
+Resampling Module
+OHLCV pyramid: weekly and monthly bars derived from stored daily bars, and
+hourly bars from stored minute partitions, so long-range charts are served
+locally instead of being downloaded again.
+
+Coarser bars come from vectorized group reductions over the sorted base
+bars: the first open, the max high, the min low, the last close and the
+summed volume. The weekly and monthly tiers are stored per ticker. When
+the bar store downloads new daily bars, only the buckets from the first
+changed day onward are rebuilt, which is normally just the current week
+and month. Hourly bars are built per intraday day partition and reused
+until that partition grows.
+"""
+
+import re
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+import bar_store
+import intraday
+from bar_store import PERIOD_DAYS, _normalize
+from data_loader import fetch_stock_data
+from market_hours import exchange_tz, trades_24_7, SESSION_OPEN
+from metrics import record_cache
+
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+TIERS = ('1wk', '1mo')
+
+# Minute partitions hourly bars are built from
+HOURLY_BASE = '5m'
+
+# Small download that tops up a stale ticker whose history is already stored
+TOP_UP_PERIOD = '1mo'
+
+# Calendar days per unit of a '<N><unit>' look-back period ('7d', '2wk', '18mo', '3y')
+PERIOD_UNITS = {'d': 1, 'wk': 7, 'mo': 31, 'y': 366}
+
+# Relative close difference on overlapping days that means the history was
+# re-adjusted upstream (dividend/split), so older stored bars are dropped
+ADJUSTMENT_TOLERANCE = 1e-4
+
+
+def bucket_keys(dates: np.ndarray, tier: str) -> np.ndarray:
+    """Bucket start date per daily bar: Monday of its week or first of its month."""
+    days = dates.astype('datetime64[D]')
+    if tier == '1wk':
+        # 1970-01-01 was a Thursday; shift so Monday is weekday 0
+        weekday = (days.view('int64') + 3) % 7
+        return days - weekday.astype('timedelta64[D]')
+    if tier == '1mo':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown tier '{tier}'")
+
+
+def period_start(period: str, today: np.datetime64) -> np.datetime64:
+    """First day covered by a look-back period: '<N>d', '<N>wk', '<N>mo', '<N>y', 'ytd' or 'max'."""
+    if period == 'ytd':
+        return today.astype('datetime64[Y]').astype('datetime64[D]')
+    if period == 'max':
+        return np.datetime64('1900-01-01')
+    if period in PERIOD_DAYS:
+        return today - np.timedelta64(PERIOD_DAYS[period], 'D')
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period or '')
+    if match is None:
+        raise ValueError(f"Unsupported period '{period}'. Use e.g. 7d, 2wk, 6mo, 5y, ytd or max")
+    return today - np.timedelta64(int(match.group(1)) * PERIOD_UNITS[match.group(2)], 'D')
+
+
+def reduce_ohlcv(keys: np.ndarray, bars: dict) -> dict:
+    """
+    Collapse sorted bars into one bar per distinct key.
+
+    Args:
+        keys (np.ndarray): Bucket key per bar (non-decreasing)
+        bars (dict): 'open', 'high', 'low', 'close', 'volume' arrays
+
+    Returns:
+        dict: 'date' (bucket keys) plus reduced OHLCV arrays
+    """
+    if not len(keys):
+        return {'date': keys, **{f: np.empty(0) for f in FIELDS}}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)] - 1
+    return {
+        'date': keys[starts],
+        'open': bars['open'][starts],
+        'high': np.maximum.reduceat(bars['high'], starts),
+        'low': np.minimum.reduceat(bars['low'], starts),
+        'close': bars['close'][ends],
+        'volume': np.add.reduceat(bars['volume'], starts),
+    }
+
+
+def _concat(a: dict, b: dict) -> dict:
+    return {k: np.concatenate([a[k], b[k]]) for k in a}
+
+
+def _take(bars: dict, mask) -> dict:
+    return {k: v[mask] for k, v in bars.items()}
+
+
+class OHLCVPyramid:
+    """Daily base bars per ticker with materialized weekly/monthly tiers."""
+
+    def __init__(self, store: bar_store.BarStore = None, ttl: float = bar_store.BAR_TTL):
+        self.store = store or bar_store.store
+        self.ttl = ttl
+        # ticker -> {'date': datetime64[D], 'open', ..., 'volume'}
+        self._base = {}
+        # ticker -> {tier: reduced bars}
+        self._tiers = {}
+        # ticker -> earliest date a full download has covered (no older bars exist before it)
+        self._covered_since = {}
+        self._updated_at = {}
+        # (ticker, interval, day) -> (partition length, hourly bars)
+        self._hourly = {}
+        self._lock = threading.RLock()
+        self.store.subscribe(self._on_new_bars)
+
+    def _on_new_bars(self, ticker: str, bars: pd.DataFrame):
+        if bars.empty:
+            return
+        self.merge(ticker, bars)
+
+    def merge(self, ticker: str, df: pd.DataFrame, covers_from=None):
+        """
+        Merge downloaded daily bars into the base and rebuild the tier
+        buckets from the first day that changed.
+        """
+        new = {'date': pd.to_datetime(df['Date']).to_numpy().astype('datetime64[D]')}
+        for field in FIELDS:
+            new[field] = df[field.capitalize()].to_numpy(dtype=np.float64)
+        with self._lock:
+            old = self._base.get(ticker)
+            if old is None or new['date'][0] <= old['date'][0]:
+                base, changed_from = new, None
+            else:
+                overlap_old = _take(old, old['date'] >= new['date'][0])
+                overlap_new = _take(new, np.isin(new['date'], overlap_old['date']))
+                overlap_old = _take(overlap_old, np.isin(overlap_old['date'], overlap_new['date']))
+                if len(overlap_old['date']) == 0:
+                    # A gap between stored and new bars: start over from the new ones
+                    base, changed_from = new, None
+                else:
+                    rel = np.abs(overlap_new['close'] - overlap_old['close']) / np.abs(overlap_old['close'])
+                    if rel.max() > ADJUSTMENT_TOLERANCE:
+                        # Re-adjusted upstream: older stored bars no longer line up
+                        base, changed_from = new, None
+                        self._covered_since.pop(ticker, None)
+                    else:
+                        same = np.ones(len(overlap_new['date']), dtype=bool)
+                        for field in FIELDS:
+                            same &= overlap_new[field] == overlap_old[field]
+                        differs = overlap_new['date'][~same]
+                        first_new = new['date'][new['date'] > old['date'][-1]]
+                        candidates = np.concatenate([differs, first_new[:1]])
+                        changed_from = candidates.min() if len(candidates) else np.datetime64('NaT')
+                        base = _concat(_take(old, old['date'] < new['date'][0]), new)
+            self._base[ticker] = base
+            self._updated_at[ticker] = time.time()
+            if covers_from is not None:
+                since = self._covered_since.get(ticker)
+                self._covered_since[ticker] = covers_from if since is None else min(since, covers_from)
+            if changed_from is None:
+                self._tiers[ticker] = {tier: reduce_ohlcv(bucket_keys(base['date'], tier), base)
+                                       for tier in TIERS}
+            elif not np.isnat(changed_from):
+                self._tiers[ticker] = {tier: self._rebuild_tail(ticker, tier, base, changed_from)
+                                       for tier in TIERS}
+
+    def _rebuild_tail(self, ticker: str, tier: str, base: dict, changed_from) -> dict:
+        """Keep finished buckets before the changed day's bucket; reduce the rest."""
+        cached = self._tiers[ticker][tier]
+        start = bucket_keys(np.array([changed_from]), tier)[0]
+        tail = _take(base, base['date'] >= start)
+        return _concat(_take(cached, cached['date'] < start),
+                       reduce_ohlcv(bucket_keys(tail['date'], tier), tail))
+
+    def _ensure(self, ticker: str, since):
+        """Make sure the base reaches back to `since` and is fresh."""
+        with self._lock:
+            base = self._base.get(ticker)
+            covered = self._covered_since.get(ticker)
+            reaches = base is not None and (base['date'][0] <= since or
+                                            (covered is not None and covered <= since))
+            fresh = reaches and time.time() - self._updated_at.get(ticker, 0) <= self.ttl
+        record_cache('ohlcv_pyramid', fresh)
+        if fresh:
+            return
+        if reaches:
+            # History is stored; only the latest bars are needed
+            self.merge(ticker, _normalize(fetch_stock_data(ticker, period=TOP_UP_PERIOD)))
+            return
+        days = (np.datetime64('today') - since).astype(int)
+        period = next((p for p, d in sorted(PERIOD_DAYS.items(), key=lambda x: x[1]) if d >= days), 'max')
+        bars = self.store.get_bars(ticker, period)
+        with self._lock:
+            # The listener has merged fresh downloads; a cache hit still has to be merged here
+            if ticker not in self._base or self._base[ticker]['date'][0] > since:
+                self.merge(ticker, bars)
+            self._covered_since[ticker] = min(self._covered_since.get(ticker, since), since)
+
+    def get_range(self, ticker: str, interval: str = '1d', period: str = '1mo',
+                  start: str = None, end: str = None) -> pd.DataFrame:
+        """
+        OHLCV bars for a date range at daily, weekly, monthly or hourly resolution.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            interval (str): '1d', '1wk', '1mo' or '1h'
+            period (str): Look-back period ('7d', '2wk', '1mo' ... '10y', 'ytd', 'max'), used without start
+            start (str): Inclusive start date 'YYYY-MM-DD'
+            end (str): Exclusive end date 'YYYY-MM-DD'
+
+        Returns:
+            pd.DataFrame: ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']
+        """
+        ticker = ticker.upper()
+        today = np.datetime64('today')
+        since = np.datetime64(start, 'D') if start else period_start(period, today)
+        until = np.datetime64(end, 'D') if end else today + np.timedelta64(1, 'D')
+
+        if interval in ('1h', '60m'):
+            return self._hourly_range(ticker, since, until)
+        if interval not in ('1d',) + TIERS:
+            raise ValueError(f"Unsupported interval '{interval}'. Options: 1d, 1wk, 1mo, 1h")
+
+        self._ensure(ticker, since)
+        with self._lock:
+            bars = self._base[ticker] if interval == '1d' else self._tiers[ticker][interval]
+        # Coarse buckets are kept whole: include the bucket that contains `since`
+        first = since if interval == '1d' else bucket_keys(np.array([since]), interval)[0]
+        return _frame(_take(bars, (bars['date'] >= first) & (bars['date'] < until)))
+
+    def _hourly_range(self, ticker: str, since, until) -> pd.DataFrame:
+        intraday.store.refresh(ticker, HOURLY_BASE)
+        parts = []
+        for day in intraday.store.days(ticker, HOURLY_BASE):
+            if not since <= np.datetime64(day) < until:
+                continue
+            partition = intraday.store.partition(ticker, HOURLY_BASE, day)
+            key = (ticker, HOURLY_BASE, day)
+            cached = self._hourly.get(key)
+            if cached is None or cached[0] != len(partition):
+                cached = (len(partition), hourly_bars(partition, ticker))
+                self._hourly[key] = cached
+            parts.append(cached[1])
+        if not parts:
+            raise ValueError(f"No intraday data found for ticker: {ticker}")
+        bars = parts[0]
+        for part in parts[1:]:
+            bars = _concat(bars, part)
+        return _frame(bars, tz=exchange_tz(ticker))
+
+
+def hourly_bars(partition: np.ndarray, ticker: str) -> dict:
+    """
+    Hourly bars from one day's minute partition. Equity hours start at the
+    09:30 open (09:30, 10:30, ...), like Yahoo's 60m bars; 24/7 markets
+    use clock hours.
+    """
+    ts = partition['ts']
+    anchor = 0 if trades_24_7(ticker) else int(SESSION_OPEN.total_seconds())
+    local = pd.to_datetime(ts, unit='s', utc=True).tz_convert(exchange_tz(ticker))
+    seconds = (local - local.normalize()).total_seconds().to_numpy().astype(np.int64)
+    hour_start = ts - (seconds - anchor) % 3600
+    bars = {f: partition[f].astype(np.float64) for f in FIELDS}
+    reduced = reduce_ohlcv(hour_start, bars)
+    reduced['date'] = reduced['date'].astype('datetime64[s]')
+    return reduced
+
+
+def _frame(bars: dict, tz: str = None) -> pd.DataFrame:
+    dates = pd.to_datetime(bars['date'])
+    if tz is not None:
+        dates = dates.tz_localize('UTC').tz_convert(tz)
+    df = pd.DataFrame({'Date': dates})
+    for field in FIELDS:
+        df[field.capitalize()] = bars[field]
+    return df
+
+
+# Shared pyramid fed by the bar store
+pyramid = OHLCVPyramid()
+
+
+def get_range(ticker: str, interval: str = '1d', period: str = '1mo',
+              start: str = None, end: str = None) -> pd.DataFrame:
+    """Module-level shortcut for pyramid.get_range."""
+    return pyramid.get_range(ticker, interval, period, start, end)
@@ -0,0 +1,397 @@
+"""
+Retraining Scheduler
+Keeps served models fresh by spending a nightly training budget on the
+models that matter most.
+
+Every model (published bundle or legacy metadata file) is assessed from
+its metadata alone:
+- its age since `trained_on`;
+- the trading sessions and bars that have closed since then;
+- how often the API served it over the last TRAFFIC_DAYS.
+
+The API workers count served requests with record_request() and flush the
+counts to SQLite. Models past a staleness threshold are ranked by traffic
+x staleness and packed into the budget. Each model gets one of two modes:
+- an incremental fine-tune of the current bundle (train.fine_tune_model)
+  while few sessions have accumulated;
+- a full retrain once too many sessions have built up, after repeated
+  fine-tunes, or when the model has no bundle to start from.
+
+Costs come from each model's last logged run, or are estimated from the
+epoch timings in its metadata.
+
+Usage:
+    python src/retraining.py report              # stale models, highest priority first
+    python src/retraining.py plan --budget 3600  # what a run would train
+    python src/retraining.py run --budget 3600   # e.g. nightly from cron
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import model_bundle
+from market_hours import bars_per_session, is_intraday, trades_24_7
+
+
+DB_PATH = os.environ.get('NEUROSTOCK_RETRAINING_DB', 'data/retraining.db')
+
+# Training seconds one scheduled run may spend (e.g. the nightly window)
+BUDGET_SECONDS = float(os.environ.get('NEUROSTOCK_RETRAIN_BUDGET', 2 * 60 * 60))
+
+# Request counts older than this do not affect priority
+TRAFFIC_DAYS = 7
+# Seconds between flushes of a worker's request counts
+FLUSH_INTERVAL = 30
+
+# Sessions since training that make a model stale (intraday models see
+# far more bars per session and are trained on recent days only)
+STALE_SESSIONS = 20
+STALE_SESSIONS_INTRADAY = 5
+# Calendar age that makes a model stale regardless of sessions
+MAX_AGE_DAYS = 45
+
+# Beyond this many new sessions, or after this many fine-tunes in a row, retrain fully
+FULL_RETRAIN_SESSIONS = 120
+MAX_INCREMENTAL_RUNS = 4
+
+# Cost estimates (seconds) when a model has no timings or logged runs
+DEFAULT_FULL_SECONDS = 900
+DEFAULT_INCREMENTAL_SECONDS = 120
+# Data download, model build and publish on top of the epochs
+RUN_OVERHEAD_SECONDS = 20
+FULL_EPOCHS = 50
+# A fine-tune (a few epochs over ~1y) relative to a full run (up to 50 epochs over ~5y)
+INCREMENTAL_COST_FRACTION = 0.05
+
+MODES = ('incremental', 'full')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS traffic (
+    key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    PRIMARY KEY (key, day)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    seconds REAL NOT NULL,
+    status TEXT NOT NULL,
+    version INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_key ON runs(key, mode, id);
+"""
+
+
+def _model_metadata(models_dir: str = model_bundle.MODELS_DIR) -> dict:
+    """key -> (metadata, has_bundle) for every bundled or legacy model."""
+    models = {}
+    for key in model_bundle.list_tickers(models_dir):
+        try:
+            header, _ = model_bundle.map_current(key, models_dir)
+            models[key] = (header['metadata'], True)
+        except Exception as e:
+            print(f"⚠️ Could not read bundle for {key}: {str(e)}")
+    if os.path.isdir(models_dir):
+        for name in os.listdir(models_dir):
+            key = name[:-len('_metadata.json')]
+            if name.endswith('_metadata.json') and key.upper() not in models:
+                try:
+                    with open(os.path.join(models_dir, name)) as f:
+                        models[key.upper()] = (json.load(f), False)
+                except (OSError, ValueError):
+                    continue
+    return models
+
+
+def sessions_since(trained_on: datetime, ticker: str, now: datetime) -> int:
+    """Trading sessions after the training day up to and including today."""
+    start, end = trained_on.date() + timedelta(days=1), now.date() + timedelta(days=1)
+    if end <= start:
+        return 0
+    if trades_24_7(ticker):
+        return (end - start).days
+    return int(np.busday_count(start, end))
+
+
+class RetrainingScheduler:
+    """Request counts, staleness assessment, budgeted plans and the run log."""
+
+    def __init__(self, path: str = DB_PATH, models_dir: str = model_bundle.MODELS_DIR):
+        self.path = path
+        self.models_dir = models_dir
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._pending = Counter()
+        self._flushed_at = time.time()
+
+    # ----- traffic (API side) -----
+
+    def record_request(self, key: str):
+        """Count one served prediction for a model key (flushed every FLUSH_INTERVAL)."""
+        with self._lock:
+            self._pending[key.upper()] += 1
+            due = time.time() - self._flushed_at >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.time()
+            if not pending:
+                return
+            day = time.strftime('%Y-%m-%d', time.gmtime())
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO traffic (key, day, requests) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key, day) DO UPDATE SET requests = requests + excluded.requests',
+                    [(key, day, count) for key, count in pending.items()])
+
+    def traffic(self, days: int = TRAFFIC_DAYS) -> dict:
+        """key -> requests over the last `days` days."""
+        self.flush()
+        since = time.strftime('%Y-%m-%d', time.gmtime(time.time() - days * 86400))
+        with self._lock:
+            rows = self._conn.execute('SELECT key, SUM(requests) FROM traffic WHERE day >= ? GROUP BY key',
+                                      (since,)).fetchall()
+        return dict(rows)
+
+    # ----- assessment and planning -----
+
+    def _last_run_seconds(self, key: str, mode: str):
+        with self._lock:
+            row = self._conn.execute("SELECT seconds FROM runs WHERE key = ? AND mode = ? AND status = 'ok' "
+                                     'ORDER BY id DESC LIMIT 1', (key, mode)).fetchone()
+        return row[0] if row else None
+
+    def _estimate(self, key: str, mode: str, metadata: dict) -> float:
+        logged = self._last_run_seconds(key, mode)
+        if logged is not None:
+            return logged
+        training = metadata.get('training', {})
+        if training.get('epoch_seconds'):
+            full = training['epoch_seconds'] * training.get('epochs_run', FULL_EPOCHS) + RUN_OVERHEAD_SECONDS
+        else:
+            full = DEFAULT_FULL_SECONDS
+        if mode == 'full':
+            return full
+        incremental = metadata.get('incremental', {})
+        if incremental.get('epoch_seconds'):
+            return incremental['epoch_seconds'] * incremental['epochs_run'] + RUN_OVERHEAD_SECONDS
+        if training.get('epoch_seconds'):
+            return full * INCREMENTAL_COST_FRACTION + RUN_OVERHEAD_SECONDS
+        return DEFAULT_INCREMENTAL_SECONDS
+
+    def assess(self, now: datetime = None) -> list:
+        """
+        Staleness of every model, highest retraining priority first.
+
+        Returns:
+            list: {"key", "ticker", "interval", "trained_on", "age_days",
+                   "sessions", "new_bars", "requests", "stale", "mode",
+                   "estimated_seconds", "priority"}
+        """
+        now = now or datetime.now()
+        traffic = self.traffic()
+        rows = []
+        for key, (metadata, has_bundle) in _model_metadata(self.models_dir).items():
+            ticker = metadata.get('ticker', key).upper()
+            interval = metadata.get('interval', '1d')
+            try:
+                trained_on = datetime.strptime(metadata['trained_on'], "%Y-%m-%d %H:%M:%S")
+            except (KeyError, ValueError):
+                trained_on = datetime.min
+            sessions = sessions_since(trained_on, ticker, now) if trained_on > datetime.min else None
+            age_days = (now - trained_on).total_seconds() / 86400 if trained_on > datetime.min else None
+            threshold = STALE_SESSIONS_INTRADAY if is_intraday(interval) else STALE_SESSIONS
+            stale = sessions is None or sessions >= threshold or age_days >= MAX_AGE_DAYS
+            staleness = 10.0 if sessions is None else max(sessions / threshold, age_days / MAX_AGE_DAYS)
+
+            incremental_ok = (has_bundle and not is_intraday(interval) and sessions is not None
+                              and sessions < FULL_RETRAIN_SESSIONS
+                              and metadata.get('incremental', {}).get('runs', 0) < MAX_INCREMENTAL_RUNS)
+            mode = 'incremental' if incremental_ok else 'full'
+            requests = int(traffic.get(key, 0))
+            rows.append({
+                "key": key,
+                "ticker": ticker,
+                "interval": interval,
+                "trained_on": metadata.get('trained_on'),
+                "age_days": round(age_days, 1) if age_days is not None else None,
+                "sessions": sessions,
+                "new_bars": int(sessions * bars_per_session(ticker, interval)) if sessions is not None else None,
+                "requests": requests,
+                "stale": bool(stale),
+                "mode": mode,
+                "estimated_seconds": round(self._estimate(key, mode, metadata), 1),
+                # Traffic-weighted: an idle model must be much staler to outrank a busy one
+                "priority": round((1 + requests) * staleness, 3),
+            })
+        rows.sort(key=lambda r: (not r['stale'], -r['priority']))
+        return rows
+
+    def plan(self, budget: float = BUDGET_SECONDS, now: datetime = None) -> dict:
+        """
+        Stale models in priority order, packed greedily into the budget:
+        a model that does not fit is deferred and cheaper ones behind it
+        still get their turn.
+
+        Returns:
+            dict: {"budget_seconds", "planned_seconds", "planned": [...], "deferred": [...]}
+        """
+        remaining, planned, deferred = budget, [], []
+        for row in self.assess(now):
+            if not row['stale']:
+                continue
+            if row['estimated_seconds'] <= remaining:
+                planned.append(row)
+                remaining -= row['estimated_seconds']
+            else:
+                deferred.append(row)
+        return {"budget_seconds": budget, "planned_seconds": round(budget - remaining, 1),
+                "planned": planned, "deferred": deferred}
+
+    def report(self) -> dict:
+        """Every model's staleness plus the current plan, for the API."""
+        models = self.assess()
+        plan = self.plan()
+        return {
+            "stale": sum(m['stale'] for m in models),
+            "models": models,
+            "budget_seconds": plan['budget_seconds'],
+            "planned": [m['key'] for m in plan['planned']],
+            "deferred": [m['key'] for m in plan['deferred']],
+            "recent_runs": self.runs(limit=20),
+        }
+
+    # ----- runs -----
+
+    def _retrain(self, row: dict):
+        """Run one planned retrain; returns the published bundle version."""
+        import train
+        if row['mode'] == 'incremental':
+            return train.fine_tune_model(row['ticker'])['bundle_version']
+        if is_intraday(row['interval']):
+            return train.train_intraday_model(ticker=row['ticker'], interval=row['interval'],
+                                              plot='off')['bundle_version']
+        return train.train_model(ticker=row['ticker'], fast=True, plot='off')['bundle_version']
+
+    def run(self, budget: float = BUDGET_SECONDS) -> list:
+        """
+        Plan and run retrains in priority order until the budget is spent.
+        A planned model is skipped if the actual time left is below its estimate.
+
+        Returns:
+            list: {"key", "mode", "status", "seconds", "version"} per attempted model
+        """
+        plan = self.plan(budget)
+        start = time.time()
+        results = []
+        print(f"🗓️ Retraining {len(plan['planned'])} models in a {budget:.0f}s budget "
+              f"({len(plan['deferred'])} deferred)")
+        for row in plan['planned']:
+            remaining = budget - (time.time() - start)
+            if row['estimated_seconds'] > remaining:
+                print(f"⏭️ {row['key']}: {row['estimated_seconds']:.0f}s estimate, {remaining:.0f}s left")
+                continue
+            print(f"🔁 {row['key']}: {row['mode']} retrain ({row['sessions']} sessions old, "
+                  f"{row['requests']} requests)")
+            run_start = time.time()
+            status, version, error = 'ok', None, None
+            try:
+                version = self._retrain(row)
+            except Exception as e:
+                status, error = 'failed', str(e)
+                print(f"❌ {row['key']} retrain failed: {error}")
+            seconds = time.time() - run_start
+            with self._lock, self._conn:
+                self._conn.execute('INSERT INTO runs (key, mode, started_at, seconds, status, version, error) '
+                                   'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                   (row['key'], row['mode'], run_start, seconds, status, version, error))
+            results.append({"key": row['key'], "mode": row['mode'], "status": status,
+                            "seconds": round(seconds, 1), "version": version})
+        done = sum(r['status'] == 'ok' for r in results)
+        print(f"✅ Retrained {done}/{len(results)} models in {time.time() - start:.0f}s")
+        return results
+
+    def runs(self, key: str = None, limit: int = 50) -> list:
+        """Logged retrains, newest first."""
+        query = 'SELECT key, mode, started_at, seconds, status, version, error FROM runs'
+        params = []
+        if key is not None:
+            query += ' WHERE key = ?'
+            params.append(key.upper())
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY id DESC LIMIT ?', params + [limit]).fetchall()
+        return [{"key": r[0], "mode": r[1], "started_at": r[2], "seconds": round(r[3], 1),
+                 "status": r[4], "version": r[5], "error": r[6]} for r in rows]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RetrainingScheduler:
+    """Shared scheduler (opened on first use, so each process gets its own connection)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RetrainingScheduler()
+        return _scheduler
+
+
+def record_request(key: str):
+    """Count one served prediction for a model key."""
+    get_scheduler().record_request(key)
+
+
+def _print_models(rows: list):
+    print(f"{'MODEL':<12}{'TRAINED':<21}{'SESSIONS':>9}{'REQUESTS':>10}{'PRIORITY':>10}  {'MODE':<12}{'EST':>7}")
+    for r in rows:
+        marker = '⚠️' if r['stale'] else '  '
+        print(f"{r['key']:<12}{r['trained_on'] or '?':<21}{r['sessions'] if r['sessions'] is not None else '?':>9}"
+              f"{r['requests']:>10}{r['priority']:>10}  {r['mode']:<12}{r['estimated_seconds']:>6.0f}s {marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Staleness-aware, traffic-prioritized model retraining")
+    parser.add_argument("command", choices=("report", "plan", "run"))
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="Training seconds to spend")
+    args = parser.parse_args()
+
+    scheduler = get_scheduler()
+    if args.command == 'report':
+        rows = scheduler.assess()
+        print(f"📋 {sum(r['stale'] for r in rows)}/{len(rows)} models stale")
+        _print_models(rows)
+    elif args.command == 'plan':
+        plan = scheduler.plan(args.budget)
+        print(f"🗓️ {len(plan['planned'])} retrains, ~{plan['planned_seconds']:.0f}s of {args.budget:.0f}s")
+        _print_models(plan['planned'])
+        if plan['deferred']:
+            print(f"⏭️ Deferred: {', '.join(r['key'] for r in plan['deferred'])}")
+    else:
+        scheduler.run(args.budget)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,109 @@
 """
 Sentiment Analysis Module
-Provides market sentiment analysis. Uses real yfinance news when available,
-falling back to deterministic mock data.
+Provides market sentiment analysis. Headlines come from the local news store
+(fed by yfinance news) and are scored offline with the finance lexicon in headline_scoring; when no real
+news is available the score is neutral and mock headlines are shown.
 """
 
 import random
+import threading
+import time
 from datetime import datetime
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
+
+import bar_store
+import news_store
+from headline_scoring import score_tickers
+from metrics import record_cache
+
+
+# Headlines change through the day; indicators only move with new bars
+NEWS_TTL = 15 * 60
+INDICATOR_TTL = 60 * 60
+
+# Parallel upstream news fetches for bulk sweeps
+BULK_FETCH_WORKERS = 8
+
+# (ticker, trading day) -> (computed_at, value)
+_news_cache = {}
+_indicator_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(cache: dict, name: str, key: tuple, ttl: float, compute):
+    """Return a cached value for key if younger than ttl, else compute and store it."""
+    with _cache_lock:
+        entry = cache.get(key)
+    if entry is not None and time.time() - entry[0] <= ttl:
+        record_cache(name, True)
+        return entry[1]
+    record_cache(name, False)
+    value = compute()
+    with _cache_lock:
+        # Entries from previous trading days are never read again
+        for stale in [k for k in cache if k[1] != key[1]]:
+            del cache[stale]
+        cache[key] = (time.time(), value)
+    return value
+
+
+def _fetch_news(ticker: str) -> list:
+    """Up to five recent headlines for a ticker from the local news store."""
+    try:
+        return news_store.get_store().latest(ticker, limit=5)
+    except Exception:
+        return []
+
+
+def _compute_indicator_signals(ticker: str) -> tuple:
+    """RSI and trend (last close vs 20-day SMA) from the shared bar store."""
+    rsi = None
+    trend = "neutral"
+    try:
+        df = bar_store.get_indicators(ticker, period="1y")
+        if len(df) >= 1:
+            rsi = round(float(df['RSI'].iloc[-1]), 1)
+
+            # Simple trend: last close vs 20-day SMA
+            sma20 = float(df['SMA_20'].iloc[-1])
+            last_close = float(df['Close'].iloc[-1])
+            if last_close > sma20 * 1.005:
+                trend = "bullish"
+            elif last_close < sma20 * 0.995:
+                trend = "bearish"
+            else:
+                trend = "neutral"
+    except Exception:
+        pass
+    return rsi, trend
+
+
+def _label_for(score: int) -> tuple:
+    """Map a -100..100 score to its (label, color)."""
+    if score >= 75:
+        return "Extreme Greed", "green"
+    elif score >= 25:
+        return "Greed", "lightgreen"
+    elif score >= -25:
+        return "Neutral", "gray"
+    elif score >= -75:
+        return "Fear", "orange"
+    return "Extreme Fear", "red"
+
+
+def _get_news(ticker: str, date_str: str) -> list:
+    return _cached(_news_cache, 'sentiment_news', (ticker, date_str), NEWS_TTL,
+                   lambda: _fetch_news(ticker))
+
 
 def get_market_sentiment(ticker: str) -> dict:
     """
     Get market sentiment for a specific ticker.
-    Also computes RSI and trend direction from live yfinance data.
+    Also computes RSI and trend direction from the shared bar store (bar_store.py).
+
+    News and indicator signals are cached per ticker and trading day with
+    separate TTLs (NEWS_TTL, INDICATOR_TTL). The score is the mean lexicon
+    score of the headlines scaled to -100..100.
 
     Args:
         ticker (str): Stock ticker symbol
@@ -19,62 +111,20 @@ def get_market_sentiment(ticker: str) -> dict:
     Returns:
         dict: Sentiment data including score, label, news headlines, RSI, and trend.
     """
-    # Deterministic seed based on ticker and date to keep it consistent for the day
-    date_str = datetime.now().strftime("%Y%m%d")
-    seed_val = sum(ord(c) for c in ticker) + int(date_str)
-    random.seed(seed_val)
+    ticker = ticker.upper()
 
-    # Generate a sentiment score between -100 (Extreme Fear) and 100 (Extreme Greed)
-    base_score = random.randint(-40, 60)
-    score = max(-100, min(100, base_score + random.randint(-10, 10)))
+    date_str = datetime.now().strftime("%Y%m%d")
 
-    # Determine label
-    if score >= 75:
-        label = "Extreme Greed"
-        color = "green"
-    elif score >= 25:
-        label = "Greed"
-        color = "lightgreen"
-    elif score >= -25:
-        label = "Neutral"
-        color = "gray"
-    elif score >= -75:
-        label = "Fear"
-        color = "orange"
-    else:
-        label = "Extreme Fear"
-        color = "red"
-
-    # Try to fetch real news from yfinance
-    news = []
-    try:
-        ticker_obj_news = yf.Ticker(ticker)
-        raw_news = ticker_obj_news.news or []
-        for item in raw_news[:5]:
-            content = item.get('content', {})
-            title = content.get('title') or item.get('title', '')
-            if not title:
-                continue
-            provider = content.get('provider', {}) or {}
-            source = provider.get('displayName', 'Market News')
-            pub_date = content.get('pubDate', '') or item.get('providerPublishTime', '')
-            # Format time as relative
-            time_str = 'recently'
-            try:
-                import time as _time
-                if isinstance(pub_date, (int, float)):
-                    diff_hours = int((_time.time() - pub_date) / 3600)
-                    time_str = f"{diff_hours}h ago" if diff_hours < 48 else f"{diff_hours // 24}d ago"
-            except Exception:
-                pass
-            link = content.get('canonicalUrl', {}) or {}
-            url = link.get('url', '#') if isinstance(link, dict) else '#'
-            news.append({"title": title, "source": source, "time": time_str, "url": url})
-    except Exception:
-        pass
+    # Real news from yfinance (cached per ticker and day), scored by the lexicon engine
+    news = _get_news(ticker, date_str)
+    score, headline_scores = score_tickers({ticker: [item['title'] for item in news]})[ticker]
+    news = [dict(item, sentiment=round(s, 3)) for item, s in zip(news, headline_scores)]
+    label, color = _label_for(score)
 
     # Fall back to mock news if nothing real found
     if not news:
+        # Deterministic per ticker and day; local RNG so concurrent requests don't interfere
+        rng = random.Random(sum(ord(c) for c in ticker) + int(date_str))
         templates = [
             f"Analysts upgrade {ticker} following strong earnings report",
             f"{ticker} announces new AI initiative",
@@ -85,39 +135,17 @@ def get_market_sentiment(ticker: str) -> dict:
             f"{ticker} faces regulatory scrutiny in EU",
             f"Tech sector rally boosts {ticker}",
         ]
-        for headline in random.sample(templates, 3):
+        for headline in rng.sample(templates, 3):
             news.append({
                 "title": headline,
-                "source": random.choice(["MarketWatch", "Bloomberg", "Reuters", "CNBC"]),
-                "time": f"{random.randint(1, 23)}h ago",
+                "source": rng.choice(["MarketWatch", "Bloomberg", "Reuters", "CNBC"]),
+                "time": f"{rng.randint(1, 23)}h ago",
                 "url": "#"
             })
 
-    # Compute live RSI and trend from yfinance
-    rsi = None
-    trend = "neutral"
-    try:
-        df = yf.download(ticker, period="3mo", interval="1d", progress=False, auto_adjust=True)
-        if len(df) >= 15:
-            close = df["Close"].squeeze()
-            delta = close.diff()
-            gain = delta.clip(lower=0).rolling(14).mean()
-            loss = (-delta.clip(upper=0)).rolling(14).mean()
-            rs = gain / (loss + 1e-10)
-            rsi_series = 100 - (100 / (1 + rs))
-            rsi = round(float(rsi_series.iloc[-1]), 1)
-
-            # Simple trend: last close vs 20-day SMA
-            sma20 = close.rolling(20).mean().iloc[-1]
-            last_close = float(close.iloc[-1])
-            if last_close > float(sma20) * 1.005:
-                trend = "bullish"
-            elif last_close < float(sma20) * 0.995:
-                trend = "bearish"
-            else:
-                trend = "neutral"
-    except Exception:
-        pass
+    # RSI and trend from the shared bar store (cached per ticker and day)
+    rsi, trend = _cached(_indicator_cache, 'sentiment_indicators', (ticker, date_str),
+                         INDICATOR_TTL, lambda: _compute_indicator_signals(ticker))
 
     return {
         "ticker": ticker,
@@ -130,5 +158,35 @@ def get_market_sentiment(ticker: str) -> dict:
         "summary": f"Market sentiment for {ticker} is currently showing {label.lower()}. Analysts are mixed but long-term indicators remain robust."
     }
 
+def get_bulk_sentiment(tickers: list) -> list:
+    """
+    Headline sentiment for many tickers, scored in a single batch.
+    Skips the RSI/trend signals so a market-wide sweep stays cheap.
+
+    Args:
+        tickers (list): Stock ticker symbols
+
+    Returns:
+        list: [{"ticker", "score", "label", "color", "headlines"}, ...]
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    date_str = datetime.now().strftime("%Y%m%d")
+    with ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS) as pool:
+        news = dict(zip(tickers, pool.map(lambda t: _get_news(t, date_str), tickers)))
+    scored = score_tickers({t: [item['title'] for item in news[t]] for t in tickers})
+
+    results = []
+    for t in tickers:
+        score, _ = scored[t]
+        label, color = _label_for(score)
+        results.append({
+            "ticker": t,
+            "score": score,
+            "label": label,
+            "color": color,
+            "headlines": len(news[t])
+        })
+    return results
+
 if __name__ == "__main__":
     print(get_market_sentiment("AAPL"))
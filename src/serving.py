@@ -0,0 +1,164 @@
+"""
+Serving Module
+Pre-forked production serving under gunicorn (settings in gunicorn.conf.py).
+
+preload() runs once in the gunicorn master before any worker is forked: it
+maps every published model bundle, downloads bars for the tickers that have
+models and seeds the shared quote board. Workers inherit all of it
+copy-on-write. Bundle arrays are read-only file mappings, so every worker
+shares the same page-cache pages; the quote board is a MAP_SHARED segment,
+so one refresher process keeps quotes current for all workers.
+
+The master itself never runs TensorFlow ops or keeps threads alive, since
+neither survives a fork. Each worker builds its Keras graphs from the
+mapped weights in warm_worker() before taking traffic.
+
+Usage (from the repository root):
+    gunicorn -c src/gunicorn.conf.py app:app
+    kill -HUP <master pid>     # re-preload, start new workers, drain old ones
+"""
+
+import os
+import sys
+import time
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import bar_store
+import fundamentals
+import metrics
+import model_bundle
+import news_store
+import quotes
+from app import MARKET_OVERVIEW_SYMBOLS, TOP_MOVER_SYMBOLS
+
+
+PRELOAD_PERIOD = "1y"
+PRELOAD_WORKERS = 8
+
+_refresher_pid = None
+
+
+def preload(models_dir: str = model_bundle.MODELS_DIR) -> dict:
+    """
+    Warm process-wide state in the master so forked workers start with it.
+
+    Args:
+        models_dir (str): Root models directory
+
+    Returns:
+        dict: Counts of mapped bundles, warmed tickers and seeded quotes
+    """
+    start = time.time()
+    tickers = []
+    mapped = 0
+    for name in model_bundle.list_tickers(models_dir):
+        try:
+            header, _ = model_bundle.map_current(name, models_dir)
+            mapped += 1
+        except Exception as e:
+            print(f"❌ Could not map bundle for {name}: {str(e)}")
+            continue
+        # Intraday bundles (e.g. AAPL_5M) read intraday partitions, not daily bars
+        if header['metadata'].get('interval', '1d') == '1d':
+            tickers.append(name)
+
+    def _warm(ticker):
+        try:
+            return not bar_store.get_indicators(ticker, period=PRELOAD_PERIOD).empty
+        except Exception:
+            return False
+
+    # The pools are joined before returning, so no thread outlives the preload
+    with ThreadPoolExecutor(max_workers=PRELOAD_WORKERS) as pool:
+        warmed = sum(pool.map(_warm, tickers))
+
+    symbols = list(dict.fromkeys(tickers + MARKET_OVERVIEW_SYMBOLS + TOP_MOVER_SYMBOLS))
+    seeded = quotes.board.refresh(symbols)
+    # The master's own counts (preload downloads) before workers fork and reset theirs
+    metrics.flush()
+
+    summary = {"bundles": mapped, "bars": warmed, "quotes": seeded,
+               "seconds": round(time.time() - start, 2)}
+    print(f"✅ Preloaded {mapped} bundles, bars for {warmed} tickers, "
+          f"{seeded} quotes in {summary['seconds']}s")
+    return summary
+
+
+def warm_worker(models_dir: str = model_bundle.MODELS_DIR):
+    """Build the Keras model for every published bundle (runs in each worker)."""
+    metrics.start_multiprocess()
+    for ticker in model_bundle.list_tickers(models_dir):
+        try:
+            model_bundle.get_model(ticker, models_dir)
+        except Exception as e:
+            print(f"❌ Could not load model for {ticker}: {str(e)}")
+
+
+def _run_refresher(interval: float, parent_pid: int):
+    # The fork inherits the master's signal handlers; the refresher wants the defaults
+    for sig in (signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD, signal.SIGQUIT,
+                signal.SIGUSR1, signal.SIGUSR2, signal.SIGTTIN, signal.SIGTTOU, signal.SIGWINCH):
+        signal.signal(sig, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    metrics.start_multiprocess()
+    # The bot runtime lives here too: one process sees every quote refresh
+    import bots
+    import heatmap
+    import anomalies
+    runtime = bots.get_runtime()
+    # Bulk universe quotes for the sector heatmap, minute bars for the
+    # anomaly detector, fundamentals and headlines, each on its own slower
+    # cadence; workers only read what these write
+    heatmap.heatmap.start_background_refresh()
+    anomalies.get_monitor().start_background()
+    fundamentals.get_store().start_background_refresh()
+    news_store.get_store().start_background_refresh()
+    while os.getppid() == parent_pid:
+        try:
+            quotes.board.refresh()
+        except Exception as e:
+            print(f"❌ Quote refresh failed: {str(e)}")
+        try:
+            runtime.tick()
+        except Exception as e:
+            print(f"❌ Bot runtime tick failed: {str(e)}")
+        time.sleep(interval)
+
+
+def start_quote_refresher(interval: float = quotes.REFRESH_INTERVAL):
+    """
+    Fork the process that keeps the shared quote board fresh for all workers,
+    bulk-refreshes the heatmap universe (heatmap.py), feeds the anomaly
+    detector (anomalies.py), refreshes fundamentals and headlines and runs
+    the trading bots (bots.py). A thread in the master would not be
+    inherited by the workers.
+    """
+    global _refresher_pid
+    if _refresher_pid is not None:
+        return
+    parent_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_refresher(interval, parent_pid)
+        finally:
+            os._exit(0)
+    _refresher_pid = pid
+    # Workers fork after this: they leave headline refreshes to the refresher
+    news_store.refreshed_elsewhere = True
+
+
+def stop_quote_refresher():
+    global _refresher_pid
+    if _refresher_pid is None:
+        return
+    try:
+        os.kill(_refresher_pid, signal.SIGTERM)
+        os.waitpid(_refresher_pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass  # already exited (gunicorn may have reaped it)
+    _refresher_pid = None
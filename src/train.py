@@ -5,60 +5,179 @@ Trains the LSTM model on historical stock data
 
 import os
 import sys
+import time
+import tempfile
+import threading
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from datetime import datetime
 
 # Add src to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from data_loader import fetch_stock_data
-from preprocessing import add_technical_indicators, prepare_data, split_data
-from model import create_lstm_model, get_callbacks
+from preprocessing import add_technical_indicators, prepare_data, split_data, FEATURE_COLUMNS
+from model import create_lstm_model, get_callbacks, keras
+import model_bundle
+import intraday
+
+
+# Architecture used when a ticker has no tuned configuration (see tune.py)
+DEFAULT_HYPERPARAMETERS = {
+    'units': [100, 50, 50],
+    'dropout_rate': 0.2,
+    'learning_rate': None,
+    'sequence_length': 60,
+    'batch_size': 32,
+    'feature_columns': FEATURE_COLUMNS,
+}
+
+
+def load_hyperparameters(ticker: str) -> dict:
+    """
+    Hyperparameters to train a ticker with: the best tuned configuration
+    stored in its metadata, if any, on top of DEFAULT_HYPERPARAMETERS.
+    """
+    params = dict(DEFAULT_HYPERPARAMETERS)
+    params.update(((model_bundle.current_metadata(ticker) or {}).get('tuning') or {}).get('best', {}))
+    return params
+
+
+# Plot modes: render before returning, render on a background thread, or skip
+PLOT_MODES = ('sync', 'async', 'off')
 
 
 def plot_training_history(history, save_path: str = "models/training_history.png"):
     """
     Plot and save training history.
     
+    Uses the object-oriented Matplotlib API (no pyplot global state), so it
+    is safe to run on a background thread.
+    
     Args:
-        history: Keras training history object
+        history: Keras training history object (or its .history dict)
         save_path (str): Path to save the plot
     """
-    plt.figure(figsize=(14, 5))
+    values = getattr(history, 'history', history)
+    fig = Figure(figsize=(14, 5))
     
     # Plot loss
-    plt.subplot(1, 2, 1)
-    plt.plot(history.history['loss'], label='Training Loss', linewidth=2)
-    plt.plot(history.history['val_loss'], label='Validation Loss', linewidth=2)
-    plt.title('Model Loss', fontsize=14, fontweight='bold')
-    plt.xlabel('Epoch')
-    plt.ylabel('Loss')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
+    ax = fig.add_subplot(1, 2, 1)
+    ax.plot(values['loss'], label='Training Loss', linewidth=2)
+    ax.plot(values['val_loss'], label='Validation Loss', linewidth=2)
+    ax.set_title('Model Loss', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Epoch')
+    ax.set_ylabel('Loss')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
     
     # Plot MAE
-    plt.subplot(1, 2, 2)
-    plt.plot(history.history['mean_absolute_error'], label='Training MAE', linewidth=2)
-    plt.plot(history.history['val_mean_absolute_error'], label='Validation MAE', linewidth=2)
-    plt.title('Mean Absolute Error', fontsize=14, fontweight='bold')
-    plt.xlabel('Epoch')
-    plt.ylabel('MAE')
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+    ax = fig.add_subplot(1, 2, 2)
+    ax.plot(values['mean_absolute_error'], label='Training MAE', linewidth=2)
+    ax.plot(values['val_mean_absolute_error'], label='Validation MAE', linewidth=2)
+    ax.set_title('Mean Absolute Error', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Epoch')
+    ax.set_ylabel('MAE')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=300, bbox_inches='tight')
     print(f"✅ Training history saved to {save_path}")
-    plt.close()
+
+
+def configure_cpu(threads: int = None, inter_op_threads: int = 2) -> bool:
+    """
+    Pin TensorFlow's CPU thread pools. Must run before TensorFlow executes
+    its first op; later calls are ignored.
+    
+    Args:
+        threads (int): Intra-op threads (default: all CPUs)
+        inter_op_threads (int): Inter-op threads
+    
+    Returns:
+        bool: True if the settings were applied
+    """
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads or os.cpu_count() or 1)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        return True
+    except RuntimeError:
+        print("⚠️ TensorFlow already initialized; keeping its thread settings")
+        return False
+
+
+def make_dataset(X: np.ndarray, y: np.ndarray, batch_size: int, shuffle: bool = False):
+    """
+    float32 tf.data pipeline: cast once, cache, batch and prefetch, instead
+    of converting float64 NumPy arrays on every batch.
+    """
+    import tensorflow as tf
+    dataset = tf.data.Dataset.from_tensor_slices((X.astype(np.float32), y.astype(np.float32))).cache()
+    if shuffle:
+        dataset = dataset.shuffle(len(X), reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+class EpochTimer(keras.callbacks.Callback):
+    """Records wall-clock seconds per epoch."""
+
+    def __init__(self):
+        super().__init__()
+        self.seconds = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.seconds.append(time.perf_counter() - self._start)
+
+
+def fit_model(model, X_train: np.ndarray, y_train: np.ndarray, epochs: int, batch_size: int,
+              validation_split: float = 0.1, callbacks: list = None, fast: bool = False):
+    """
+    Fit the model on the default path (NumPy inputs, progress bar) or the
+    fast path (float32 tf.data with prefetch, one log line per epoch).
+    Both hold out the last validation_split of the samples for validation
+    and shuffle the rest each epoch.
+    
+    Returns:
+        Keras History object
+    """
+    if not fast:
+        return model.fit(
+            X_train, y_train,
+            epochs=epochs,
+            batch_size=batch_size,
+            validation_split=validation_split,
+            callbacks=callbacks,
+            verbose=1
+        )
+    split = int(len(X_train) * (1 - validation_split))
+    return model.fit(
+        make_dataset(X_train[:split], y_train[:split], batch_size, shuffle=True),
+        validation_data=make_dataset(X_train[split:], y_train[split:], batch_size),
+        epochs=epochs,
+        callbacks=callbacks,
+        shuffle=False,  # the dataset reshuffles itself
+        verbose=2
+    )
 
 
 def train_model(ticker: str = "AAPL", period: str = "5y", 
-                sequence_length: int = 60, epochs: int = 50, 
-                batch_size: int = 32, validation_split: float = 0.1):
+                sequence_length: int = None, epochs: int = 50, 
+                batch_size: int = None, validation_split: float = 0.1,
+                units: list = None, dropout_rate: float = None,
+                learning_rate: float = None, feature_columns: list = None,
+                fast: bool = False, threads: int = None, jit_compile: bool = False,
+                plot: str = None, tuning: dict = None):
     """
     Complete training pipeline for stock price prediction.
     
+    Hyperparameters left as None come from the ticker's tuned configuration
+    (if tune.py has been run) or DEFAULT_HYPERPARAMETERS.
+    
     Args:
         ticker (str): Stock ticker symbol
         period (str): Time period for historical data
@@ -66,7 +185,32 @@ def train_model(ticker: str = "AAPL", period: str = "5y",
         epochs (int): Number of training epochs
         batch_size (int): Batch size for training
         validation_split (float): Validation data ratio
+        units (list): LSTM units per layer
+        dropout_rate (float): Dropout rate
+        learning_rate (float): Adam learning rate
+        feature_columns (list): Input features ('Close' first)
+        fast (bool): Fast CPU mode: pinned thread pools, float32 tf.data
+            pipeline with prefetch, per-epoch logging and async plotting
+        threads (int): Intra-op threads in fast mode (default: all CPUs)
+        jit_compile (bool): Compile the training step with XLA
+        plot (str): 'sync', 'async' or 'off' (default: 'async' in fast mode, else 'sync')
+        tuning (dict): tune.py result to store in the metadata (default: the
+            previous version's, so retraining keeps it)
     """
+    plot = plot or ('async' if fast else 'sync')
+    if plot not in PLOT_MODES:
+        raise ValueError(f"plot must be one of {PLOT_MODES}")
+    if fast:
+        configure_cpu(threads)
+    
+    params = load_hyperparameters(ticker)
+    overrides = {'sequence_length': sequence_length, 'batch_size': batch_size, 'units': units,
+                 'dropout_rate': dropout_rate, 'learning_rate': learning_rate,
+                 'feature_columns': feature_columns}
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    sequence_length = params['sequence_length']
+    batch_size = params['batch_size']
+    
     print("=" * 70)
     print(f"🚀 STOCK MARKET PREDICTOR - TRAINING PIPELINE")
     print("=" * 70)
@@ -86,26 +230,27 @@ def train_model(ticker: str = "AAPL", period: str = "5y",
     
     # Step 3: Prepare data
     print("\n[3/5] 🎲 Preparing data for LSTM...")
-    X, y, scaler = prepare_data(df, sequence_length=sequence_length)
+    X, y, scaler = prepare_data(df, sequence_length=sequence_length,
+                                feature_columns=params['feature_columns'])
     X_train, X_test, y_train, y_test = split_data(X, y, train_ratio=0.8)
     
     # Step 4: Create model
     print("\n[4/5] 🧠 Creating LSTM model...")
     input_shape = (X_train.shape[1], X_train.shape[2])
-    model = create_lstm_model(input_shape, units=[100, 50, 50], dropout_rate=0.2)
+    model = create_lstm_model(input_shape, units=params['units'], dropout_rate=params['dropout_rate'],
+                              learning_rate=params['learning_rate'], jit_compile=jit_compile)
     
     # Step 5: Train model
     print("\n[5/5] 🏋️ Training model...")
-    callbacks = get_callbacks(model_path=f"models/{ticker}_best_model.h5")
-    
-    history = model.fit(
-        X_train, y_train,
-        epochs=epochs,
-        batch_size=batch_size,
-        validation_split=validation_split,
-        callbacks=callbacks,
-        verbose=1
-    )
+    timer = EpochTimer()
+    # The checkpoint is scratch space: the trained model ships in the bundle
+    with tempfile.TemporaryDirectory(prefix=f"{ticker}-checkpoint-") as checkpoint_dir:
+        callbacks = get_callbacks(model_path=os.path.join(checkpoint_dir, "best_model.h5")) + [timer]
+        history = fit_model(model, X_train, y_train, epochs=epochs, batch_size=batch_size,
+                            validation_split=validation_split, callbacks=callbacks, fast=fast)
+    epoch_seconds = float(np.mean(timer.seconds[1:] or timer.seconds))
+    samples_per_sec = len(X_train) * (1 - validation_split) / epoch_seconds
+    print(f"⏱️ {epoch_seconds:.2f}s/epoch, {samples_per_sec:,.0f} samples/sec")
     
     # Evaluate on test set
     print("\n📊 Evaluating on test set...")
@@ -114,49 +259,308 @@ def train_model(ticker: str = "AAPL", period: str = "5y",
     print(f"✅ Test MAE: {test_mae:.6f}")
     
     # Plot training history
-    plot_training_history(history, save_path=f"models/{ticker}_training_history.png")
+    plot_path = f"models/{ticker}_training_history.png"
+    if plot == 'sync':
+        plot_training_history(history, save_path=plot_path)
+    elif plot == 'async':
+        threading.Thread(target=plot_training_history, args=(dict(history.history), plot_path),
+                         name='training-plot').start()
     
-    # Save scaler
-    import joblib
-    scaler_path = f"models/{ticker}_scaler.pkl"
-    joblib.dump(scaler, scaler_path)
-    print(f"✅ Scaler saved to {scaler_path}")
+    # Metadata (keeping any tuning results from the previous version)
+    if tuning is None:
+        tuning = (model_bundle.current_metadata(ticker) or {}).get('tuning')
     
-    # Save metadata
     metadata = {
         'ticker': ticker,
         'period': period,
         'sequence_length': sequence_length,
         'num_features': X_train.shape[2],
+        'feature_columns': list(params['feature_columns']),
+        'hyperparameters': {k: params[k] for k in ('units', 'dropout_rate', 'learning_rate', 'batch_size')},
         'test_loss': float(test_loss),
         'test_mae': float(test_mae),
+        'training': {
+            'mode': 'fast' if fast else 'default',
+            'jit_compile': jit_compile,
+            'epochs_run': len(timer.seconds),
+            'epoch_seconds': round(epoch_seconds, 3),
+            'samples_per_sec': round(samples_per_sec, 1)
+        },
         'trained_on': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
+    if tuning is not None:
+        metadata['tuning'] = tuning
     
-    import json
-    metadata_path = f"models/{ticker}_metadata.json"
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=4)
-    print(f"✅ Metadata saved to {metadata_path}")
+    # Publish model, scaler and metadata together as one versioned bundle
+    metadata['bundle_version'] = model_bundle.publish(ticker, model, scaler, metadata)
+    print(f"✅ Bundle published: models/{ticker.upper()}/v{metadata['bundle_version']:04d}.nsb")
     
     print("\n" + "=" * 70)
     print("🎉 TRAINING COMPLETE!")
     print("=" * 70)
-    print(f"📁 Model saved: models/{ticker}_best_model.h5")
-    print(f"📁 Scaler saved: {scaler_path}")
-    print(f"📁 Metadata saved: {metadata_path}")
-    print(f"📁 Training plot: models/{ticker}_training_history.png")
+    print(f"📁 Model, scaler and metadata: models/{ticker.upper()}/v{metadata['bundle_version']:04d}.nsb")
+    if plot != 'off':
+        print(f"📁 Training plot: {plot_path}")
+    print("=" * 70)
+    
+    return metadata
+
+
+# Incremental retraining: recent history, a few epochs, a small learning rate
+FINE_TUNE_PERIOD = "1y"
+FINE_TUNE_EPOCHS = 5
+FINE_TUNE_LEARNING_RATE = 1e-4
+
+
+def fine_tune_model(ticker: str = "AAPL", period: str = FINE_TUNE_PERIOD, epochs: int = FINE_TUNE_EPOCHS,
+                    learning_rate: float = FINE_TUNE_LEARNING_RATE, validation_split: float = 0.1,
+                    fast: bool = True, threads: int = None):
+    """
+    Incremental retrain: continue training the current bundle on recent bars.
+
+    The bundle's architecture, weights and scaler are kept (the scaler is
+    not refitted, so inputs stay on the scale the model learned), and the
+    result is published as the next bundle version. Much cheaper than
+    train_model(); retraining.py falls back to a full retrain once too many
+    bars have accumulated or after repeated incremental runs.
+
+    Args:
+        ticker (str): Stock ticker symbol (daily model with a published bundle)
+        period (str): Recent history to train on
+        epochs (int): Training epochs
+        learning_rate (float): Adam learning rate for the continued training
+        validation_split (float): Validation data ratio
+        fast (bool): Fast CPU mode (see train_model)
+        threads (int): Intra-op threads in fast mode (default: all CPUs)
+
+    Returns:
+        dict: Metadata of the published version
+    """
+    if fast:
+        configure_cpu(threads)
+    bundle = model_bundle.load(ticker)
+    metadata = dict(bundle.metadata)
+    sequence_length = metadata['sequence_length']
+    feature_columns = metadata.get('feature_columns', FEATURE_COLUMNS)
+    batch_size = metadata.get('hyperparameters', {}).get('batch_size') or DEFAULT_HYPERPARAMETERS['batch_size']
+
+    print(f"🔁 Fine-tuning {ticker} v{bundle.version:04d} on {period} of bars ({epochs} epochs)...")
+    df = add_technical_indicators(fetch_stock_data(ticker, period=period))
+    scaled = bundle.scaler.transform(df[feature_columns].values)
+    # (samples, features, sequence_length) views -> (samples, sequence_length, features)
+    X = np.lib.stride_tricks.sliding_window_view(scaled, sequence_length, axis=0)[:-1].transpose(0, 2, 1)
+    y = scaled[sequence_length:, 0]
+    X_train, X_test, y_train, y_test = split_data(np.ascontiguousarray(X), y, train_ratio=0.8)
+
+    model = bundle.model
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+                  loss='mean_squared_error', metrics=['mean_absolute_error'])
+    timer = EpochTimer()
+    fit_model(model, X_train, y_train, epochs=epochs, batch_size=batch_size,
+              validation_split=validation_split, callbacks=[timer], fast=fast)
+    epoch_seconds = float(np.mean(timer.seconds[1:] or timer.seconds))
+    test_loss, test_mae = model.evaluate(X_test, y_test, verbose=0)
+    print(f"✅ Test Loss: {test_loss:.6f} (was {metadata.get('test_loss', float('nan')):.6f})")
+
+    previous = metadata.get('incremental', {})
+    metadata.update({
+        'test_loss': float(test_loss),
+        'test_mae': float(test_mae),
+        # The full run's 'training' stats are kept; this describes the latest incremental run
+        'incremental': {
+            'base_version': bundle.version,
+            'runs': previous.get('runs', 0) + 1,
+            'period': period,
+            'epochs_run': len(timer.seconds),
+            'epoch_seconds': round(epoch_seconds, 3),
+        },
+        'trained_on': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    metadata['bundle_version'] = model_bundle.publish(ticker, model, bundle.scaler, metadata)
+    print(f"✅ Bundle published: models/{ticker.upper()}/v{metadata['bundle_version']:04d}.nsb")
+    return metadata
+
+
+# Samples held in the shuffle buffer when streaming intraday windows
+SHUFFLE_BUFFER = 10000
+
+
+def _windows_dataset(chunks: list, sequence_length: int, feature_idx: list, scaler,
+                     batch_size: int, warmup_chunks: int = 0, shuffle: bool = False):
+    """tf.data pipeline that cuts windows from the chunks on the fly, each epoch."""
+    import tensorflow as tf
+    num_features = len(feature_idx)
+    batches = -(-intraday.window_count(chunks, sequence_length, feature_idx, warmup_chunks) // batch_size)
+    dataset = tf.data.Dataset.from_generator(
+        lambda: intraday.stream_windows(chunks, sequence_length, feature_idx, scaler, warmup_chunks),
+        output_signature=(tf.TensorSpec((None, sequence_length, num_features), tf.float32),
+                          tf.TensorSpec((None,), tf.float32))).unbatch()
+    if shuffle:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, reshuffle_each_iteration=True)
+    # A known length lets Keras size the epoch instead of running the generator dry
+    dataset = dataset.batch(batch_size).apply(tf.data.experimental.assert_cardinality(batches))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def train_intraday_model(ticker: str = "AAPL", interval: str = "5m", days: int = None,
+                         sequence_length: int = None, epochs: int = 20,
+                         batch_size: int = None, validation_split: float = 0.1,
+                         units: list = None, dropout_rate: float = None,
+                         learning_rate: float = None, feature_columns: list = None,
+                         plot: str = 'async'):
+    """
+    Train on intraday bars, streaming windows from the day partitions.
+    
+    The newest 20% of trading days are the test set and the validation
+    split is taken, also by whole days, from the end of the rest. The
+    scaler is fitted on the training days only, one partition at a time.
+    The model is published as the bundle intraday.model_key(ticker, interval),
+    e.g. AAPL_5M.
+    
+    Args:
+        ticker (str): Stock ticker symbol
+        interval (str): Bar interval ('1m' ... '90m')
+        days (int): Most recent trading days to use (default: all stored)
+        sequence_length (int): Number of bars to look back
+        epochs (int): Number of training epochs
+        batch_size (int): Batch size for training
+        validation_split (float): Share of training days held out for validation
+        units (list): LSTM units per layer
+        dropout_rate (float): Dropout rate
+        learning_rate (float): Adam learning rate
+        feature_columns (list): Input features ('Close' first)
+        plot (str): 'sync', 'async' or 'off'
+    """
+    from sklearn.preprocessing import MinMaxScaler
+    
+    if plot not in PLOT_MODES:
+        raise ValueError(f"plot must be one of {PLOT_MODES}")
+    key = intraday.model_key(ticker, interval)
+    params = load_hyperparameters(key)
+    overrides = {'sequence_length': sequence_length, 'batch_size': batch_size, 'units': units,
+                 'dropout_rate': dropout_rate, 'learning_rate': learning_rate,
+                 'feature_columns': feature_columns}
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    sequence_length = params['sequence_length']
+    batch_size = params['batch_size']
+    feature_idx = intraday.feature_indexes(params['feature_columns'])
+    
+    print("=" * 70)
+    print(f"🚀 STOCK MARKET PREDICTOR - INTRADAY TRAINING PIPELINE")
+    print("=" * 70)
+    print(f"📊 Ticker: {ticker}")
+    print(f"⏱️ Interval: {interval}")
+    print(f"🔢 Sequence Length: {sequence_length} bars")
+    print(f"🎯 Epochs: {epochs}")
+    print("=" * 70)
+    
+    # Step 1: Top up the day partitions
+    print("\n[1/5] 📥 Fetching intraday bars...")
+    intraday.store.refresh(ticker, interval, force=True)
+    
+    # Step 2: Indicators, computed partition by partition
+    print("\n[2/5] 🔧 Adding technical indicators per partition...")
+    chunks = list(intraday.store.indicator_chunks(ticker, interval, days))
+    if len(chunks) < 3:
+        raise ValueError(f"Need at least 3 trading days of {interval} bars for {ticker}, have {len(chunks)}")
+    
+    # Step 3: Split by day and fit the scaler on the training days
+    print("\n[3/5] 🎲 Preparing streaming windows...")
+    test_days = max(1, int(len(chunks) * 0.2))
+    train_chunks, test_chunks = chunks[:-test_days], chunks[-test_days:]
+    val_days = max(1, int(len(train_chunks) * validation_split))
+    fit_chunks, val_chunks = train_chunks[:-val_days], train_chunks[-val_days:]
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    for _, _, features in fit_chunks:
+        selected = features[:, feature_idx]
+        selected = selected[~np.isnan(selected).any(axis=1)]
+        if len(selected):
+            scaler.partial_fit(selected)
+    train_ds = _windows_dataset(fit_chunks, sequence_length, feature_idx, scaler, batch_size, shuffle=True)
+    # Validation/test windows reach back into the preceding day through its carried tail
+    val_ds = _windows_dataset(fit_chunks[-1:] + val_chunks, sequence_length, feature_idx, scaler,
+                              batch_size, warmup_chunks=1)
+    test_ds = _windows_dataset(train_chunks[-1:] + test_chunks, sequence_length, feature_idx, scaler,
+                               batch_size, warmup_chunks=1)
+    train_samples = intraday.window_count(fit_chunks, sequence_length, feature_idx)
+    print(f"✅ {len(fit_chunks)}/{len(val_chunks)}/{len(test_chunks)} train/val/test days, "
+          f"~{train_samples:,} training windows")
+    
+    # Step 4: Create model
+    print("\n[4/5] 🧠 Creating LSTM model...")
+    model = create_lstm_model((sequence_length, len(feature_idx)), units=params['units'],
+                              dropout_rate=params['dropout_rate'], learning_rate=params['learning_rate'])
+    
+    # Step 5: Train model
+    print("\n[5/5] 🏋️ Training model...")
+    timer = EpochTimer()
+    with tempfile.TemporaryDirectory(prefix=f"{key}-checkpoint-") as checkpoint_dir:
+        callbacks = get_callbacks(model_path=os.path.join(checkpoint_dir, "best_model.h5")) + [timer]
+        history = model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=callbacks,
+                            shuffle=False, verbose=2)  # the dataset shuffles itself
+    epoch_seconds = float(np.mean(timer.seconds[1:] or timer.seconds))
+    samples_per_sec = train_samples / epoch_seconds
+    print(f"⏱️ {epoch_seconds:.2f}s/epoch, {samples_per_sec:,.0f} samples/sec")
+    
+    print("\n📊 Evaluating on test days...")
+    test_loss, test_mae = model.evaluate(test_ds, verbose=0)
+    print(f"✅ Test Loss: {test_loss:.6f}")
+    print(f"✅ Test MAE: {test_mae:.6f}")
+    
+    plot_path = f"models/{key}_training_history.png"
+    if plot == 'sync':
+        plot_training_history(history, save_path=plot_path)
+    elif plot == 'async':
+        threading.Thread(target=plot_training_history, args=(dict(history.history), plot_path),
+                         name='training-plot').start()
+    
+    tuning = (model_bundle.current_metadata(key) or {}).get('tuning')
+    
+    metadata = {
+        'ticker': ticker,
+        'interval': interval,
+        'days': len(chunks),
+        'first_day': chunks[0][0].isoformat(),
+        'last_day': chunks[-1][0].isoformat(),
+        'sequence_length': sequence_length,
+        'num_features': len(feature_idx),
+        'feature_columns': list(params['feature_columns']),
+        'hyperparameters': {k: params[k] for k in ('units', 'dropout_rate', 'learning_rate', 'batch_size')},
+        'test_loss': float(test_loss),
+        'test_mae': float(test_mae),
+        'training': {
+            'mode': 'intraday_stream',
+            'epochs_run': len(timer.seconds),
+            'epoch_seconds': round(epoch_seconds, 3),
+            'samples_per_sec': round(samples_per_sec, 1)
+        },
+        'trained_on': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if tuning is not None:
+        metadata['tuning'] = tuning
+    
+    metadata['bundle_version'] = model_bundle.publish(key, model, scaler, metadata)
+    print(f"✅ Bundle published: models/{key}/v{metadata['bundle_version']:04d}.nsb")
+    
+    print("\n" + "=" * 70)
+    print("🎉 INTRADAY TRAINING COMPLETE!")
     print("=" * 70)
     
     return metadata
 
 
 if __name__ == "__main__":
-    # Train on Apple stock
-    train_model(
-        ticker="AAPL",
-        period="5y",
-        sequence_length=60,
-        epochs=50,
-        batch_size=32
-    )
+    # Train on Apple stock (pass --fast for the fast CPU training mode,
+    # --interval 5m to train an intraday model)
+    if '--interval' in sys.argv:
+        train_intraday_model(
+            ticker="AAPL",
+            interval=sys.argv[sys.argv.index('--interval') + 1]
+        )
+    else:
+        train_model(
+            ticker="AAPL",
+            period="5y",
+            epochs=50,
+            fast='--fast' in sys.argv
+        )
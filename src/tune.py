@@ -0,0 +1,341 @@
+"""
+Hyperparameter Search
+Random search over the LSTM architecture and training knobs per ticker.
+
+Trials run in parallel worker processes. Each one reports val_loss after
+every epoch to a shared history, and a median rule stops trials that are
+already worse than the others at the same epoch. Windowed, scaled tensors
+are cached per worker and reused by every trial with the same sequence
+length and feature subset. The best configuration is written into the
+metadata of the ticker's model bundle, where train.py picks it up.
+
+Usage:
+    python src/tune.py AAPL MSFT --trials 30 --workers 8
+    python src/tune.py NVDA --no-retrain
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Add src to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from preprocessing import FEATURE_COLUMNS
+from model import create_lstm_model, EarlyStopping, keras
+from evaluate import cache_features, load_features, init_tf_worker
+from train import train_model
+import model_bundle
+
+
+REPORT_DIR = "reports/tuning"
+
+# Input feature subsets ('Close' first: it is the prediction target)
+FEATURE_SUBSETS = {
+    'all': FEATURE_COLUMNS,
+    'trend': ['Close', 'SMA_20', 'SMA_50', 'EMA_12', 'EMA_26'],
+    'momentum': ['Close', 'Volume', 'RSI', 'MACD', 'MACD_Signal'],
+    'price_volume': ['Close', 'Volume'],
+}
+
+SEARCH_SPACE = {
+    'units': [[50, 50], [100, 50], [64, 64, 32], [100, 50, 50], [128, 64, 32]],
+    'dropout_rate': [0.1, 0.2, 0.3],
+    'sequence_length': [30, 60, 90],
+    'batch_size': [16, 32, 64],
+    'feature_subset': list(FEATURE_SUBSETS),
+}
+LEARNING_RATE_RANGE = (1e-4, 3e-3)  # sampled log-uniformly
+
+# Same split as train.py: last 20% held out, last 10% of the rest for validation
+TRAIN_RATIO = 0.8
+VALIDATION_SPLIT = 0.1
+
+# Median pruning: start comparing after this many epochs, against at least this many trials
+PRUNE_WARMUP_EPOCHS = 3
+PRUNE_MIN_TRIALS = 3
+
+# Windowed datasets kept per worker process
+MAX_CACHED_DATASETS = 8
+
+_datasets = OrderedDict()
+
+
+def sample_params(rng: np.random.Generator) -> dict:
+    """Draw one configuration from SEARCH_SPACE."""
+    params = {k: v[rng.integers(len(v))] for k, v in SEARCH_SPACE.items()}
+    low, high = np.log(LEARNING_RATE_RANGE[0]), np.log(LEARNING_RATE_RANGE[1])
+    params['learning_rate'] = float(f"{np.exp(rng.uniform(low, high)):.2g}")
+    return params
+
+
+def _dataset(ticker: str, sequence_length: int, columns: tuple, out_dir: str) -> tuple:
+    """
+    (X_train, y_train, X_val, y_val) for a ticker, cached per process so
+    trials sharing a sequence length and feature subset reuse the tensors.
+    """
+    key = (ticker, sequence_length, columns)
+    if key in _datasets:
+        _datasets.move_to_end(key)
+        return _datasets[key]
+
+    features, _ = load_features(out_dir, ticker)
+    data = features[:, [FEATURE_COLUMNS.index(c) for c in columns]]
+    samples = len(data) - sequence_length
+    train_end = int(samples * TRAIN_RATIO)
+    val_start = int(train_end * (1 - VALIDATION_SPLIT))
+
+    # Scaler fitted on training rows only
+    fit_rows = data[:sequence_length + val_start]
+    low = fit_rows.min(axis=0)
+    span = fit_rows.max(axis=0) - low
+    span[span == 0] = 1.0
+    scaled = ((data - low) / span).astype(np.float32)
+
+    windows = sliding_window_view(scaled, sequence_length, axis=0).transpose(0, 2, 1)
+    targets = scaled[sequence_length:, 0]
+    dataset = (np.ascontiguousarray(windows[:val_start]), targets[:val_start],
+               np.ascontiguousarray(windows[val_start:train_end]), targets[val_start:train_end])
+
+    _datasets[key] = dataset
+    if len(_datasets) > MAX_CACHED_DATASETS:
+        _datasets.popitem(last=False)
+    return dataset
+
+
+class MedianPruningCallback(keras.callbacks.Callback):
+    """
+    Publishes val_loss per epoch to a shared history and stops training when
+    the trial's best val_loss is worse than the median of the other trials
+    for the same ticker at the same epoch.
+    """
+
+    def __init__(self, history, ticker: str, trial: int,
+                 warmup: int = PRUNE_WARMUP_EPOCHS, min_trials: int = PRUNE_MIN_TRIALS):
+        super().__init__()
+        self.history = history
+        self.ticker = ticker
+        self.key = f"{ticker}/{trial}"
+        self.warmup = warmup
+        self.min_trials = min_trials
+        self.values = []
+        self.pruned = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.values.append(float((logs or {}).get('val_loss', np.inf)))
+        self.history[self.key] = list(self.values)
+        if epoch + 1 < self.warmup:
+            return
+        others = [min(values[:epoch + 1]) for key, values in self.history.items()
+                  if key != self.key and key.startswith(self.ticker + "/") and len(values) > epoch]
+        if len(others) >= self.min_trials and min(self.values) > np.median(others):
+            self.pruned = True
+            self.model.stop_training = True
+
+
+def run_trial(ticker: str, trial: int, params: dict, config: dict, history) -> dict:
+    """
+    Train one configuration and report its best validation loss.
+
+    Returns:
+        dict: {"trial", "params", "val_loss", "epochs_run", "pruned", "seconds"}
+    """
+    columns = tuple(FEATURE_SUBSETS[params['feature_subset']])
+    X_train, y_train, X_val, y_val = _dataset(ticker, params['sequence_length'], columns,
+                                              config['out_dir'])
+
+    keras.utils.set_random_seed(config['seed'] + trial)
+    pruning = MedianPruningCallback(history, ticker, trial)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        model = create_lstm_model((params['sequence_length'], len(columns)), units=params['units'],
+                                  dropout_rate=params['dropout_rate'],
+                                  learning_rate=params['learning_rate'])
+        model.fit(
+            X_train, y_train,
+            epochs=config['epochs'],
+            batch_size=params['batch_size'],
+            validation_data=(X_val, y_val),
+            callbacks=[pruning, EarlyStopping(monitor='val_loss', patience=5)],
+            verbose=0
+        )
+    keras.backend.clear_session()
+
+    return {
+        "trial": trial,
+        "params": params,
+        "val_loss": min(pruning.values),
+        "epochs_run": len(pruning.values),
+        "pruned": pruning.pruned,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def _best_hyperparameters(params: dict) -> dict:
+    """Trial params in the form train_model() and the metadata use."""
+    best = {k: v for k, v in params.items() if k != 'feature_subset'}
+    best['feature_columns'] = list(FEATURE_SUBSETS[params['feature_subset']])
+    return best
+
+
+def save_tuning(ticker: str, tuning: dict):
+    """
+    Store the tuning result without retraining: republish the ticker's current
+    bundle with it in the metadata (if the ticker has a bundle).
+
+    Returns:
+        int: The published version, or None
+    """
+    if model_bundle.current_version(ticker) is None:
+        return None
+    bundle = model_bundle.load(ticker)
+    return model_bundle.publish(ticker, bundle.model, bundle.scaler, dict(bundle.metadata, tuning=tuning))
+
+
+def tune(tickers: list, trials: int = 20, period: str = "5y", epochs: int = 30,
+         workers: int = None, threads_per_worker: int = 1, out_dir: str = REPORT_DIR,
+         retrain: bool = True, final_epochs: int = 50, refresh: bool = False, seed: int = 42) -> dict:
+    """
+    Search hyperparameters for many tickers.
+
+    Args:
+        tickers (list): Stock ticker symbols
+        trials (int): Configurations tried per ticker
+        period (str): History to download per ticker
+        epochs (int): Max epochs per trial (pruning and early stopping cut this short)
+        workers (int): Trial processes (default: CPU count)
+        threads_per_worker (int): TensorFlow intra-op threads per process
+        out_dir (str): Directory for reports and the feature cache
+        retrain (bool): Train the production model with the best configuration
+        final_epochs (int): Epochs for that final training run
+        refresh (bool): Re-download bars even if cached today
+        seed (int): Random seed for sampling and training
+
+    Returns:
+        dict: {ticker: tuning result}
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    config = {"epochs": epochs, "seed": seed, "out_dir": out_dir}
+
+    print("=" * 70)
+    print(f"🎛️ STOCK MARKET PREDICTOR - HYPERPARAMETER SEARCH")
+    print("=" * 70)
+    print(f"📊 Tickers: {len(tickers)}")
+    print(f"🎲 Trials per ticker: {trials}")
+    print(f"⚙️ Workers: {workers} x {threads_per_worker} thread(s)")
+    print("=" * 70)
+
+    # Step 1: download and cache features
+    print("\n[1/3] 📥 Caching features...")
+
+    def cache(ticker):
+        try:
+            cache_features(ticker, period, out_dir, refresh)
+            return ticker
+        except Exception as e:
+            print(f"❌ {ticker}: {str(e)}")
+            return None
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            tickers = [t for t in pool.map(cache, tickers) if t]
+
+    # Step 2: run trials, interleaving tickers so every ticker's pruner warms up early
+    rng = np.random.default_rng(seed)
+    tasks = [(t, i, sample_params(rng)) for i in range(trials) for t in tickers]
+    print(f"\n[2/3] 🏋️ Running {len(tasks)} trials...")
+    start = time.perf_counter()
+    results = {t: [] for t in tickers}
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        history = manager.dict()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_tf_worker, initargs=(threads_per_worker,)) as pool:
+            futures = {pool.submit(run_trial, t, i, p, config, history): (t, i) for t, i, p in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                ticker, trial = futures[future]
+                try:
+                    result = future.result()
+                    results[ticker].append(result)
+                    status = "pruned" if result['pruned'] else "done"
+                    print(f"   [{done}/{len(tasks)}] {ticker} trial {trial}: val_loss "
+                          f"{result['val_loss']:.6f} after {result['epochs_run']} epochs ({status})")
+                except Exception as e:
+                    print(f"❌ {ticker} trial {trial}: {str(e)}")
+    print(f"✅ Trials finished in {time.perf_counter() - start:.0f}s")
+
+    # Step 3: pick the best configuration and hand it to the serving path
+    print("\n[3/3] 📝 Saving best configurations...")
+    summary = {}
+    for ticker, ticker_results in results.items():
+        completed = [r for r in ticker_results if not r['pruned']] or ticker_results
+        if not completed:
+            continue
+        best_trial = min(completed, key=lambda r: r['val_loss'])
+        tuning = {
+            "best": _best_hyperparameters(best_trial['params']),
+            "val_loss": best_trial['val_loss'],
+            "trials": len(ticker_results),
+            "pruned": sum(r['pruned'] for r in ticker_results),
+            "tuned_on": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        ticker_results.sort(key=lambda r: r['trial'])
+        with open(os.path.join(out_dir, f"{ticker}.json"), 'w') as f:
+            json.dump(dict(tuning, ticker=ticker, results=ticker_results), f, indent=4)
+
+        if retrain:
+            version = train_model(ticker=ticker, period=period, epochs=final_epochs, tuning=tuning,
+                                  **tuning['best'])['bundle_version']
+        else:
+            version = save_tuning(ticker, tuning)
+        if version is not None:
+            print(f"✅ {ticker}: best val_loss {tuning['val_loss']:.6f} saved to models/{ticker}/v{version:04d}.nsb")
+        else:
+            print(f"⚠️ {ticker}: no trained model yet; best configuration only in {out_dir}/{ticker}.json")
+        summary[ticker] = tuning
+
+    print("\n" + "=" * 70)
+    print("🎉 SEARCH COMPLETE!")
+    print("=" * 70)
+    for ticker, tuning in summary.items():
+        best = tuning['best']
+        print(f"{ticker:<8} units {best['units']}  dropout {best['dropout_rate']}  lr {best['learning_rate']}"
+              f"  seq {best['sequence_length']}  batch {best['batch_size']}"
+              f"  features {len(best['feature_columns'])}  ({tuning['pruned']}/{tuning['trials']} pruned)")
+    print("=" * 70)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search for the LSTM models")
+    parser.add_argument("tickers", nargs="+", help="Ticker symbols")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--period", default="5y")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--out-dir", default=REPORT_DIR)
+    parser.add_argument("--no-retrain", action="store_true",
+                        help="Only record the best configuration; train.py uses it next time")
+    parser.add_argument("--final-epochs", type=int, default=50)
+    parser.add_argument("--refresh", action="store_true", help="Re-download cached bars")
+    args = parser.parse_args()
+
+    tune(args.tickers, trials=args.trials, period=args.period, epochs=args.epochs,
+         workers=args.workers, threads_per_worker=args.threads_per_worker, out_dir=args.out_dir,
+         retrain=not args.no_retrain, final_epochs=args.final_epochs, refresh=args.refresh)
+
+
+if __name__ == "__main__":
+    main()